@@ -0,0 +1,88 @@
+import argparse
+import os
+from pipeline import BatchRunner, PipelineOptions, discover_videos
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Analyse many tennis match videos with a shared pool of model workers")
+    parser.add_argument("source", help="Directory of videos, or a .txt/.json manifest of video paths")
+    parser.add_argument("--output-dir", default="output_videos", help="Directory for annotated videos")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: based on CPU, memory and GPUs)")
+    parser.add_argument("--retries", type=int, default=1, help="Retries per video after a failure")
+    parser.add_argument("--threads-per-worker", type=int, default=2, help="Torch intra-op threads per worker")
+    parser.add_argument("--player-model", default="yolov8x")
+    parser.add_argument("--ball-model", default="models/last.pt")
+    parser.add_argument("--court-model", default="models/keypoints_model.pth")
+    parser.add_argument("--pose-model", default=None, help="Pose model (e.g. yolov8n-pose.pt) for classifying shots from the hitter's pose")
+    parser.add_argument("--shot-model", default=None, help="Trained shot type model (pickled, see utils.train_shot_model); the rules are the fallback")
+    parser.add_argument("--no-shot-classification", action="store_true", help="Disable shot classification")
+    parser.add_argument("--no-court-mask", action="store_true", help="Detect people in the whole frame, not just the court region")
+    parser.add_argument("--ball-tile-size", type=int, default=None, help="Detect the ball on native-resolution tiles of this size (for 4K input)")
+    parser.add_argument("--player-scale", type=float, default=None, help="Run the player model at this fraction of its default 640 input size, e.g. 0.5")
+    parser.add_argument("--decode-buffer", type=int, default=None, help="Decode in a separate process into a shared memory ring buffer of this many frames")
+    parser.add_argument("--decode-backend", default="opencv", choices=["opencv", "pyav", "ffmpeg", "auto"],
+                        help="Video decoder; pyav and ffmpeg decode multithreaded and seek frame-accurately")
+    parser.add_argument("--video-writer", default="auto", choices=["auto", "ffmpeg", "opencv"],
+                        help="Output writer; ffmpeg writes H.264 fragmented MP4, auto uses it when installed")
+    parser.add_argument("--preset", default="veryfast", help="x264 preset for the ffmpeg writer")
+    parser.add_argument("--crf", type=int, default=23, help="x264 constant rate factor for the ffmpeg writer")
+    parser.add_argument("--frame-cache", default=None, help="Directory for a memory-mapped cache of decoded frames reused on reruns")
+    parser.add_argument("--rallies-only", action="store_true", help="Only detect and analyse frames where a point is being played")
+    parser.add_argument("--dead-time", default="copy", choices=["copy", "skip"],
+                        help="With --rallies-only or --court-view-only, copy skipped frames without overlays or skip them in the output")
+    parser.add_argument("--court-view-only", action="store_true",
+                        help="Skip replays, close-ups and graphics that don't show the main court camera")
+    parser.add_argument("--track-court", action="store_true",
+                        help="Follow the court keypoints through camera pans and zooms with optical flow")
+    parser.add_argument("--bounces", action="store_true", help="Find ball bounces and call them in or out against the court lines")
+    parser.add_argument("--heatmaps", action="store_true",
+                        help="Draw player occupancy heatmaps, save them per video and merged over the batch")
+    parser.add_argument("--pose-cache", default=None, help="Directory for per-shot pose crops and features reused on reruns")
+    parser.add_argument("--profile", action="store_true", help="Write a per-stage timing report next to each output video")
+    parser.add_argument("--chrome-trace", action="store_true", help="With --profile, also write a Chrome trace per video")
+    parser.add_argument("--inference-server", default=None, help="host:port of a running serve_inference.py to use instead of per-worker models")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    jobs = discover_videos(args.source, output_dir=args.output_dir)
+
+    options = PipelineOptions(
+        enable_shot_classification=not args.no_shot_classification,
+        enable_court_mask=not args.no_court_mask,
+        ball_tile_size=args.ball_tile_size,
+        player_input_scale=args.player_scale,
+        decode_buffer_slots=args.decode_buffer,
+        decode_backend=args.decode_backend,
+        video_writer=args.video_writer,
+        encode_preset=args.preset,
+        encode_crf=args.crf,
+        frame_cache_dir=args.frame_cache,
+        rally_segmentation=args.rallies_only,
+        dead_time_output=args.dead_time,
+        court_view_filter=args.court_view_only,
+        track_court_keypoints=args.track_court,
+        pose_cache_dir=args.pose_cache,
+        detect_bounces=args.bounces,
+        court_heatmaps=args.heatmaps,
+    )
+    runner = BatchRunner(
+        num_workers=args.workers,
+        max_retries=args.retries,
+        threads_per_worker=args.threads_per_worker,
+        player_model_path=args.player_model,
+        ball_model_path=args.ball_model,
+        court_model_path=args.court_model,
+        pose_model_path=args.pose_model,
+        shot_model_path=args.shot_model,
+        options=options,
+        inference_server=args.inference_server,
+        profile=args.profile,
+        chrome_trace=args.chrome_trace,
+    )
+    runner.run(jobs, report_path=os.path.join(args.output_dir, "batch_report.json"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+from .synthetic import SyntheticMatch, SyntheticPipelineModels, get_synthetic_court_keypoints, get_court_homography
@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+sys.path.append("../")
+from utils import PipelineProfiler, get_current_rss_mb, get_peak_rss_mb
+from benchmarks.synthetic import SyntheticMatch, SyntheticPipelineModels
+
+
+class RssSampler(threading.Thread):
+    """Background thread recording the process RSS every interval_seconds"""
+
+    def __init__(self, interval_seconds=0.05):
+        super().__init__(daemon=True)
+        self.interval_seconds = interval_seconds
+        self.samples_mb = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            rss = get_current_rss_mb()
+            if rss is not None:
+                self.samples_mb.append(rss)
+            self._stop_event.wait(self.interval_seconds)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def max_since(self, sample_index):
+        current = get_current_rss_mb() or 0.0
+        return max(self.samples_mb[sample_index:] + [current])
+
+
+class MemoryProfiler(PipelineProfiler):
+    """
+    PipelineProfiler that also records, for every stage, the peak sampled RSS,
+    the RSS change, the tracemalloc peak and the source lines that allocated
+    the most memory while the stage ran.
+    """
+
+    def __init__(self, sampler, top_allocations=5):
+        super().__init__()
+        self.sampler = sampler
+        self.top_allocations = top_allocations
+        self.memory_stages = {}
+
+    @contextmanager
+    def stage(self, name, num_frames=None):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            snapshot_before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+        sample_index = len(self.sampler.samples_mb)
+        rss_before = get_current_rss_mb()
+        try:
+            with super().stage(name, num_frames) as stats:
+                yield stats
+        finally:
+            rss_after = get_current_rss_mb()
+            memory = self.memory_stages.setdefault(name, {"peak_rss_mb": 0.0, "rss_delta_mb": 0.0})
+            memory["peak_rss_mb"] = max(memory["peak_rss_mb"], self.sampler.max_since(sample_index))
+            memory["rss_delta_mb"] += rss_after - rss_before
+            if tracing:
+                memory["traced_peak_mb"] = max(memory.get("traced_peak_mb", 0.0), tracemalloc.get_traced_memory()[1] / 1024**2)
+                differences = tracemalloc.take_snapshot().compare_to(snapshot_before, "lineno")
+                memory["top_allocations"] = [{
+                    "location": f"{difference.traceback[0].filename}:{difference.traceback[0].lineno}",
+                    "size_diff_mb": round(difference.size_diff / 1024**2, 3),
+                    "count_diff": difference.count_diff,
+                } for difference in differences[:self.top_allocations]]
+
+    def report(self):
+        report = super().report()
+        report["memory"] = {name: {key: (round(value, 3) if isinstance(value, float) else value)
+                                   for key, value in memory.items()}
+                            for name, memory in self.memory_stages.items()}
+        return report
+
+
+def measure_pipeline_memory(video_path, num_frames, width, height, fps, seed=0, trace_allocations=True):
+    """
+    Run process_video on a synthetic video in this process and report its memory use.
+
+    Returns:
+        Dict with the baseline RSS (after imports), the peak RSS and the per-stage memory report
+    """
+    from pipeline import process_video
+
+    match = SyntheticMatch(num_frames, width, height, fps=fps, seed=seed)
+    models = SyntheticPipelineModels(match)
+    output_dir = tempfile.mkdtemp(prefix="tennis_memory_out_")
+
+    sampler = RssSampler()
+    sampler.start()
+    baseline_rss_mb = get_current_rss_mb()
+    if trace_allocations:
+        tracemalloc.start()
+    profiler = MemoryProfiler(sampler)
+    try:
+        process_video(video_path, os.path.join(output_dir, "output.avi"), models,
+                      progress_callback=lambda stage, fraction: None, profiler=profiler)
+    finally:
+        if trace_allocations:
+            tracemalloc.stop()
+        sampler.stop()
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    report = profiler.report()
+    return {
+        "num_frames": num_frames,
+        "baseline_rss_mb": baseline_rss_mb,
+        "peak_rss_mb": max(sampler.samples_mb + [get_peak_rss_mb() or 0.0]),
+        "wall_seconds": report["total_wall_seconds"],
+        "stages": report["memory"],
+    }
+
+
+def fit_growth_exponent(num_frames, memory_mb):
+    """Slope of log(memory) against log(frames): 1 means linear growth, above 1 super-linear"""
+    x = np.log(np.asarray(num_frames, dtype=np.float64))
+    y = np.log(np.maximum(np.asarray(memory_mb, dtype=np.float64), 1e-6))
+    slope, _ = np.polyfit(x, y, 1)
+    return float(slope)
+
+
+def run_harness(minutes=(10, 30, 90), fps=1.0, width=640, height=360, seed=0, max_exponent=1.15,
+                trace_allocations=True):
+    """
+    Measure pipeline memory on synthetic matches of several lengths.
+
+    Each length runs in a fresh interpreter so its peak RSS is not hidden by
+    the previous run. Memory growth above the post-import baseline is fitted
+    against the number of frames; an exponent above max_exponent means memory
+    grows super-linearly with video length.
+
+    Args:
+        minutes: Match lengths to simulate
+        fps: Frame rate of the synthetic videos (lower it to fit long matches in RAM)
+        width: Frame width in pixels
+        height: Frame height in pixels
+        seed: Seed for the synthetic match
+        max_exponent: Largest acceptable growth exponent
+        trace_allocations: Whether to record tracemalloc allocation hot spots
+
+    Returns:
+        Report dict with one run per length, the fitted exponents and a passed flag
+    """
+    work_dir = tempfile.mkdtemp(prefix="tennis_memory_")
+    runs = []
+    try:
+        for length_minutes in minutes:
+            num_frames = max(2, int(round(length_minutes * 60 * fps)))
+            video_path = os.path.join(work_dir, f"synthetic_{length_minutes}min.mp4")
+            print(f"Generating {length_minutes} min synthetic match ({num_frames} frames at {width}x{height})...")
+            SyntheticMatch(num_frames, width, height, fps=fps, seed=seed).write_video(video_path)
+
+            result_path = os.path.join(work_dir, f"result_{length_minutes}min.json")
+            command = [sys.executable, "-m", "benchmarks.memory_harness", "--child", video_path,
+                       "--child-frames", str(num_frames), "--child-output", result_path,
+                       "--fps", str(fps), "--width", str(width), "--height", str(height), "--seed", str(seed)]
+            if not trace_allocations:
+                command.append("--no-tracemalloc")
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+
+            with open(result_path) as f:
+                run = json.load(f)
+            run["minutes"] = length_minutes
+            run["growth_mb"] = run["peak_rss_mb"] - run["baseline_rss_mb"]
+            runs.append(run)
+            os.remove(video_path)
+            print(f"  {length_minutes:>5} min: peak RSS {run['peak_rss_mb']:9.1f} MB "
+                  f"(+{run['growth_mb']:.1f} MB over baseline) in {run['wall_seconds']:.1f}s")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    frame_counts = [run["num_frames"] for run in runs]
+    report = {
+        "config": {"minutes": list(minutes), "fps": fps, "frame_size": [width, height],
+                   "seed": seed, "max_exponent": max_exponent},
+        "runs": runs,
+    }
+    if len(runs) >= 2:
+        report["growth_exponent"] = fit_growth_exponent(frame_counts, [run["growth_mb"] for run in runs])
+        # Per-stage exponents point at the stage responsible when the total grows too fast
+        stage_exponents = {}
+        for stage_name in runs[0]["stages"]:
+            stage_peaks = [run["stages"].get(stage_name, {}).get("peak_rss_mb", 0.0) - run["baseline_rss_mb"]
+                           for run in runs]
+            stage_exponents[stage_name] = round(fit_growth_exponent(frame_counts, stage_peaks), 3)
+        report["stage_growth_exponents"] = stage_exponents
+        report["passed"] = report["growth_exponent"] <= max_exponent
+    else:
+        report["growth_exponent"] = None
+        report["passed"] = True
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check that pipeline memory grows at most linearly with match length")
+    parser.add_argument("--minutes", type=float, nargs="+", default=[10, 30, 90], help="Synthetic match lengths")
+    parser.add_argument("--fps", type=float, default=1.0,
+                        help="Frame rate of the synthetic videos; raise it if the machine has the RAM")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-exponent", type=float, default=1.15,
+                        help="Fail when memory grows faster than frames**max_exponent")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="Only sample RSS, skip allocation hot spots")
+    parser.add_argument("--output", default="benchmarks/results/memory_report.json")
+    # Internal: measure a single length in a fresh process
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--child-frames", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--child-output", default=None, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.child is not None:
+        result = measure_pipeline_memory(args.child, args.child_frames, args.width, args.height, args.fps,
+                                         args.seed, trace_allocations=not args.no_tracemalloc)
+        with open(args.child_output, "w") as f:
+            json.dump(result, f)
+        return
+
+    start_time = time.time()
+    report = run_harness(args.minutes, args.fps, args.width, args.height, args.seed,
+                         args.max_exponent, trace_allocations=not args.no_tracemalloc)
+
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Memory report saved to {args.output} ({time.time() - start_time:.1f}s)")
+    if report["growth_exponent"] is not None:
+        print(f"Memory growth exponent: {report['growth_exponent']:.3f} (limit {args.max_exponent})")
+    if not report["passed"]:
+        print("FAILED: memory grows super-linearly with video length")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import cv2
+import numpy as np
+sys.path.append("../")
+from utils import (read_video,
+                   save_video,
+                   draw_player_stats,
+                   ShotClassifier,
+                   draw_shot_classifications,
+                   detect_ball_bounces,
+                   as_track_store
+                   )
+from trackers import PlayerTracker, BallTracker
+from court_line_detector import CourtLineDetector
+from mini_visual_court import MiniCourt
+from pipeline import compute_player_stats
+from benchmarks.synthetic import SyntheticMatch
+
+
+def _without_model(cls):
+    """Instance of a tracker/detector class without loading its model; only model-free methods are benchmarked"""
+    return cls.__new__(cls)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class BenchmarkContext:
+    """Synthetic inputs for every stage, built once so only the stage under test is timed"""
+
+    def __init__(self, match, work_dir):
+        self.match = match
+        self.work_dir = work_dir
+        self.video_path = match.write_video(os.path.join(work_dir, "synthetic_input.mp4"))
+        self.frames = read_video(self.video_path)
+
+        self.player_tracker = _without_model(PlayerTracker)
+        self.ball_tracker = _without_model(BallTracker)
+        self.court_line_detector = _without_model(CourtLineDetector)
+        self.court_keypoints = match.court_keypoints
+
+        self.raw_player_detections = as_track_store(match.player_detections())
+        self.raw_ball_detections = as_track_store(match.ball_detections())
+        self.ball_detections = self.ball_tracker.interpolate_ball_positions(self.raw_ball_detections)
+        self.player_detections = self.player_tracker.choose_and_filter_players(self.raw_player_detections, self.court_keypoints)
+        self.ball_shot_frames = self.ball_tracker.get_ball_shot_frames(self.ball_detections)
+
+        self.mini_court = MiniCourt(self.frames[0])
+        self.player_mini_court, self.ball_mini_court = self.mini_court.convert_bounding_boxes_to_mini_court_coordinates(
+            self.player_detections, self.ball_detections, self.court_keypoints)
+        self.shot_classifications = ShotClassifier().classify_shots(
+            self.player_mini_court, self.ball_mini_court, self.ball_shot_frames, self.mini_court.court_height)
+        self.player_stats = compute_player_stats(self.ball_shot_frames, self.ball_mini_court, self.player_mini_court,
+                                                 self.mini_court, len(self.frames), self.shot_classifications, fps=match.fps)
+
+    def fresh_frames(self):
+        """Copies of the decoded frames, since the draw functions modify frames in place"""
+        return [frame.copy() for frame in self.frames]
+
+
+def build_benchmarks(ctx):
+    """
+    Benchmarks as (name, setup, run) tuples. setup() returns the arguments for
+    run() and is not timed.
+    """
+    no_setup = lambda: ()
+    frames_only = lambda: (ctx.fresh_frames(),)
+
+    return [
+        ("read_video", no_setup, lambda: read_video(ctx.video_path)),
+        ("interpolate_ball_positions", no_setup,
+         lambda: ctx.ball_tracker.interpolate_ball_positions(ctx.raw_ball_detections)),
+        ("choose_and_filter_players", no_setup,
+         lambda: ctx.player_tracker.choose_and_filter_players(ctx.raw_player_detections, ctx.court_keypoints)),
+        ("interpolate_player_positions", no_setup,
+         lambda: ctx.player_tracker.interpolate_player_positions(ctx.player_detections)),
+        ("get_ball_shot_frames", no_setup,
+         lambda: ctx.ball_tracker.get_ball_shot_frames(ctx.ball_detections)),
+        ("detect_ball_bounces", no_setup,
+         lambda: detect_ball_bounces(ctx.ball_detections, ctx.ball_shot_frames, ctx.court_keypoints,
+                                     ctx.player_detections)),
+        ("convert_bounding_boxes_to_mini_court_coordinates", no_setup,
+         lambda: ctx.mini_court.convert_bounding_boxes_to_mini_court_coordinates(
+             ctx.player_detections, ctx.ball_detections, ctx.court_keypoints)),
+        ("classify_shots", no_setup,
+         lambda: ShotClassifier().classify_shots(ctx.player_mini_court, ctx.ball_mini_court,
+                                                 ctx.ball_shot_frames, ctx.mini_court.court_height)),
+        ("compute_player_stats", no_setup,
+         lambda: compute_player_stats(ctx.ball_shot_frames, ctx.ball_mini_court, ctx.player_mini_court,
+                                      ctx.mini_court, len(ctx.frames), ctx.shot_classifications, fps=ctx.match.fps)),
+        ("draw_player_bboxes", frames_only,
+         lambda frames: ctx.player_tracker.draw_bboxes(frames, ctx.player_detections, thickness=2)),
+        ("draw_ball_bboxes", frames_only,
+         lambda frames: ctx.ball_tracker.draw_bboxes(frames, ctx.ball_detections, color=(0, 255, 255), thickness=2)),
+        ("draw_player_stats", frames_only,
+         lambda frames: draw_player_stats(frames, ctx.player_stats)),
+        ("draw_keypoints_on_video", frames_only,
+         lambda frames: ctx.court_line_detector.draw_keypoints_on_video(frames, ctx.court_keypoints,
+                                                                        point_color=(0, 140, 255), radius=5)),
+        ("draw_mini_court", frames_only,
+         lambda frames: ctx.mini_court.draw_mini_court(frames)),
+        ("draw_ball_trajectory", frames_only,
+         lambda frames: ctx.mini_court.draw_ball_trajectory(frames, ctx.ball_mini_court)),
+        ("draw_heatmaps", frames_only,
+         lambda frames: ctx.mini_court.draw_heatmaps(frames, ctx.player_mini_court)),
+        ("draw_player_points_on_mini_court", frames_only,
+         lambda frames: ctx.mini_court.draw_points_on_mini_court(frames, ctx.player_mini_court, color=(0, 255, 0),
+                                                                 draw_trail=True, label=None)),
+        ("draw_ball_points_on_mini_court", frames_only,
+         lambda frames: ctx.mini_court.draw_points_on_mini_court(frames, ctx.ball_mini_court, color=(0, 255, 255),
+                                                                 label=None)),
+        ("draw_shot_classifications", frames_only,
+         lambda frames: draw_shot_classifications(frames, ctx.shot_classifications, ctx.ball_shot_frames)),
+        ("save_video", frames_only,
+         lambda frames: save_video(frames, os.path.join(ctx.work_dir, "synthetic_output.avi"))),
+    ]
+
+
+def time_benchmark(setup, run, repeats, warmup=1):
+    """Run setup() and run(*args) repeatedly and return the timed run() durations in seconds"""
+    durations = []
+    for iteration in range(warmup + repeats):
+        args = setup()
+        start = time.perf_counter()
+        run(*args)
+        elapsed = time.perf_counter() - start
+        if iteration >= warmup:
+            durations.append(elapsed)
+    return durations
+
+
+def run_benchmarks(num_frames=240, width=1280, height=720, fps=24, repeats=3, warmup=1, seed=0, only=None):
+    """
+    Benchmark every model-free pipeline stage on synthetic footage.
+
+    Args:
+        num_frames: Length of the synthetic video
+        width: Frame width in pixels
+        height: Frame height in pixels
+        fps: Frame rate of the synthetic video
+        repeats: Timed runs per benchmark
+        warmup: Untimed runs per benchmark before timing
+        seed: Seed for the synthetic match
+        only: Optional list of benchmark names to run
+
+    Returns:
+        Dict with run metadata and per-benchmark timings
+    """
+    work_dir = tempfile.mkdtemp(prefix="tennis_bench_")
+    try:
+        print(f"Generating {num_frames} synthetic frames at {width}x{height}...")
+        ctx = BenchmarkContext(SyntheticMatch(num_frames, width, height, fps=fps, seed=seed), work_dir)
+
+        results = {}
+        for name, setup, run in build_benchmarks(ctx):
+            if only and name not in only:
+                continue
+            durations = time_benchmark(setup, run, repeats, warmup)
+            median = statistics.median(durations)
+            results[name] = {
+                "median_seconds": round(median, 6),
+                "min_seconds": round(min(durations), 6),
+                "mean_seconds": round(statistics.fmean(durations), 6),
+                "ms_per_frame": round(median / num_frames * 1000, 4),
+                "repeats": repeats,
+            }
+            print(f"  {name:<50} {median*1000:10.2f} ms  ({median / num_frames * 1000:.3f} ms/frame)")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "metadata": {
+            "git_commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "num_frames": num_frames,
+            "frame_size": [width, height],
+            "fps": fps,
+            "seed": seed,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "platform": platform.platform(),
+        },
+        "benchmarks": results,
+    }
+
+
+def compare_results(baseline, current, threshold=1.1):
+    """
+    Compare two benchmark result dicts.
+
+    Returns:
+        List of (name, baseline_seconds, current_seconds, ratio) for benchmarks
+        present in both, and the subset whose ratio exceeds threshold
+    """
+    rows = []
+    for name, current_stats in current["benchmarks"].items():
+        baseline_stats = baseline["benchmarks"].get(name)
+        if baseline_stats is None:
+            continue
+        before = baseline_stats["median_seconds"]
+        after = current_stats["median_seconds"]
+        rows.append((name, before, after, after / before if before > 0 else float("inf")))
+    regressions = [row for row in rows if row[3] > threshold]
+    return rows, regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark every model-free pipeline stage on synthetic footage")
+    parser.add_argument("--frames", type=int, default=240, help="Length of the synthetic video in frames")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--fps", type=int, default=24)
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per benchmark")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed runs per benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", default=None, help="Only run these benchmarks")
+    parser.add_argument("--output", default="benchmarks/results/latest.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", default=None, help="Baseline JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=1.1, help="Slowdown ratio reported as a regression")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = run_benchmarks(args.frames, args.width, args.height, args.fps, args.repeats,
+                             args.warmup, args.seed, args.only)
+
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Benchmark results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows, regressions = compare_results(baseline, results, args.threshold)
+        print(f"Compared with {args.compare} (commit {baseline['metadata'].get('git_commit')}):")
+        for name, before, after, ratio in rows:
+            flag = "  REGRESSION" if ratio > args.threshold else ""
+            print(f"  {name:<50} {before*1000:10.2f} ms -> {after*1000:10.2f} ms  x{ratio:.2f}{flag}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import os
+import cv2
+import numpy as np
+import sys
+sys.path.append("../")
+import constants
+from utils import as_track_store, COURT_KEYPOINTS_METERS
+from trackers import PlayerTracker, BallTracker
+from court_line_detector import CourtLineDetector
+from pipeline import PipelineModels
+
+COURT_COLOR = (176, 127, 89)      # Hard court blue (BGR)
+SURROUND_COLOR = (60, 110, 60)    # Green surround (BGR)
+LINE_COLOR = (255, 255, 255)
+PLAYER_COLORS = [(40, 40, 200), (200, 200, 40)]
+BALL_COLOR = (0, 255, 255)
+
+_W = constants.DOUBLE_LINE_WIDTH
+_L = constants.HALF_COURT_LINE_HEIGHT * 2
+
+
+def get_court_homography(width, height):
+    """Homography from court metres to a broadcast-like view of a width x height frame"""
+    source = np.float32([[0, 0], [_W, 0], [0, _L], [_W, _L]])
+    destination = np.float32([
+        [width * 0.30, height * 0.26],
+        [width * 0.70, height * 0.26],
+        [width * 0.17, height * 0.80],
+        [width * 0.83, height * 0.80],
+    ])
+    return cv2.getPerspectiveTransform(source, destination)
+
+
+def court_to_image(points_meters, homography):
+    points = np.asarray(points_meters, dtype=np.float32).reshape(-1, 1, 2)
+    return cv2.perspectiveTransform(points, homography).reshape(-1, 2)
+
+
+def get_synthetic_court_keypoints(width, height):
+    """Flat [x0, y0, ..., x13, y13] keypoints, as returned by CourtLineDetector.predict"""
+    return court_to_image(COURT_KEYPOINTS_METERS, get_court_homography(width, height)).reshape(-1)
+
+
+class SyntheticMatch:
+    """
+    Deterministic synthetic rally: two players moving along their baselines and
+    a ball travelling between them, with detections derived from the same state.
+    """
+
+    def __init__(self, num_frames, width=1280, height=720, fps=24, seed=0, shot_interval_frames=48,
+                 ball_miss_rate=0.3, num_spectators=4):
+        self.num_frames = num_frames
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.shot_interval_frames = shot_interval_frames
+        self.homography = get_court_homography(width, height)
+        self.court_keypoints = get_synthetic_court_keypoints(width, height)
+        rng = np.random.default_rng(seed)
+
+        frames = np.arange(num_frames)
+        phase = frames / fps
+
+        # Player feet in court metres: near player (1) and far player (2) shuffling along the baselines
+        near_x = _W / 2 + 3.0 * np.sin(phase * 0.9)
+        near_y = _L + 0.5 + 0.8 * np.sin(phase * 0.4)
+        far_x = _W / 2 + 3.0 * np.sin(phase * 0.7 + 1.0)
+        far_y = -0.5 - 0.8 * np.sin(phase * 0.5)
+        self.player_feet_meters = {
+            1: np.stack([near_x, near_y], axis=1),
+            2: np.stack([far_x, far_y], axis=1),
+        }
+
+        # Ball alternates between the players once per shot interval
+        rally_position = (frames % (2 * shot_interval_frames)) / shot_interval_frames
+        toward_far = rally_position < 1
+        t = np.where(toward_far, rally_position, rally_position - 1)
+        start = np.where(toward_far[:, None], self.player_feet_meters[1], self.player_feet_meters[2])
+        end = np.where(toward_far[:, None], self.player_feet_meters[2], self.player_feet_meters[1])
+        self.ball_meters = start + (end - start) * t[:, None]
+        # Height above the court, used to lift the ball in the image like a real arc
+        self.ball_height_meters = 1.0 + 2.5 * np.sin(np.pi * t)
+        self.ball_visible = rng.random(num_frames) >= ball_miss_rate
+
+        self.spectators = [
+            (rng.uniform(0.02, 0.98) * width, rng.uniform(0.02, 0.2) * height) for _ in range(num_spectators)
+        ]
+
+    def _player_bbox(self, player_id, frame_num):
+        foot = court_to_image(self.player_feet_meters[player_id][frame_num], self.homography)[0]
+        # Perspective: players further up the image are drawn smaller
+        scale = 0.5 + 0.5 * foot[1] / self.height
+        box_height = self.height * 0.22 * scale
+        box_width = box_height * 0.4
+        return [float(foot[0] - box_width / 2), float(foot[1] - box_height), float(foot[0] + box_width / 2), float(foot[1])]
+
+    def _ball_bbox(self, frame_num):
+        center = court_to_image(self.ball_meters[frame_num], self.homography)[0]
+        center[1] -= self.ball_height_meters[frame_num] * self.height * 0.03
+        radius = max(3.0, self.height * 0.006)
+        return [float(center[0] - radius), float(center[1] - radius), float(center[0] + radius), float(center[1] + radius)]
+
+    def player_detections(self):
+        """One {track_id: bbox} dict per frame, with spectators as extra tracks"""
+        detections = []
+        for frame_num in range(self.num_frames):
+            frame_dict = {player_id: self._player_bbox(player_id, frame_num) for player_id in (1, 2)}
+            for index, (x, y) in enumerate(self.spectators):
+                frame_dict[10 + index] = [x - 15, y - 40, x + 15, y]
+            detections.append(frame_dict)
+        return detections
+
+    def ball_detections(self):
+        """One {1: bbox} dict per frame, empty where the ball was missed"""
+        return [{1: self._ball_bbox(frame_num)} if self.ball_visible[frame_num] else {}
+                for frame_num in range(self.num_frames)]
+
+    def render_frame(self, frame_num):
+        frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        frame[:] = SURROUND_COLOR
+
+        corners = self.court_keypoints.reshape(-1, 2)[[0, 1, 3, 2]].astype(np.int32)
+        cv2.fillPoly(frame, [corners], COURT_COLOR)
+        keypoints = self.court_keypoints.reshape(-1, 2).astype(np.int32)
+        for start, end in [(0, 1), (2, 3), (0, 2), (1, 3), (4, 5), (6, 7), (8, 9), (10, 11), (12, 13)]:
+            cv2.line(frame, tuple(keypoints[start]), tuple(keypoints[end]), LINE_COLOR, 2)
+
+        for x, y in self.spectators:
+            cv2.rectangle(frame, (int(x - 15), int(y - 40)), (int(x + 15), int(y)), (90, 90, 90), -1)
+        for player_id, color in zip((1, 2), PLAYER_COLORS):
+            x1, y1, x2, y2 = self._player_bbox(player_id, frame_num)
+            cv2.ellipse(frame, (int((x1 + x2) / 2), int((y1 + y2) / 2)), (int((x2 - x1) / 2), int((y2 - y1) / 2)),
+                        0, 0, 360, color, -1)
+
+        x1, y1, x2, y2 = self._ball_bbox(frame_num)
+        cv2.circle(frame, (int((x1 + x2) / 2), int((y1 + y2) / 2)), max(2, int((x2 - x1) / 2)), BALL_COLOR, -1)
+        return frame
+
+    def frames(self):
+        for frame_num in range(self.num_frames):
+            yield self.render_frame(frame_num)
+
+    def write_video(self, video_path):
+        video_dir = os.path.dirname(video_path)
+        if video_dir:
+            os.makedirs(video_dir, exist_ok=True)
+        writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'mp4v'), self.fps, (self.width, self.height))
+        for frame in self.frames():
+            writer.write(frame)
+        writer.release()
+        return video_path
+
+
+class SyntheticPlayerTracker(PlayerTracker):
+    """PlayerTracker that returns the SyntheticMatch player detections instead of running YOLO"""
+
+    def __init__(self, match):
+        self.match = match
+        self.model_path = None
+        self.model = None
+
+    def reset_tracking(self):
+        pass
+
+    def detect_frames(self, frames, read_from_stub=False, stub_path=None):
+        # Consume the frames so per-frame profiling still sees every frame
+        for _ in frames:
+            pass
+        return as_track_store(self.match.player_detections())
+
+
+class SyntheticBallTracker(BallTracker):
+    """BallTracker that returns the SyntheticMatch ball detections instead of running YOLO"""
+
+    def __init__(self, match):
+        self.match = match
+        self.model_path = None
+        self.model = None
+
+    def detect_frames(self, frames, read_from_stub=False, stub_path=None):
+        for _ in frames:
+            pass
+        return as_track_store(self.match.ball_detections())
+
+
+class SyntheticCourtLineDetector(CourtLineDetector):
+    """CourtLineDetector that returns the SyntheticMatch court keypoints"""
+
+    def __init__(self, match):
+        self.match = match
+
+    def predict(self, image):
+        # Scaled to the image, so predictions on downscaled thumbnails match too
+        return self.match.court_keypoints * (image.shape[1] / self.match.width)
+
+    def predict_batch(self, images):
+        return [self.predict(image) for image in images]
+
+
+class SyntheticPipelineModels(PipelineModels):
+    """PipelineModels for a SyntheticMatch, so process_video runs end to end without model weights"""
+
+    def __init__(self, match):
+        self.player_tracker = SyntheticPlayerTracker(match)
+        self.ball_tracker = SyntheticBallTracker(match)
+        self.court_line_detector = SyntheticCourtLineDetector(match)
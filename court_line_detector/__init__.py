@@ -1 +1,3 @@
-from .court_line_detector import CourtLineDetector
\ No newline at end of file
+from .court_line_detector import CourtLineDetector
+from .court_view_classifier import CourtViewClassifier
+from .court_keypoint_tracker import CourtKeypointTracker
\ No newline at end of file
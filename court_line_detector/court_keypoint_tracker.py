@@ -0,0 +1,171 @@
+import cv2
+import numpy as np
+import sys
+sys.path.append("../")
+from utils import COURT_LINES, project_points
+
+
+class CourtKeypointTracker:
+    """
+    Follows the court keypoints through camera pans and zooms without running
+    the keypoint model on every frame.
+
+    Corner features are picked along the court lines (a band around the lines
+    drawn from the current keypoints) and followed with pyramidal
+    Lucas-Kanade flow, keeping only points that flow back to where they
+    started. Every frame a RANSAC homography is fitted from the features'
+    positions at the last detection to their current positions, and carries
+    the detected keypoints into the frame. The model is called again at the
+    start of every segment and whenever the median reprojection error of the
+    tracked points under that homography exceeds reprojection_threshold (a
+    camera cut, fast motion or lines leaving the picture), so the cost stays
+    close to one flow computation per frame.
+    """
+
+    def __init__(self, court_line_detector, reprojection_threshold=3.0, flow_scale=0.5, max_features=200,
+                 min_features=10, feature_quality=0.05, line_margin=4, redetect_interval=None):
+        """
+        Args:
+            court_line_detector: CourtLineDetector used for the (re)detections
+            reprojection_threshold: Median reprojection error, in frame pixels, above
+                which the keypoints are detected again
+            flow_scale: Factor frames are downscaled by for the flow computation
+            max_features: Most line features tracked at once
+            min_features: Features are picked again when fewer are left
+            feature_quality: Weakest corner kept, relative to the strongest; low values
+                admit points along straight lines, which slide along them and skew the fit
+            line_margin: Half width, in flow pixels, of the band around the lines features are picked in
+            redetect_interval: Optional number of frames after which the keypoints
+                are detected again regardless of the error, bounding slow drift
+        """
+        self.court_line_detector = court_line_detector
+        self.reprojection_threshold = reprojection_threshold
+        self.flow_scale = flow_scale
+        self.max_features = max_features
+        self.min_features = min_features
+        self.feature_quality = feature_quality
+        self.line_margin = line_margin
+        self.redetect_interval = redetect_interval
+        self.detections = 0
+
+    def _gray(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.flow_scale == 1.0:
+            return gray
+        return cv2.resize(gray, None, fx=self.flow_scale, fy=self.flow_scale, interpolation=cv2.INTER_AREA)
+
+    def _predict(self, frame):
+        self.detections += 1
+        return np.asarray(self.court_line_detector.predict(frame), dtype=np.float32).reshape(-1)
+
+    def _line_features(self, gray, keypoints):
+        """Corner features near the court lines, in flow pixels, as an (M, 1, 2) float32 array"""
+        points = np.round(keypoints.reshape(-1, 2) * self.flow_scale).astype(np.int32)
+        mask = np.zeros(gray.shape, dtype=np.uint8)
+        for start, end in COURT_LINES:
+            cv2.line(mask, tuple(points[start]), tuple(points[end]), 255, 2 * self.line_margin + 1)
+        features = cv2.goodFeaturesToTrack(gray, maxCorners=self.max_features, qualityLevel=self.feature_quality, minDistance=5,
+                                           mask=mask)
+        return np.zeros((0, 1, 2), dtype=np.float32) if features is None else features
+
+    def _track_features(self, previous_gray, gray, features):
+        """
+        Follow features into the next frame with pyramidal Lucas-Kanade flow.
+
+        Returns:
+            (tracked, good): the new positions and a boolean per feature that
+            is True where the feature flows back to within a pixel of where it started
+        """
+        if len(features) == 0:
+            return features, np.zeros(0, dtype=bool)
+        flow_parameters = dict(winSize=(21, 21), maxLevel=3,
+                               criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01))
+        tracked, status, _ = cv2.calcOpticalFlowPyrLK(previous_gray, gray, features, None, **flow_parameters)
+        back_tracked, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, previous_gray, tracked, None, **flow_parameters)
+        good = ((status[:, 0] == 1) & (back_status[:, 0] == 1) &
+                (np.linalg.norm((back_tracked - features)[:, 0], axis=1) < 1.0))
+        return tracked, good
+
+    def _fit_homography(self, anchor_features, features):
+        """
+        RANSAC homography, in flow pixels, from the features' positions in the
+        anchor frame to their current positions.
+
+        Returns:
+            (homography, error) with error the median reprojection error in
+            frame pixels; homography is None when the fit fails
+        """
+        if len(features) < 4:
+            return None, np.inf
+        homography, inliers = cv2.findHomography(anchor_features, features, cv2.RANSAC, 1.0)
+        if homography is None:
+            return None, np.inf
+        # Least-squares refit on the inliers, so the keypoints do not jitter with the RANSAC sample
+        inliers = inliers[:, 0].astype(bool)
+        if inliers.sum() >= 4:
+            homography = cv2.findHomography(anchor_features[inliers], features[inliers], 0)[0]
+            if homography is None:
+                return None, np.inf
+        residuals = np.linalg.norm(project_points(anchor_features, homography) - features[:, 0], axis=1)
+        return homography, float(np.median(residuals)) / self.flow_scale
+
+    def track_frames(self, frames, initial_keypoints=None, segment_starts=(0,)):
+        """
+        Court keypoints for every frame.
+
+        Keypoints are always mapped from the last detection (the anchor frame)
+        through one homography fitted to where the features are now, so
+        frame-to-frame fitting errors do not pile up.
+
+        Args:
+            frames: Sequence of BGR frames
+            initial_keypoints: Optional keypoints already predicted on frames[0]
+            segment_starts: Frame indices where the video is not continuous
+                (cuts, skipped stretches); the keypoints are detected again there
+
+        Returns:
+            (N, 28) float32 array of flat keypoints per frame
+        """
+        segment_starts = set(int(start) for start in segment_starts)
+        keypoints_per_frame = None
+        previous_gray = keypoints = anchor_keypoints = None
+        features = anchor_features = np.zeros((0, 1, 2), dtype=np.float32)
+        last_detection = 0
+        # Flow pixels <-> frame pixels
+        to_flow = np.diag([self.flow_scale, self.flow_scale, 1.0])
+        to_frame = np.linalg.inv(to_flow)
+
+        for i, frame in enumerate(frames):
+            gray = self._gray(frame)
+            detect = keypoints is None or i in segment_starts or (
+                self.redetect_interval is not None and i - last_detection >= self.redetect_interval)
+            if not detect:
+                tracked, good = self._track_features(previous_gray, gray, features)
+                features, anchor_features = tracked[good], anchor_features[good]
+                homography, error = self._fit_homography(anchor_features, features)
+                if homography is None or error > self.reprojection_threshold:
+                    detect = True
+                else:
+                    keypoints = project_points(anchor_keypoints.reshape(-1, 2),
+                                               to_frame @ homography @ to_flow).reshape(-1)
+                    if len(features) < self.min_features:
+                        # Fresh features, with their anchor positions mapped back through the homography
+                        features = self._line_features(gray, keypoints)
+                        anchor_features = project_points(features, np.linalg.inv(homography)).reshape(-1, 1, 2)
+            if detect:
+                if i == 0 and initial_keypoints is not None:
+                    keypoints = np.asarray(initial_keypoints, dtype=np.float32).reshape(-1)
+                else:
+                    keypoints = self._predict(frame)
+                anchor_keypoints = keypoints
+                features = anchor_features = self._line_features(gray, keypoints)
+                last_detection = i
+
+            if keypoints_per_frame is None:
+                keypoints_per_frame = np.zeros((len(frames), len(keypoints)), dtype=np.float32)
+            keypoints_per_frame[i] = keypoints
+            previous_gray = gray
+
+        if keypoints_per_frame is None:
+            return np.zeros((0, 28), dtype=np.float32)
+        return keypoints_per_frame
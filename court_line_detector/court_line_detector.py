@@ -9,6 +9,9 @@ class CourtLineDetector:
         self.model = models.resnet50(pretrained=True)
         self.model.fc = torch.nn.Linear(self.model.fc.in_features, 14*2) 
         self.model.load_state_dict(torch.load(model_path, map_location='cpu'))
+        # Inference mode so batch norm uses its running statistics and batched
+        # predictions don't depend on which other images share the batch
+        self.model.eval()
         self.transform = transforms.Compose([
             transforms.ToPILImage(),
             transforms.Resize((224, 224)),
@@ -30,6 +33,20 @@ class CourtLineDetector:
 
         return keypoints
 
+    def predict_batch(self, images):
+        """Predict court keypoints for several images in one forward pass"""
+        image_tensors = [self.transform(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)) for image in images]
+        with torch.no_grad():
+            outputs = self.model(torch.stack(image_tensors))
+        keypoints_batch = outputs.cpu().numpy()
+
+        for keypoints, image in zip(keypoints_batch, images):
+            original_h, original_w = image.shape[:2]
+            keypoints[::2] *= original_w / 224.0
+            keypoints[1::2] *= original_h / 224.0
+
+        return list(keypoints_batch)
+
     def draw_keypoints(self, image, keypoints):
         # Plot keypoints on the image
         for i in range(0, len(keypoints), 2):
@@ -45,7 +62,7 @@ class CourtLineDetector:
         
         Args:
             video_frames: List of video frames to draw on
-            keypoints: Court keypoints to draw
+            keypoints: Court keypoints to draw, or an (N, 28) array with the keypoints of every frame
             point_color: Color to use for keypoints (default: bright red)
             radius: Radius of keypoint circles (increased for better visibility)
             
@@ -55,12 +72,15 @@ class CourtLineDetector:
         
         bright_red = (0, 0, 255)  # BGR format: bright red
         
+        per_frame = np.ndim(keypoints) == 2
+
         # We'll modify frames in-place for memory efficiency
-        for frame in video_frames:
+        for frame_num, frame in enumerate(video_frames):
+            frame_keypoints = keypoints[frame_num] if per_frame else keypoints
             # Draw each keypoint with enhanced visibility using a multi-layer approach
-            for i in range(0, len(keypoints), 2):
-                x = int(keypoints[i])
-                y = int(keypoints[i+1])
+            for i in range(0, len(frame_keypoints), 2):
+                x = int(frame_keypoints[i])
+                y = int(frame_keypoints[i+1])
                 
                 # Drawing larger black outline for better contrast against any background
                 cv2.circle(frame, (x, y), radius+2, (0, 0, 0), -1)
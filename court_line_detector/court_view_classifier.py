@@ -0,0 +1,153 @@
+import cv2
+import numpy as np
+import sys
+sys.path.append("../")
+from utils import COURT_LINES, COURT_KEYPOINTS_METERS, get_court_polygon, project_points
+
+
+class CourtViewClassifier:
+    """
+    Cheap per-frame test of whether a broadcast frame shows the main court
+    camera, so replays, close-ups, crowd shots and graphics can skip the
+    detectors and everything after them.
+
+    It is calibrated on a reference frame from the main camera (the one the
+    court keypoints were predicted on) and works on downscaled thumbnails:
+      - colour score: correlation of the hue/saturation histogram of the court
+        surface with the reference, averaged with the contrast between the
+        court lines and the surface relative to the reference
+      - keypoint confidence: only for frames the colour score leaves
+        ambiguous, how well the keypoint model's prediction on the thumbnail
+        fits the court model, i.e. the reprojection error of a homography
+        from court metres to the predicted keypoints (the model has no
+        confidence output of its own). A panned or zoomed main camera still
+        fits a court; keypoints predicted on a close-up or crowd shot do not.
+    The per-frame decisions are then smoothed with a short majority vote.
+    """
+
+    def __init__(self, reference_frame, court_keypoints, keypoint_detector=None, fps=24, thumbnail_width=320,
+                 court_threshold=0.7, reject_threshold=0.3, keypoint_tolerance=0.03, min_court_area=0.05,
+                 smoothing_seconds=0.5):
+        """
+        Args:
+            reference_frame: Frame from the main court camera
+            court_keypoints: Flat court keypoints predicted on reference_frame
+            keypoint_detector: Optional CourtLineDetector used for ambiguous frames;
+                without it they count as court view
+            fps: Frame rate of the video
+            thumbnail_width: Width of the thumbnails every frame is scored on
+            court_threshold: Colour score from which a frame is court view
+            reject_threshold: Colour score below which a frame is not court view
+            keypoint_tolerance: Median reprojection error of the court model fit, as a
+                share of the predicted court diagonal, at which the keypoint confidence reaches zero
+            min_court_area: Smallest area of the predicted court, as a share of the
+                thumbnail, for the keypoints to count at all
+            smoothing_seconds: Window of the majority vote over the decisions
+        """
+        self.keypoint_detector = keypoint_detector
+        self.court_threshold = court_threshold
+        self.reject_threshold = reject_threshold
+        self.keypoint_tolerance = keypoint_tolerance
+        self.min_court_area = min_court_area
+        # Odd, so the vote is centred on the frame
+        self.smoothing_frames = int(round(smoothing_seconds * fps)) // 2 * 2 + 1
+        self.scale = min(1.0, thumbnail_width / reference_frame.shape[1])
+
+        self.reference_keypoints = np.asarray(court_keypoints, dtype=np.float64).reshape(-1, 2)
+
+        thumbnail = self.thumbnail(reference_frame)
+        keypoints = np.round(self.reference_keypoints * self.scale).astype(np.int32)
+        self.line_mask = np.zeros(thumbnail.shape[:2], dtype=np.uint8)
+        for start, end in COURT_LINES:
+            cv2.line(self.line_mask, tuple(keypoints[start]), tuple(keypoints[end]), 1, 1)
+        # Court surface: inside the court, away from the lines
+        self.surface_mask = np.zeros(thumbnail.shape[:2], dtype=np.uint8)
+        polygon = get_court_polygon(court_keypoints, side_margin_meters=0.0, baseline_margin_meters=0.0) * self.scale
+        cv2.fillConvexPoly(self.surface_mask, np.round(polygon).astype(np.int32), 1)
+        self.surface_mask[cv2.dilate(self.line_mask, np.ones((5, 5), np.uint8)) > 0] = 0
+        if not self.surface_mask.any() or not self.line_mask.any():
+            raise ValueError("Court keypoints do not cover the reference frame")
+
+        self.reference_histogram, self.reference_contrast = self._color_statistics(thumbnail)
+
+    def thumbnail(self, frame):
+        if self.scale == 1.0:
+            return frame
+        return cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+
+    def _color_statistics(self, thumbnail):
+        """Normalised hue/saturation histogram of the court surface and line-minus-surface brightness"""
+        hsv = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2HSV)
+        histogram = cv2.calcHist([hsv], [0, 1], self.surface_mask, [30, 32], [0, 180, 0, 256])
+        cv2.normalize(histogram, histogram, 1.0, 0.0, cv2.NORM_L1)
+        value = hsv[:, :, 2]
+        contrast = cv2.mean(value, mask=self.line_mask)[0] - cv2.mean(value, mask=self.surface_mask)[0]
+        return histogram, contrast
+
+    def color_score(self, thumbnail):
+        """Colour score in [0, 1] of one thumbnail"""
+        histogram, contrast = self._color_statistics(thumbnail)
+        histogram_score = max(0.0, cv2.compareHist(self.reference_histogram, histogram, cv2.HISTCMP_CORREL))
+        if abs(self.reference_contrast) < 1.0:
+            # Lines indistinguishable from the surface in the reference: colour only
+            return histogram_score
+        line_score = float(np.clip(contrast / self.reference_contrast, 0, 1))
+        return (histogram_score + line_score) / 2
+
+    def keypoint_confidence(self, thumbnails):
+        """Plausibility in [0, 1] of the keypoints predicted on each thumbnail as a view of the court"""
+        predictions = self.keypoint_detector.predict_batch(thumbnails)
+        confidence = np.zeros(len(thumbnails), dtype=np.float64)
+        for i, (thumbnail, keypoints) in enumerate(zip(thumbnails, predictions)):
+            keypoints = np.asarray(keypoints, dtype=np.float32).reshape(-1, 2)
+            # The court outline must be a sizeable convex quadrilateral
+            corners = keypoints[[0, 1, 3, 2]]
+            area = cv2.contourArea(corners) / (thumbnail.shape[0] * thumbnail.shape[1])
+            if area < self.min_court_area or not cv2.isContourConvex(corners):
+                continue
+            homography, _ = cv2.findHomography(COURT_KEYPOINTS_METERS[:len(keypoints)], keypoints, 0)
+            if homography is None:
+                continue
+            error = np.median(np.linalg.norm(project_points(COURT_KEYPOINTS_METERS[:len(keypoints)], homography) -
+                                             keypoints, axis=1))
+            diagonal = max(np.linalg.norm(corners[2] - corners[0]), np.linalg.norm(corners[3] - corners[1]), 1.0)
+            confidence[i] = np.clip(1 - error / (self.keypoint_tolerance * diagonal), 0, 1)
+        return confidence
+
+    def classify_frames(self, frames, batch_size=16):
+        """
+        Args:
+            frames: Frames to classify, or any iterable of them read once in
+                order, e.g. frames streamed from a decoder; each frame is only
+                read before the next one is requested
+            batch_size: Ambiguous thumbnails per keypoint model batch
+
+        Returns:
+            (N,) boolean array, True for frames from the main court camera
+        """
+        scores, ambiguous_thumbnails = [], {}
+        for i, frame in enumerate(frames):
+            thumbnail = self.thumbnail(frame)
+            scores.append(self.color_score(thumbnail))
+            if self.keypoint_detector is not None and self.reject_threshold <= scores[-1] < self.court_threshold:
+                # Kept for the keypoint model; a copy, as the thumbnail is the frame itself when it is small enough
+                ambiguous_thumbnails[i] = np.array(thumbnail)
+        scores = np.array(scores, dtype=np.float64)
+        court_view = scores >= self.court_threshold
+        ambiguous = np.flatnonzero((scores >= self.reject_threshold) & ~court_view)
+        if self.keypoint_detector is None:
+            court_view[ambiguous] = True
+        else:
+            for start in range(0, len(ambiguous), batch_size):
+                batch = ambiguous[start:start + batch_size]
+                confidence = self.keypoint_confidence([ambiguous_thumbnails[i] for i in batch])
+                court_view[batch] = confidence >= 0.5
+        return self._majority(court_view)
+
+    def _majority(self, court_view):
+        """Centred majority vote, over fewer frames near the ends of the video"""
+        if len(court_view) == 0:
+            return court_view
+        kernel = np.ones(min(self.smoothing_frames, (len(court_view) - 1) // 2 * 2 + 1))
+        votes = np.convolve(court_view.astype(np.float64), kernel, mode="same")
+        return votes * 2 > np.convolve(np.ones(len(court_view)), kernel, mode="same")
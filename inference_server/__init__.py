@@ -0,0 +1,2 @@
+from .server import InferenceServer, MicroBatcher
+from .client import InferenceClient, IoUTrackAssigner, RemotePlayerTracker, RemoteBallTracker, RemoteCourtLineDetector, RemotePipelineModels
@@ -0,0 +1,238 @@
+import json
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import sys
+sys.path.append("../")
+from utils import compute_iou_matrix, load_shot_model, ResolutionPlanner, scale_boxes_to_frame
+from trackers import PlayerTracker, BallTracker, PoseEstimator
+from court_line_detector import CourtLineDetector
+from pipeline import PipelineModels
+
+
+class InferenceClient:
+    """Thread-safe client for a local InferenceServer"""
+
+    def __init__(self, host="127.0.0.1", port=8765, timeout=60):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def _request(self, method, path, body=None, headers=None):
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(method, path, body=body, headers=headers or {})
+                response = connection.getresponse()
+                payload = json.loads(response.read())
+                break
+            except (ConnectionError, http.client.HTTPException):
+                # Reconnect once if the keep-alive connection was dropped
+                connection.close()
+                self._local.connection = None
+                if attempt == 1:
+                    raise
+
+        if response.status != 200:
+            raise RuntimeError(f"Inference server error on {path}: {payload.get('error')}")
+        return payload
+
+    def _post_frame(self, path, frame, input_size=None):
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        headers = {
+            "Content-Type": "application/octet-stream",
+            "X-Frame-Shape": ",".join(str(dim) for dim in frame.shape),
+        }
+        if input_size is not None:
+            headers["X-Input-Size"] = str(int(input_size))
+        return self._request("POST", path, body=frame.tobytes(), headers=headers)
+
+    def detect_players(self, frame, input_size=None):
+        """Untracked person boxes as [x1, y1, x2, y2, confidence], at the server's default or the given input size"""
+        return self._post_frame("/detect/players", frame, input_size)["boxes"]
+
+    def detect_ball(self, frame, input_size=None):
+        ball = self._post_frame("/detect/ball", frame, input_size)["ball"]
+        return {int(ball_id): bbox for ball_id, bbox in ball.items()}
+
+    def detect_ball_tile(self, crop, input_size):
+        """Every ball box on one tile crop as [x1, y1, x2, y2, confidence]"""
+        return self._post_frame("/detect/ball_tiles", crop, input_size)["boxes"]
+
+    def predict_court_keypoints(self, frame):
+        return np.array(self._post_frame("/predict/court_keypoints", frame)["keypoints"], dtype=np.float32)
+
+    def metrics(self):
+        return self._request("GET", "/metrics")
+
+    def health(self):
+        return self._request("GET", "/health")
+
+
+class IoUTrackAssigner:
+    """
+    Gives per-client track IDs to untracked detections by greedily matching
+    each box to the track whose last box overlaps it most.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_age=30):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.reset()
+
+    def reset(self):
+        self.tracks = {}  # track_id -> (last_bbox, frames_since_seen)
+        self.next_track_id = 1
+
+    def update(self, boxes):
+        track_ids = list(self.tracks.keys())
+        assigned = {}
+
+        if track_ids and boxes:
+            ious = compute_iou_matrix([self.tracks[track_id][0] for track_id in track_ids], boxes)
+            for flat_index in np.argsort(-ious, axis=None):
+                row, col = np.unravel_index(flat_index, ious.shape)
+                if ious[row, col] < self.iou_threshold:
+                    break
+                if track_ids[row] in assigned.values() or col in assigned:
+                    continue
+                assigned[col] = track_ids[row]
+
+        for col in range(len(boxes)):
+            if col not in assigned:
+                assigned[col] = self.next_track_id
+                self.next_track_id += 1
+
+        for track_id in track_ids:
+            last_bbox, age = self.tracks[track_id]
+            self.tracks[track_id] = (last_bbox, age + 1)
+        for col, track_id in assigned.items():
+            self.tracks[track_id] = (boxes[col], 0)
+        self.tracks = {track_id: track for track_id, track in self.tracks.items() if track[1] <= self.max_age}
+
+        return {assigned[col]: boxes[col] for col in range(len(boxes))}
+
+
+class RemotePlayerTracker(PlayerTracker):
+    """
+    PlayerTracker whose detection runs on an InferenceServer.
+
+    The court mask and the resolution planner are applied here, so the server
+    receives the masked, downscaled frame and the matching input size.
+    Batches are sent as concurrent requests, which the server micro-batches.
+    """
+
+    def __init__(self, client, max_concurrent_requests=8):
+        self.client = client
+        self.model_path = None
+        self.model = None
+        self.resolution_planner = ResolutionPlanner()
+        self.track_assigner = IoUTrackAssigner()
+        self.executor = ThreadPoolExecutor(max_concurrent_requests, thread_name_prefix="remote-players")
+        self.clear_court_region()
+
+    def reset_tracking(self):
+        self.track_assigner.reset()
+
+    def _detect_persons(self, frame):
+        image, scale, predict_kwargs = self.resolution_planner.prepare("players", frame)
+        boxes = self.client.detect_players(self.mask_to_court(image, scale), predict_kwargs.get("imgsz"))
+        # Off-court people are dropped before they reach the track assigner
+        return self.filter_boxes_to_court(scale_boxes_to_frame(boxes, scale) if boxes else [])
+
+    def detect_frame(self, frame):
+        return self.track_assigner.update([box[:4] for box in self._detect_persons(frame)])
+
+    def detect_persons_batch(self, frames, input_size=None):
+        if input_size is not None:
+            raise ValueError("RemotePlayerTracker resizes frames itself; set resolution_planner instead of input_size")
+        return list(self.executor.map(self._detect_persons, frames))
+
+    def detect_video_chunked(self, *args, **kwargs):
+        raise ValueError("Chunked detection needs local models; the inference server already batches frames "
+                         "across jobs, so run without detection_workers")
+
+
+class RemoteBallTracker(BallTracker):
+    """
+    BallTracker whose detection runs on an InferenceServer.
+
+    Tiling (set_tiling) is planned and merged here; the tile crops are sent
+    as concurrent requests that the server micro-batches.
+    """
+
+    def __init__(self, client, max_concurrent_requests=8):
+        self.client = client
+        self.model_path = None
+        self.model = None
+        self.resolution_planner = ResolutionPlanner()
+        self.executor = ThreadPoolExecutor(max_concurrent_requests, thread_name_prefix="remote-ball")
+        self.clear_tiling()
+
+    def detect_frame(self, frame):
+        if self.tiling is not None:
+            return self.detect_frame_tiled(frame)
+        image, scale, predict_kwargs = self.resolution_planner.prepare("ball", frame)
+        ball_dict = self.client.detect_ball(image, predict_kwargs.get("imgsz"))
+        return {ball_id: scale_boxes_to_frame(bbox, scale) for ball_id, bbox in ball_dict.items()}
+
+    def detect_batch(self, frames, input_size=None):
+        if input_size is not None:
+            raise ValueError("RemoteBallTracker resizes frames itself; set resolution_planner instead of input_size")
+        if self.tiling is not None:
+            return super().detect_batch(frames)
+        return list(self.executor.map(self.detect_frame, frames))
+
+    def predict_tiles(self, crops, input_size=None):
+        input_size = input_size or self.tiling["tile_size"]
+        tile_boxes = self.executor.map(lambda crop: self.client.detect_ball_tile(crop, input_size), crops)
+        return [[(box[:4], box[4]) for box in boxes] for boxes in tile_boxes]
+
+    def detect_video_chunked(self, *args, **kwargs):
+        raise ValueError("Chunked detection needs local models; the inference server already batches frames "
+                         "across jobs, so run without detection_workers")
+
+
+class RemoteCourtLineDetector(CourtLineDetector):
+    """CourtLineDetector whose keypoint model runs on an InferenceServer"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def predict(self, image):
+        return self.client.predict_court_keypoints(image)
+
+    def predict_batch(self, images):
+        # The server micro-batches concurrent requests itself
+        return [self.predict(image) for image in images]
+
+
+class RemotePipelineModels(PipelineModels):
+    """
+    PipelineModels backed by a running InferenceServer instead of local
+    models; only the small pose and shot type models, if any, are loaded
+    locally. Chunked detection is not supported.
+    """
+
+    supports_chunked_detection = False
+
+    def __init__(self, host="127.0.0.1", port=8765, pose_model_path=None, shot_model_path=None):
+        self.client = InferenceClient(host, port)
+        self.player_tracker = RemotePlayerTracker(self.client)
+        self.ball_tracker = RemoteBallTracker(self.client)
+        self.court_line_detector = RemoteCourtLineDetector(self.client)
+        self.pose_model_path = pose_model_path
+        self.shot_model_path = shot_model_path
+        if pose_model_path:
+            self.pose_estimator = PoseEstimator(model_path=pose_model_path)
+        if shot_model_path:
+            self.shot_model = load_shot_model(shot_model_path)
@@ -0,0 +1,261 @@
+import json
+import queue
+import threading
+import time
+from functools import partial
+import numpy as np
+import cv2
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def decode_frame(body, content_type, frame_shape):
+    """Decode a request body into a BGR frame (raw uint8 bytes or an encoded image)"""
+    if content_type in ("image/jpeg", "image/png"):
+        frame = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError("Could not decode image")
+        return frame
+
+    if frame_shape is None:
+        raise ValueError("Raw frames need an X-Frame-Shape header")
+    shape = tuple(int(dim) for dim in frame_shape.split(","))
+    return np.frombuffer(body, dtype=np.uint8).reshape(shape)
+
+
+class _PendingRequest:
+    __slots__ = ("frame", "enqueued_at", "done", "result", "error")
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Collects concurrent single-frame requests into batches for one model.
+
+    A background thread waits for the first queued request, then keeps
+    collecting until max_batch_size requests are waiting or max_wait_ms has
+    passed, and runs batch_fn once on the whole batch.
+    """
+
+    def __init__(self, name, batch_fn, max_batch_size=8, max_wait_ms=10, latency_window=1000):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000.0
+
+        self.requests = queue.Queue()
+        self.latencies_ms = deque(maxlen=latency_window)
+        self.batch_sizes = deque(maxlen=latency_window)
+        self.inference_ms = deque(maxlen=latency_window)
+        self.requests_total = 0
+        self.batches_total = 0
+        self.errors_total = 0
+        self.metrics_lock = threading.Lock()
+
+        self.thread = threading.Thread(target=self._run, name=f"batcher-{name}", daemon=True)
+        self.thread.start()
+
+    def submit(self, frame, timeout=None):
+        """Queue one frame and block until its batch has been processed"""
+        request = _PendingRequest(frame)
+        self.requests.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError(f"{self.name} request timed out")
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _collect_batch(self):
+        batch = [self.requests.get()]
+        deadline = time.perf_counter() + self.max_wait_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            start_time = time.perf_counter()
+            try:
+                results = self.batch_fn([request.frame for request in batch])
+                error = None
+            except Exception as e:
+                results = [None] * len(batch)
+                error = e
+            finished_at = time.perf_counter()
+
+            for request, result in zip(batch, results):
+                request.result = result
+                request.error = error
+                request.done.set()
+
+            with self.metrics_lock:
+                self.requests_total += len(batch)
+                self.batches_total += 1
+                self.errors_total += len(batch) if error is not None else 0
+                self.batch_sizes.append(len(batch))
+                self.inference_ms.append((finished_at - start_time) * 1000)
+                self.latencies_ms.extend((finished_at - request.enqueued_at) * 1000 for request in batch)
+
+    def metrics(self):
+        with self.metrics_lock:
+            latencies = np.array(self.latencies_ms) if self.latencies_ms else np.zeros(1)
+            return {
+                "queue_depth": self.requests.qsize(),
+                "requests_total": self.requests_total,
+                "batches_total": self.batches_total,
+                "errors_total": self.errors_total,
+                "mean_batch_size": float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+                "mean_inference_ms": float(np.mean(self.inference_ms)) if self.inference_ms else 0.0,
+                "latency_ms": {
+                    "p50": float(np.percentile(latencies, 50)),
+                    "p95": float(np.percentile(latencies, 95)),
+                    "p99": float(np.percentile(latencies, 99)),
+                    "max": float(latencies.max()),
+                },
+            }
+
+
+class InferenceServer:
+    """
+    Long-lived local HTTP service holding the player, ball and court models.
+
+    Endpoints (frames are POSTed as raw BGR uint8 bytes with an
+    "X-Frame-Shape: h,w,3" header, or as image/jpeg / image/png):
+        POST /detect/players         -> {"boxes": [[x1, y1, x2, y2, conf], ...]}
+        POST /detect/ball            -> {"ball": {"1": [x1, y1, x2, y2]}}
+        POST /detect/ball_tiles      -> {"boxes": [[x1, y1, x2, y2, conf], ...]} for one tile crop
+        POST /predict/court_keypoints -> {"keypoints": [x0, y0, ..., x13, y13]}
+        GET  /metrics                -> queue depth, batch sizes and latency per model
+        GET  /health
+
+    The detection endpoints take an optional "X-Input-Size" header for frames
+    the client already resized (e.g. a reduced player input scale or ball
+    tiles); requests are micro-batched per model and input size.
+
+    The server only binds to the loopback interface unless told otherwise and
+    needs no network access once the models are on disk.
+    """
+
+    def __init__(self, models, host="127.0.0.1", port=8765, max_batch_size=8, max_wait_ms=10):
+        self.models = models
+        self.host = host
+        self.port = port
+        self.started_at = time.time()
+
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        # Path -> (model name, batch function, whether it takes an input size)
+        self.endpoints = {
+            "/detect/players": ("players", models.player_tracker.detect_persons_batch, True),
+            "/detect/ball": ("ball", models.ball_tracker.detect_batch, True),
+            "/detect/ball_tiles": ("ball_tiles", models.ball_tracker.predict_tiles, True),
+            "/predict/court_keypoints": ("court_keypoints", models.court_line_detector.predict_batch, False),
+        }
+        # One MicroBatcher per (path, input size), created on first use
+        self.batchers = {}
+        self.batchers_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+
+    def get_batcher(self, path, input_size=None):
+        """The MicroBatcher of an endpoint and input size, or None for an unknown path"""
+        if path not in self.endpoints:
+            return None
+        name, batch_fn, sized = self.endpoints[path]
+        input_size = input_size if sized else None
+        with self.batchers_lock:
+            batcher = self.batchers.get((path, input_size))
+            if batcher is None:
+                if input_size is not None:
+                    name, batch_fn = f"{name}@{input_size}", partial(batch_fn, input_size=input_size)
+                batcher = MicroBatcher(name, batch_fn, self.max_batch_size, self.max_wait_ms)
+                self.batchers[(path, input_size)] = batcher
+        return batcher
+
+    def metrics(self):
+        with self.batchers_lock:
+            batchers = list(self.batchers.values())
+        return {
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "models": {batcher.name: batcher.metrics() for batcher in batchers},
+        }
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send_json(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/metrics":
+                    self._send_json(200, server.metrics())
+                elif self.path == "/health":
+                    self._send_json(200, {"status": "ok"})
+                else:
+                    self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+            def do_POST(self):
+                try:
+                    body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                    frame = decode_frame(body, self.headers.get("Content-Type"), self.headers.get("X-Frame-Shape"))
+                    input_size = self.headers.get("X-Input-Size")
+                    input_size = int(input_size) if input_size else None
+                except ValueError as e:
+                    self._send_json(400, {"error": str(e)})
+                    return
+
+                batcher = server.get_batcher(self.path, input_size)
+                if batcher is None:
+                    self._send_json(404, {"error": f"Unknown path {self.path}"})
+                    return
+
+                try:
+                    result = batcher.submit(frame)
+                except Exception as e:
+                    self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+                    return
+
+                if self.path == "/detect/players":
+                    self._send_json(200, {"boxes": result})
+                elif self.path == "/detect/ball":
+                    self._send_json(200, {"ball": result})
+                elif self.path == "/detect/ball_tiles":
+                    self._send_json(200, {"boxes": [list(box) + [confidence] for box, confidence in result]})
+                else:
+                    self._send_json(200, {"keypoints": np.asarray(result).tolist()})
+
+            def log_message(self, format, *args):
+                # Per-request access logs would swamp the console at video frame rates
+                pass
+
+        return Handler
+
+    def serve_forever(self):
+        print(f"Inference server listening on http://{self.host}:{self.port}")
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.httpd.server_close()
+
+    def shutdown(self):
+        self.httpd.shutdown()
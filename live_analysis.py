@@ -0,0 +1,73 @@
+import argparse
+import asyncio
+import json
+import os
+import cv2
+from pipeline import PipelineModels
+from realtime import LivePipeline, VideoReplaySource, CaptureSource, VideoFileSink
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Live tennis analysis from a camera, stream or replayed video file")
+    parser.add_argument("--source", default="input_videos/input_video.mp4",
+                        help="Video file to replay, camera index or RTSP/HTTP stream URL")
+    parser.add_argument("--no-realtime", action="store_true",
+                        help="Replay a video file as fast as it decodes instead of at its frame rate")
+    parser.add_argument("--output", default=None, help="Optional path to record the rendered stream (.mp4 with ffmpeg is playable while recording)")
+    parser.add_argument("--video-writer", default="auto", choices=["auto", "ffmpeg", "opencv"],
+                        help="Recording writer; ffmpeg encodes H.264, auto uses it when installed")
+    parser.add_argument("--display", action="store_true", help="Show the rendered stream in a window")
+    parser.add_argument("--queue-size", type=int, default=2, help="Capacity of each stage queue")
+    parser.add_argument("--report", default=None, help="Optional path for a JSON latency report")
+    parser.add_argument("--inference-server", default=None, help="host:port of a running serve_inference.py")
+    parser.add_argument("--player-model", default="yolov8x")
+    parser.add_argument("--ball-model", default="models/last.pt")
+    parser.add_argument("--court-model", default="models/keypoints_model.pth")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.inference_server:
+        from inference_server import RemotePipelineModels
+        host, port = args.inference_server.rsplit(":", 1)
+        models = RemotePipelineModels(host, int(port))
+    else:
+        models = PipelineModels(player_model_path=args.player_model,
+                                ball_model_path=args.ball_model,
+                                court_model_path=args.court_model)
+
+    if os.path.isfile(args.source):
+        source = VideoReplaySource(args.source, realtime=not args.no_realtime)
+    else:
+        source = CaptureSource(args.source)
+
+    file_sink = VideoFileSink(args.output, writer=args.video_writer) if args.output else None
+
+    def sink(live_frame):
+        if file_sink is not None:
+            # Record at the source frame rate, known once the pipeline has opened the source
+            file_sink.fps = pipeline.fps
+            file_sink(live_frame)
+        if args.display:
+            cv2.imshow("Tennis-Vision Live", live_frame.image)
+            cv2.waitKey(1)
+
+    pipeline = LivePipeline(models, source, sink=sink, queue_size=args.queue_size)
+    try:
+        summary = asyncio.run(pipeline.run())
+    finally:
+        if file_sink is not None:
+            file_sink.close()
+        if args.display:
+            cv2.destroyAllWindows()
+
+    print(json.dumps(summary, indent=2))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import cv2
+import numpy as np
+import sys
+sys.path.append("../")
+import constants
+
+
+class CourtHeatmap:
+    """
+    Occupancy counts on a grid over the court in metres, one layer per
+    player ("player_1", "player_2") and one for ball bounces ("bounces").
+
+    The grid covers the doubles court and the margins around it, and is the
+    same for every video whatever its resolution or mini court size, so the
+    heatmaps of many matches can be added up. Points are binned with
+    np.add.at, so a layer can be updated one frame at a time.
+    """
+
+    def __init__(self, cell_size=0.25, side_margin_meters=3.0, baseline_margin_meters=5.0):
+        """
+        Args:
+            cell_size: Width and height of a grid cell in metres
+            side_margin_meters: Area covered beside the doubles sidelines
+            baseline_margin_meters: Area covered behind the baselines
+        """
+        self.cell_size = cell_size
+        self.side_margin_meters = side_margin_meters
+        self.baseline_margin_meters = baseline_margin_meters
+        width = constants.DOUBLE_LINE_WIDTH + 2 * side_margin_meters
+        length = constants.HALF_COURT_LINE_HEIGHT * 2 + 2 * baseline_margin_meters
+        self.shape = (int(np.ceil(length / cell_size)), int(np.ceil(width / cell_size)))
+        self.layers = {}
+        self.num_frames = 0
+
+    def layer(self, name):
+        """Counts of one layer, created empty on first use"""
+        if name not in self.layers:
+            self.layers[name] = np.zeros(self.shape, dtype=np.float64)
+        return self.layers[name]
+
+    def add(self, name, points_meters, weights=1.0):
+        """
+        Add points to a layer; points outside the grid or with NaN are ignored.
+
+        Args:
+            name: Layer name
+            points_meters: (N, 2) court positions in metres (x across, y from the far baseline)
+            weights: Scalar or (N,) weight of every point, e.g. 1 / fps for seconds
+        """
+        points = np.asarray(points_meters, dtype=np.float64).reshape(-1, 2)
+        weights = np.broadcast_to(np.asarray(weights, dtype=np.float64), (len(points),))
+        columns = np.floor((points[:, 0] + self.side_margin_meters) / self.cell_size)
+        rows = np.floor((points[:, 1] + self.baseline_margin_meters) / self.cell_size)
+        with np.errstate(invalid="ignore"):
+            inside = (rows >= 0) & (rows < self.shape[0]) & (columns >= 0) & (columns < self.shape[1])
+        np.add.at(self.layer(name), (rows[inside].astype(np.intp), columns[inside].astype(np.intp)), weights[inside])
+
+    def combine_players(self):
+        """Fold the per-player layers into one "players" layer, e.g. before adding up different matches"""
+        for name in [name for name in self.layers if name.startswith("player_")]:
+            self.layer("players")[:] += self.layers.pop(name)
+        return self
+
+    def merge(self, other, combine_players=False):
+        """
+        Add the counts of another heatmap on the same grid to this one.
+
+        Player IDs only name the same person within one match, so when adding
+        up different matches pass combine_players to sum every player layer
+        into a single "players" layer instead.
+        """
+        if (other.shape, other.cell_size, other.side_margin_meters, other.baseline_margin_meters) != (
+                self.shape, self.cell_size, self.side_margin_meters, self.baseline_margin_meters):
+            raise ValueError("Heatmaps use different grids")
+        if combine_players:
+            self.combine_players()
+        for name, counts in other.layers.items():
+            self.layer("players" if combine_players and name.startswith("player_") else name)[:] += counts
+        self.num_frames += other.num_frames
+        return self
+
+    def save(self, path):
+        """Write the grid and every layer to an .npz file"""
+        np.savez_compressed(path, cell_size=self.cell_size, side_margin_meters=self.side_margin_meters,
+                            baseline_margin_meters=self.baseline_margin_meters, num_frames=self.num_frames,
+                            **{f"layer_{name}": counts for name, counts in self.layers.items()})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            heatmap = cls(float(data["cell_size"]), float(data["side_margin_meters"]), float(data["baseline_margin_meters"]))
+            heatmap.num_frames = int(data["num_frames"])
+            for name in data.files:
+                if name.startswith("layer_"):
+                    heatmap.layers[name[len("layer_"):]] = data[name].astype(np.float64)
+        return heatmap
+
+    @classmethod
+    def merge_files(cls, paths, combine_players=True):
+        """Sum of the heatmaps saved at paths, or None for no paths; see merge for combine_players"""
+        merged = None
+        for path in paths:
+            heatmap = cls.load(path)
+            if merged is None:
+                merged = heatmap.combine_players() if combine_players else heatmap
+            else:
+                merged.merge(heatmap, combine_players)
+        return merged
+
+
+class HeatmapOverlay:
+    """
+    Coloured rendering of heatmap layers over the mini court canvas.
+
+    Blurring, normalising and colouring the grid is the expensive part, so
+    the rendering is cached and only redone when update() is called at least
+    update_interval frames after the last one; draw() blends the cached
+    overlay into every frame.
+    """
+
+    def __init__(self, mini_court, heatmap, layers=("player_1", "player_2"), update_interval=24, blur_meters=0.75,
+                 max_alpha=0.6, colormap=cv2.COLORMAP_JET):
+        """
+        Args:
+            mini_court: MiniCourt whose canvas the overlay covers
+            heatmap: CourtHeatmap being rendered
+            layers: Layers summed into the overlay
+            update_interval: Frames between re-renderings
+            blur_meters: Standard deviation of the Gaussian blur, in metres
+            max_alpha: Opacity of the hottest cell; empty cells stay transparent
+            colormap: OpenCV colormap
+        """
+        self.mini_court = mini_court
+        self.heatmap = heatmap
+        self.layers = layers
+        self.update_interval = update_interval
+        self.blur_cells = blur_meters / heatmap.cell_size
+        self.max_alpha = max_alpha
+        self.colormap = colormap
+        self.last_update = None
+        self.box = self.weight = self.premultiplied = None
+
+        # Grid cell centres to canvas pixels
+        pixels_per_meter = mini_court.court_drawing_width / constants.DOUBLE_LINE_WIDTH
+        scale = heatmap.cell_size * pixels_per_meter
+        self.canvas_size = (mini_court.end_x - mini_court.start_x, mini_court.end_y - mini_court.start_y)
+        self.transform = np.float32([
+            [scale, 0, mini_court.court_start_x - mini_court.start_x
+             + (heatmap.cell_size / 2 - heatmap.side_margin_meters) * pixels_per_meter],
+            [0, scale, mini_court.court_start_y - mini_court.start_y
+             + (heatmap.cell_size / 2 - heatmap.baseline_margin_meters) * pixels_per_meter],
+        ])
+
+    def update(self, frame_num, force=False):
+        """Re-render the overlay if update_interval frames have passed since the last rendering"""
+        if not force and self.last_update is not None and frame_num - self.last_update < self.update_interval:
+            return
+        self.last_update = frame_num
+        counts = sum((self.heatmap.layers[name] for name in self.layers if name in self.heatmap.layers),
+                     np.zeros(self.heatmap.shape))
+        if self.blur_cells > 0:
+            counts = cv2.GaussianBlur(counts, (0, 0), self.blur_cells)
+        peak = counts.max()
+        if peak <= 0:
+            self.box = None
+            return
+        canvas = cv2.warpAffine((counts / peak).astype(np.float32), self.transform, self.canvas_size,
+                                flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        colors = cv2.applyColorMap(np.round(canvas * 255).astype(np.uint8), self.colormap)
+        # Blending weights out of 256 in integers, cropped to the visible part, so draw() is cheap
+        alpha = np.round(canvas * self.max_alpha * 256).astype(np.uint16)
+        rows, columns = np.flatnonzero(alpha.any(axis=1)), np.flatnonzero(alpha.any(axis=0))
+        if len(rows) == 0:
+            self.box = None
+            return
+        self.box = (rows[0], rows[-1] + 1, columns[0], columns[-1] + 1)
+        alpha = alpha[rows[0]:rows[-1] + 1, columns[0]:columns[-1] + 1, None]
+        self.weight = 256 - alpha
+        self.premultiplied = colors[rows[0]:rows[-1] + 1, columns[0]:columns[-1] + 1] * alpha
+
+    def draw(self, frame):
+        """Blend the cached overlay into the mini court canvas of frame"""
+        if self.box is None:
+            return frame
+        top, bottom, left, right = self.box
+        x, y = self.mini_court.start_x, self.mini_court.start_y
+        roi = frame[y + top:y + bottom, x + left:x + right]
+        # The canvas may run past the edge of small frames
+        height, width = roi.shape[:2]
+        roi[:] = ((roi * self.weight[:height, :width] + self.premultiplied[:height, :width]) >> 8).astype(np.uint8)
+        return frame
@@ -4,7 +4,8 @@ import numpy as np
 import random  # Adding random for ball position offsets
 sys.path.append("../")
 import constants 
-from utils import convert_meters_to_pixel_distance, convert_pixel_distance_to_meters , get_foot_position, get_closest_keypoint_index, get_height_of_bbox, measure_xy_distance, get_center_of_bbox, measure_distance_between_points
+from .court_heatmap import CourtHeatmap, HeatmapOverlay
+from utils import convert_meters_to_pixel_distance, convert_pixel_distance_to_meters , get_foot_position, get_closest_keypoint_index, get_height_of_bbox, measure_xy_distance, get_center_of_bbox, measure_distance_between_points, TrackStore, as_track_store, get_keypoint_lookup
 
 
 class MiniCourt():
@@ -291,149 +292,91 @@ class MiniCourt():
         - Improved real-time synchronization between actual and mini court
         - Better ball position tracking relative to player positions
         - More accurate coordinate transformation
+
+        Args:
+            player_boxes: TrackStore (or per-frame dicts) of player bounding boxes
+            ball_boxes: TrackStore (or per-frame dicts) of ball bounding boxes
+            court_keypoints: Flat court keypoints from CourtLineDetector, or an (N, 28)
+                array with the keypoints of every frame (CourtKeypointTracker)
+
+        Returns:
+            TrackStores of player and ball mini court (x, y) positions
         """
-        output_player_boxes_dict = {}
-        output_ball_boxes_dict = {}
-        
-        # Process each frame
-        for frame_num in range(len(player_boxes)):
-            frame_player_boxes = player_boxes[frame_num]
-            frame_ball_boxes = ball_boxes[frame_num] if frame_num < len(ball_boxes) else {}
-            
-            # Initialize frame dictionaries
-            output_player_boxes_dict[frame_num] = {}
-            output_ball_boxes_dict[frame_num] = {}
-            
-            # Process player bounding boxes
-            for player_id, bbox in frame_player_boxes.items():
-                try:
-                    # Get foot position (bottom center of bounding box)
-                    foot_x, foot_y = self.get_foot_position(bbox)
-                    
-                    # Find the closest court keypoint to determine player's court position
-                    closest_keypoint_index = self.get_closest_keypoint_index(
-                        (foot_x, foot_y), 
-                        court_keypoints, 
-                        allowed_indices=range(len(court_keypoints) // 2)
-                    )
-                    
-                    # Get the corresponding mini court coordinate
-                    mini_court_x = self.drawing_key_points[closest_keypoint_index * 2]
-                    mini_court_y = self.drawing_key_points[closest_keypoint_index * 2 + 1]
-                    
-                    # Calculate offset based on player's position relative to the keypoint
-                    kp_x = court_keypoints[closest_keypoint_index * 2]
-                    kp_y = court_keypoints[closest_keypoint_index * 2 + 1]
-                    
-                    # Calculate normalized offset (0-1 range)
-                    offset_x_norm = (foot_x - kp_x) / max(self.court_width, 1)
-                    offset_y_norm = (foot_y - kp_y) / max(self.court_height, 1)
-                    
-                    # Scale offset to mini court dimensions
-                    offset_x_mini = offset_x_norm * self.mini_court_width
-                    offset_y_mini = offset_y_norm * self.mini_court_height
-                    
-                    # Apply offset to mini court position
-                    mini_court_x += offset_x_mini
-                    mini_court_y += offset_y_mini
-                    
-                    # Ensure position is within mini court boundaries
-                    mini_court_x = max(self.start_x, min(self.end_x, mini_court_x))
-                    mini_court_y = max(self.start_y, min(self.end_y, mini_court_y))
-                    
-                    # Store the mini court position
-                    output_player_boxes_dict[frame_num][player_id] = (mini_court_x, mini_court_y)
-                    
-                except (ValueError, TypeError, IndexError):
-                    # Use default position if calculation fails
-                    default_x = self.start_x + self.mini_court_width // 2
-                    default_y = self.start_y + self.mini_court_height // 2
-                    output_player_boxes_dict[frame_num][player_id] = (default_x, default_y)
-            
-            # Process ball bounding boxes with enhanced accuracy
-            for ball_id, bbox in frame_ball_boxes.items():
-                try:
-                    # Get ball center
-                    ball_x = (bbox[0] + bbox[2]) / 2
-                    ball_y = (bbox[1] + bbox[3]) / 2
-                    
-                    # Find the closest court keypoint
-                    closest_keypoint_index = self.get_closest_keypoint_index(
-                        (ball_x, ball_y), 
-                        court_keypoints, 
-                        allowed_indices=range(len(court_keypoints) // 2)
-                    )
-                    
-                    # Get the corresponding mini court coordinate
-                    mini_court_x = self.drawing_key_points[closest_keypoint_index * 2]
-                    mini_court_y = self.drawing_key_points[closest_keypoint_index * 2 + 1]
-                    
-                    # Calculate offset based on ball's position relative to the keypoint
-                    kp_x = court_keypoints[closest_keypoint_index * 2]
-                    kp_y = court_keypoints[closest_keypoint_index * 2 + 1]
-                    
-                    # Calculate normalized offset (0-1 range)
-                    offset_x_norm = (ball_x - kp_x) / max(self.court_width, 1)
-                    offset_y_norm = (ball_y - kp_y) / max(self.court_height, 1)
-                    
-                    # Scale offset to mini court dimensions
-                    offset_x_mini = offset_x_norm * self.mini_court_width
-                    offset_y_mini = offset_y_norm * self.mini_court_height
-                    
-                    # Apply offset to mini court position
-                    mini_court_x += offset_x_mini
-                    mini_court_y += offset_y_mini
-                    
-                    # Find the nearest player to determine ball possession
-                    nearest_player = None
-                    min_distance = float('inf')
-                    
-                    for player_id, player_bbox in frame_player_boxes.items():
-                        player_x = (player_bbox[0] + player_bbox[2]) / 2
-                        player_y = (player_bbox[1] + player_bbox[3]) / 2
-                        
-                        # Calculate Euclidean distance
-                        distance = np.sqrt((ball_x - player_x)**2 + (ball_y - player_y)**2)
-                        
-                        if distance < min_distance:
-                            min_distance = distance
-                            nearest_player = player_id
-                    
-                    # If ball is very close to a player (improved threshold), position it near that player
-                    # This significantly improves real-time accuracy of ball possession
-                    if nearest_player is not None and min_distance < 150 and nearest_player in output_player_boxes_dict[frame_num]:
-                        player_mini_x, player_mini_y = output_player_boxes_dict[frame_num][nearest_player]
-                        
-                        # Very small offset for precise positioning (just 3-5 pixels)
-                        offset_x = 5 * (0.5 - random.random())  # Random offset between -2.5 and 2.5
-                        offset_y = 5 * (0.5 - random.random())  # Random offset between -2.5 and 2.5
-                        
-                        mini_court_ball_position = (int(player_mini_x + offset_x), int(player_mini_y + offset_y))
-                    else:
-                        # Ensure position is within mini court boundaries
-                        mini_court_x = max(self.start_x, min(self.end_x, mini_court_x))
-                        mini_court_y = max(self.start_y, min(self.end_y, mini_court_y))
-                        
-                        mini_court_ball_position = (int(mini_court_x), int(mini_court_y))
-                    
-                    # Store the mini court position
-                    output_ball_boxes_dict[frame_num][ball_id] = mini_court_ball_position
-                    
-                except (ValueError, TypeError, IndexError):
-                    # If no valid ball position, check if we have players and use their position
-                    if output_player_boxes_dict[frame_num] and 1 in output_player_boxes_dict[frame_num]:
-                        # Default to player 1's position with small offset
-                        player_x, player_y = output_player_boxes_dict[frame_num][1]
-                        offset_x = 5 * (0.5 - random.random())
-                        offset_y = 5 * (0.5 - random.random())
-                        output_ball_boxes_dict[frame_num][ball_id] = (int(player_x + offset_x), int(player_y + offset_y))
-                    else:
-                        # Use center of mini court as fallback
-                        default_x = self.start_x + self.mini_court_width // 2
-                        default_y = self.start_y + self.mini_court_height // 2
-                        output_ball_boxes_dict[frame_num][ball_id] = (default_x, default_y)
-        
-        return output_player_boxes_dict, output_ball_boxes_dict
+        player_boxes = as_track_store(player_boxes)
+        ball_boxes = as_track_store(ball_boxes)
+        num_frames = len(player_boxes)
+
+        # Ball frames beyond the player frames are ignored, missing ones are empty
+        ball_values = np.full((num_frames, ball_boxes.num_tracks, 4), np.nan)
+        ball_present = np.zeros((num_frames, ball_boxes.num_tracks), dtype=bool)
+        shared_frames = min(num_frames, len(ball_boxes))
+        ball_values[:shared_frames] = ball_boxes.values[:shared_frames]
+        ball_present[:shared_frames] = ball_boxes.present[:shared_frames]
+
+        # Player position is the foot position (bottom center of bounding box)
+        player_values = player_boxes.values
+        player_foot = np.stack([(player_values[..., 0] + player_values[..., 2]) / 2, player_values[..., 3]], axis=-1)
+        player_mini_court = self._project_to_mini_court(player_foot, court_keypoints)
+
+        # Ball position is the ball center
+        ball_center = np.stack([(ball_values[..., 0] + ball_values[..., 2]) / 2,
+                                (ball_values[..., 1] + ball_values[..., 3]) / 2], axis=-1)
+        ball_mini_court = self._project_to_mini_court(ball_center, court_keypoints)
+
+        # Find the nearest player to each ball to determine ball possession
+        if player_boxes.num_tracks:
+            player_center = np.stack([(player_values[..., 0] + player_values[..., 2]) / 2,
+                                      (player_values[..., 1] + player_values[..., 3]) / 2], axis=-1)
+            distances = np.linalg.norm(ball_center[:, :, None, :] - player_center[:, None, :, :], axis=-1)
+            distances = np.where(player_boxes.present[:, None, :], distances, np.inf)
+            nearest_player = np.argmin(distances, axis=2)
+            min_distance = np.take_along_axis(distances, nearest_player[..., None], axis=2)[..., 0]
+        else:
+            nearest_player = np.zeros(ball_present.shape, dtype=int)
+            min_distance = np.full(ball_present.shape, np.inf)
+
+        # If ball is very close to a player (improved threshold), position it near that player
+        # This significantly improves real-time accuracy of ball possession
+        near_player = ball_present & (min_distance < 150)
+        for frame_num, ball_column in np.argwhere(near_player):
+            player_mini_x, player_mini_y = player_mini_court[frame_num, nearest_player[frame_num, ball_column]]
+
+            # Very small offset for precise positioning (just 3-5 pixels)
+            offset_x = 5 * (0.5 - random.random())  # Random offset between -2.5 and 2.5
+            offset_y = 5 * (0.5 - random.random())  # Random offset between -2.5 and 2.5
+            ball_mini_court[frame_num, ball_column] = (player_mini_x + offset_x, player_mini_y + offset_y)
+        ball_mini_court = np.trunc(ball_mini_court)
+
+        return (TrackStore.from_arrays(player_mini_court, player_boxes.present.copy(), player_boxes.track_ids),
+                TrackStore.from_arrays(ball_mini_court, ball_present, ball_boxes.track_ids))
+
+    def _project_to_mini_court(self, positions, court_keypoints):
+        """
+        Map frame positions of shape (..., 2) onto the mini court through their
+        closest court keypoint, clamped to the mini court area. With per-frame
+        keypoints, positions are (N, T, 2) and frame i uses keypoints i.
+        """
+        drawing_keypoints = np.asarray(self.drawing_key_points, dtype=np.float64).reshape(-1, 2)
+
+        # Find the closest court keypoint to determine the court position
+        if np.ndim(court_keypoints) == 2:
+            keypoints = np.asarray(court_keypoints, dtype=np.float64).reshape(len(court_keypoints), -1, 2)
+            distances = np.linalg.norm(positions[:, :, None, :] - keypoints[:, None, :, :], axis=-1)
+            closest_keypoint_index = np.argmin(np.nan_to_num(distances, nan=np.inf), axis=-1)
+            closest_keypoint = np.take_along_axis(keypoints, closest_keypoint_index[..., None], axis=1)
+        else:
+            keypoints = np.asarray(court_keypoints, dtype=np.float64).reshape(-1, 2)
+            closest_keypoint_index = get_keypoint_lookup(court_keypoints).nearest(positions)
+            closest_keypoint = keypoints[closest_keypoint_index]
+
+        # Offset from that keypoint, normalized by the court size and scaled to the mini court
+        offset = (positions - closest_keypoint) / [max(self.court_width, 1), max(self.court_height, 1)]
+        mini_court_positions = drawing_keypoints[closest_keypoint_index] + offset * [self.mini_court_width, self.mini_court_height]
+
+        # Ensure position is within mini court boundaries
+        mini_court_positions[..., 0] = np.clip(mini_court_positions[..., 0], self.start_x, self.end_x)
+        mini_court_positions[..., 1] = np.clip(mini_court_positions[..., 1], self.start_y, self.end_y)
+        return mini_court_positions
 
     def constrain_to_court_boundaries(self, position):
         """Ensure position is within court boundaries"""
@@ -462,23 +405,7 @@ class MiniCourt():
     
     def get_closest_keypoint_index(self, position, keypoints, allowed_indices=None):
         """Find the closest keypoint to a given position"""
-        x, y = position
-        min_dist = float('inf')
-        closest_index = 0
-        
-        allowed_indices = allowed_indices if allowed_indices is not None else range(len(keypoints) // 2)
-        
-        for i in allowed_indices:
-            kp_x = keypoints[i*2]
-            kp_y = keypoints[i*2+1]
-            
-            dist = np.sqrt((x - kp_x)**2 + (y - kp_y)**2)
-            
-            if dist < min_dist:
-                min_dist = dist
-                closest_index = i
-        
-        return closest_index
+        return int(get_keypoint_lookup(keypoints, allowed_indices).nearest(position))
 
     def draw_points_on_mini_court(self, frames, positions, color=(0,255,0), draw_trail=False, label=None):
         """
@@ -496,9 +423,6 @@ class MiniCourt():
             label: Text label to display (default: None, no labels will be shown for clean visualization)
             
         """
-        # History of positions for drawing trails
-        position_history = []
-        
         # Define CONSISTENT player circle parameters
         PLAYER_OUTLINE_THICKNESS = 10  # Identical outline thickness for both players
         PLAYER_CIRCLE_THICKNESS = 8    # Identical circle thickness for both players
@@ -514,11 +438,10 @@ class MiniCourt():
         if color == (0, 255, 255):  # This is the color used for ball in main.py
             is_drawing_ball = True
         
-        for frame_num, frame in enumerate(frames):
-            current_positions = []
-            
+        positions = as_track_store(positions, num_values=2)
+        for frame, (obj_ids, frame_positions) in zip(frames, positions.iter_frames()):
             # Extract current frame positions
-            for obj_id, position in positions[frame_num].items():
+            for obj_id, position in zip(obj_ids, frame_positions):
                 try:
                     x, y = position
                     # Handle NaN or invalid positions
@@ -526,7 +449,6 @@ class MiniCourt():
                         continue
                         
                     x, y = int(x), int(y)
-                    current_positions.append((obj_id, x, y))
                     
                     # Enhanced circle drawing with dark outline for better visibility
                     if is_drawing_ball:
@@ -543,9 +465,6 @@ class MiniCourt():
                     
                 except (ValueError, TypeError):
                     continue  # Skip invalid positions
-            
-            # Update position history
-            position_history.append(current_positions)
         
         return frames
 
@@ -556,6 +475,82 @@ class MiniCourt():
         """
         return frames
 
+    def mini_court_to_meters(self, positions):
+        """Mini court pixel positions as court metres (x across the court, y from the far baseline)"""
+        pixels_per_meter = self.court_drawing_width / constants.DOUBLE_LINE_WIDTH
+        return (np.asarray(positions, dtype=np.float64).reshape(-1, 2) - [self.court_start_x, self.court_start_y]) / pixels_per_meter
+
+    def draw_heatmaps(self, frames, player_positions, bounces=None, heatmap=None, update_interval=24,
+                      layers=("player_1", "player_2"), overlay=None, start_frame=0):
+        """
+        Accumulate player foot positions, and bounce points, into a CourtHeatmap
+        frame by frame and draw it over the mini court as it builds up. The
+        overlay is re-blurred and recoloured only every update_interval frames.
+
+        Args:
+            frames: List of video frames to draw on
+            player_positions: TrackStore of player positions on the mini court, one frame per entry of frames
+            bounces: Optional detect_ball_bounces output, added to the "bounces" layer
+            heatmap: Optional CourtHeatmap to add to, e.g. one loaded from earlier matches
+            update_interval: Frames between re-renderings of the overlay
+            layers: Layers shown in the overlay
+            overlay: Optional HeatmapOverlay to carry on with, when the video is drawn in parts;
+                its heatmap is used instead of heatmap
+            start_frame: Frame number of frames[0], when drawing part of the video
+
+        Returns:
+            (frames, heatmap)
+        """
+        if overlay is None:
+            heatmap = heatmap if heatmap is not None else CourtHeatmap()
+            overlay = HeatmapOverlay(self, heatmap, layers=layers, update_interval=update_interval)
+        heatmap = overlay.heatmap
+        player_positions = as_track_store(player_positions, num_values=2)
+        player_meters = self.mini_court_to_meters(player_positions.values).reshape(player_positions.values.shape)
+        player_meters[~player_positions.present] = np.nan
+        layer_names = [f"player_{track_id}" for track_id in player_positions.track_ids]
+
+        bounce_points = {}
+        if bounces is not None:
+            for frame_num, x, y in zip(bounces["frames"], bounces["x"], bounces["y"]):
+                bounce_points.setdefault(int(frame_num), []).append((x, y))
+
+        for index, frame in enumerate(frames):
+            frame_num = start_frame + index
+            for column, name in enumerate(layer_names):
+                heatmap.add(name, player_meters[index, column])
+            if frame_num in bounce_points:
+                heatmap.add("bounces", bounce_points[frame_num])
+            heatmap.num_frames += 1
+            overlay.update(frame_num)
+            overlay.draw(frame)
+        return frames, heatmap
+
+    def draw_bounces(self, frames, bounces, hold_frames=24, start_frame=0):
+        """
+        Mark ball bounces on the mini court, green when in and red when out,
+        from the bounce frame for hold_frames frames.
+
+        Args:
+            frames: List of video frames to draw on
+            bounces: detect_ball_bounces output, with positions in court metres
+            hold_frames: Number of frames each mark stays visible
+            start_frame: Frame number of frames[0], when drawing part of the video
+        """
+        for frame_num, x, y, is_in in zip(bounces["frames"], bounces["x"], bounces["y"], bounces["in"]):
+            if not (np.isfinite(x) and np.isfinite(y)):
+                continue
+            first, last = frame_num - start_frame, frame_num - start_frame + hold_frames
+            if last <= 0 or first >= len(frames):
+                continue
+            center = (int(self.court_start_x + self.convert_meters_to_pixels(x)),
+                      int(self.court_start_y + self.convert_meters_to_pixels(y)))
+            color = (0, 200, 0) if is_in else (0, 0, 255)
+            for frame in frames[max(first, 0):last]:
+                cv2.circle(frame, center, 6, (0, 0, 0), -1)
+                cv2.circle(frame, center, 4, color, -1)
+        return frames
+
     def draw_background_rectangle(self, frame):
         # Creating a smaller mask just for the rectangle area instead of the whole frame
         # This significantly reduces memory usage
@@ -0,0 +1,5 @@
+from .options import PipelineOptions
+from .match_pipeline import (PipelineModels, MatchDetections, MatchAnalysis, process_video, detect_match, analyse_match,
+                             render_match, compute_player_stats)
+from .rally_segmentation import RallySegmenter
+from .batch_runner import BatchRunner, BatchJob, discover_videos, recommend_worker_count
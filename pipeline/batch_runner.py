@@ -0,0 +1,344 @@
+import os
+import json
+import time
+import threading
+import dataclasses
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from .options import PipelineOptions
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".m4v")
+
+# Rough resident memory of one worker holding yolov8x, the ball model and ResNet50
+DEFAULT_WORKER_MEMORY_GB = 3.0
+
+# Models loaded once per worker process by _init_worker and reused for every job
+_WORKER_MODELS = None
+_WORKER_PROGRESS_QUEUE = None
+
+
+class BatchJob:
+    """A single video scheduled by the BatchRunner"""
+
+    def __init__(self, input_path, output_path):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.attempts = 0
+        self.status = "pending"
+        self.error = None
+        self.result_path = None
+        self.elapsed_seconds = 0.0
+
+    def to_dict(self):
+        return {
+            "input_path": self.input_path,
+            "output_path": self.output_path,
+            "result_path": self.result_path,
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+        }
+
+
+def discover_videos(source, output_dir="output_videos"):
+    """
+    Build the list of jobs from a directory of videos or a manifest file.
+
+    A manifest is either a text file with one input path per line, or a JSON
+    list whose entries are input paths or {"input": ..., "output": ...} dicts.
+
+    Args:
+        source: Directory or manifest path
+        output_dir: Directory outputs are written to when not given explicitly
+
+    Returns:
+        List of BatchJob
+    """
+    def default_output(input_path):
+        stem = os.path.splitext(os.path.basename(input_path))[0]
+        return os.path.join(output_dir, f"{stem}_analysis.mp4")
+
+    entries = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.lower().endswith(VIDEO_EXTENSIONS):
+                entries.append((os.path.join(source, name), None))
+    elif source.lower().endswith(".json"):
+        with open(source) as f:
+            for entry in json.load(f):
+                if isinstance(entry, dict):
+                    entries.append((entry["input"], entry.get("output")))
+                else:
+                    entries.append((entry, None))
+    else:
+        with open(source) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    entries.append((line, None))
+
+    return [BatchJob(input_path, output_path or default_output(input_path))
+            for input_path, output_path in entries]
+
+
+def _available_memory_gb():
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / 1024**3
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def _cuda_devices():
+    """IDs of the visible CUDA devices, as CUDA_VISIBLE_DEVICES entries, or [] without CUDA"""
+    visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+    try:
+        import torch
+        if not torch.cuda.is_available():
+            return []
+        count = torch.cuda.device_count()
+    except ImportError:
+        return []
+    if visible:
+        return [device.strip() for device in visible.split(",") if device.strip()][:count]
+    return [str(device) for device in range(count)]
+
+
+def recommend_worker_count(num_jobs, worker_memory_gb=DEFAULT_WORKER_MEMORY_GB, threads_per_worker=2):
+    """
+    Pick how many model-holding workers fit on this machine.
+
+    Bounded by the number of jobs, the CPU cores (each worker gets
+    threads_per_worker intra-op threads), free memory and, when CUDA is
+    available, the number of GPUs (each worker is pinned to its own GPU by
+    _init_worker).
+    """
+    cpu_count = os.cpu_count() or 1
+    limit = max(1, cpu_count // threads_per_worker)
+
+    available_gb = _available_memory_gb()
+    if available_gb is not None:
+        limit = min(limit, max(1, int(available_gb // worker_memory_gb)))
+
+    cuda_devices = _cuda_devices()
+    if cuda_devices:
+        limit = min(limit, len(cuda_devices))
+
+    return max(1, min(limit, num_jobs))
+
+
+def _init_worker(model_paths, threads_per_worker, progress_queue, inference_server=None, worker_slots=None,
+                 cuda_devices=()):
+    """
+    Load the models once in each worker process, or connect to a shared inference server.
+
+    Each worker takes an index from worker_slots and, with local models, is
+    pinned to cuda_devices[index % len(cuda_devices)] through
+    CUDA_VISIBLE_DEVICES, set before torch initialises CUDA, so the workers
+    spread over the GPUs instead of all loading onto cuda:0.
+    """
+    global _WORKER_MODELS, _WORKER_PROGRESS_QUEUE
+
+    if worker_slots is not None and cuda_devices and inference_server is None:
+        worker_index = worker_slots.get()
+        os.environ["CUDA_VISIBLE_DEVICES"] = cuda_devices[worker_index % len(cuda_devices)]
+
+    try:
+        import torch
+        torch.set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+
+    if inference_server is not None:
+        from inference_server import RemotePipelineModels
+        host, port = inference_server.rsplit(":", 1)
+        _WORKER_MODELS = RemotePipelineModels(host, int(port), pose_model_path=model_paths.get("pose_model_path"),
+                                              shot_model_path=model_paths.get("shot_model_path"))
+    else:
+        from pipeline.match_pipeline import PipelineModels
+        _WORKER_MODELS = PipelineModels(**model_paths)
+    _WORKER_PROGRESS_QUEUE = progress_queue
+
+
+def _heatmap_path(output_path):
+    """Where the court heatmaps of a job are saved next to its output video"""
+    return os.path.splitext(output_path)[0] + ".heatmaps.npz"
+
+
+def _run_job(input_path, output_path, options, profile=False, chrome_trace=False):
+    """Process one video inside a worker using the worker's cached models"""
+    from pipeline.match_pipeline import process_video
+    from utils import create_profiler
+
+    def on_progress(stage, fraction):
+        if _WORKER_PROGRESS_QUEUE is not None:
+            _WORKER_PROGRESS_QUEUE.put((input_path, stage, fraction))
+
+    if options.court_heatmaps:
+        options = dataclasses.replace(options, heatmap_path=_heatmap_path(output_path))
+    profiler = create_profiler(enabled=profile, chrome_trace=chrome_trace)
+    start_time = time.time()
+    result_path = process_video(input_path, output_path, _WORKER_MODELS, options,
+                                progress_callback=on_progress, profiler=profiler)
+    if result_path is None:
+        raise RuntimeError(f"Failed to save output video for {input_path}")
+    profiler.save_report(os.path.splitext(output_path)[0] + ".profile.json")
+    return result_path, time.time() - start_time
+
+
+class BatchRunner:
+    """
+    Schedules many match videos across a pool of worker processes.
+
+    Each worker loads the player, ball and court models once and reuses them
+    for every video it is handed, failed videos are retried up to max_retries
+    times, and per-video progress is printed as workers report it. When
+    inference_server ("host:port") is given, workers hold no models and send
+    frames to that InferenceServer instead, so its micro-batches are shared.
+    options (a PipelineOptions) is handed to process_video unchanged for
+    every video, apart from the per-video heatmap_path with court_heatmaps.
+    """
+
+    def __init__(self, num_workers=None, max_retries=1, threads_per_worker=2,
+                 worker_memory_gb=DEFAULT_WORKER_MEMORY_GB, player_model_path="yolov8x",
+                 ball_model_path="models/last.pt", court_model_path="models/keypoints_model.pth", pose_model_path=None,
+                 shot_model_path=None, options=None, progress_callback=None, inference_server=None,
+                 profile=False, chrome_trace=False):
+        self.num_workers = num_workers
+        self.max_retries = max_retries
+        self.threads_per_worker = threads_per_worker
+        self.worker_memory_gb = worker_memory_gb
+        self.model_paths = {
+            "player_model_path": player_model_path,
+            "ball_model_path": ball_model_path,
+            "court_model_path": court_model_path,
+            "pose_model_path": pose_model_path,
+            "shot_model_path": shot_model_path,
+        }
+        self.options = options or PipelineOptions()
+        self.inference_server = inference_server
+        self.profile = profile
+        self.chrome_trace = chrome_trace
+        self.progress_callback = progress_callback or self._print_progress
+
+    def _print_progress(self, input_path, stage, fraction):
+        print(f"[{os.path.basename(input_path)}] {fraction*100:5.1f}% {stage}")
+
+    def _drain_progress(self, progress_queue, stop_event):
+        while not stop_event.is_set() or not progress_queue.empty():
+            try:
+                input_path, stage, fraction = progress_queue.get(timeout=0.2)
+            except Exception:
+                continue
+            self.progress_callback(input_path, stage, fraction)
+
+    def _make_pool(self, num_workers, progress_queue, manager):
+        # One index per worker of this pool, each pinning its worker to one GPU
+        worker_slots = manager.Queue()
+        for worker_index in range(num_workers):
+            worker_slots.put(worker_index)
+        return ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.model_paths, self.threads_per_worker, progress_queue, self.inference_server,
+                      worker_slots, _cuda_devices()),
+        )
+
+    def run(self, jobs, report_path=None):
+        """
+        Process every job and return them with their final status.
+
+        Args:
+            jobs: List of BatchJob, e.g. from discover_videos
+            report_path: Optional path of a JSON summary of the batch
+
+        Returns:
+            The same list of BatchJob with status, attempts and errors filled in
+        """
+        if not jobs:
+            print("No videos to process")
+            return jobs
+
+        num_workers = self.num_workers or recommend_worker_count(
+            len(jobs), self.worker_memory_gb, self.threads_per_worker)
+        print(f"Processing {len(jobs)} videos with {num_workers} workers")
+
+        manager = multiprocessing.get_context("spawn").Manager()
+        progress_queue = manager.Queue()
+        stop_event = threading.Event()
+        progress_thread = threading.Thread(target=self._drain_progress, args=(progress_queue, stop_event), daemon=True)
+        progress_thread.start()
+
+        pending = list(jobs)
+        in_flight = {}
+        pool = self._make_pool(num_workers, progress_queue, manager)
+        batch_start_time = time.time()
+
+        try:
+            while pending or in_flight:
+                # Keep at most one queued job per worker so retries are scheduled promptly
+                while pending and len(in_flight) < num_workers * 2:
+                    job = pending.pop(0)
+                    job.attempts += 1
+                    job.status = "running"
+                    future = pool.submit(_run_job, job.input_path, job.output_path, self.options,
+                                         self.profile, self.chrome_trace)
+                    in_flight[future] = job
+
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                pool_broken = False
+                for future in done:
+                    job = in_flight.pop(future)
+                    try:
+                        job.result_path, job.elapsed_seconds = future.result()
+                        job.status = "done"
+                        job.error = None
+                        self.progress_callback(job.input_path, "Finished", 1.0)
+                    except Exception as e:
+                        pool_broken = pool_broken or isinstance(e, BrokenProcessPool)
+                        job.error = f"{type(e).__name__}: {e}"
+                        if job.attempts <= self.max_retries:
+                            job.status = "pending"
+                            pending.append(job)
+                            print(f"[{os.path.basename(job.input_path)}] attempt {job.attempts} failed ({job.error}), retrying")
+                        else:
+                            job.status = "failed"
+                            print(f"[{os.path.basename(job.input_path)}] failed after {job.attempts} attempts: {job.error}")
+
+                if pool_broken:
+                    # A worker died (e.g. out of memory); requeue everything and restart the pool
+                    for future, job in in_flight.items():
+                        job.status = "pending"
+                        job.attempts -= 1
+                        pending.append(job)
+                    in_flight = {}
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = self._make_pool(num_workers, progress_queue, manager)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            stop_event.set()
+            progress_thread.join()
+            manager.shutdown()
+
+        num_done = sum(job.status == "done" for job in jobs)
+        print(f"Batch complete: {num_done}/{len(jobs)} videos processed in {time.time() - batch_start_time:.1f}s")
+
+        if report_path is not None:
+            report_dir = os.path.dirname(report_path)
+            if report_dir:
+                os.makedirs(report_dir, exist_ok=True)
+            with open(report_path, "w") as f:
+                json.dump({"num_workers": num_workers, "jobs": [job.to_dict() for job in jobs]}, f, indent=2)
+
+            if self.options.court_heatmaps:
+                # Heatmaps of every processed match, added up
+                from mini_visual_court import CourtHeatmap
+                merged = CourtHeatmap.merge_files([_heatmap_path(job.output_path) for job in jobs if job.status == "done"])
+                if merged is not None:
+                    merged_path = os.path.join(report_dir, "batch_heatmaps.npz")
+                    merged.save(merged_path)
+                    print(f"Merged court heatmaps saved to {merged_path}")
+
+        return jobs
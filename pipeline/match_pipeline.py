@@ -0,0 +1,849 @@
+import math
+import os
+import pickle
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import chain
+import cv2
+import numpy as np
+import pandas as pd
+from copy import deepcopy
+sys.path.append("../")
+import constants
+from utils import (read_video,
+                   create_video_writer,
+                   measure_distance_between_points,
+                   draw_player_stats,
+                   convert_pixel_distance_to_meters,
+                   ShotClassifier,
+                   PoseShotClassifier,
+                   PoseShotCache,
+                   ModelShotClassifier,
+                   load_shot_model,
+                   detect_ball_bounces,
+                   hash_video_file,
+                   draw_shot_classifications,
+                   as_track_store,
+                   ResolutionPlanner,
+                   SharedMemoryVideoReader,
+                   open_video,
+                   available_decode_backend,
+                   FrameCache,
+                   NULL_PROFILER
+                   )
+from trackers import PlayerTracker, BallTracker, PoseEstimator
+from court_line_detector import CourtLineDetector, CourtViewClassifier, CourtKeypointTracker
+from mini_visual_court import MiniCourt, CourtHeatmap, HeatmapOverlay
+from .rally_segmentation import (RallySegmenter, get_segments, get_rally_ids, get_rally_bounds, take_frames,
+                                 expand_frames, map_rallies)
+from .options import PipelineOptions
+
+# Frames rendered and encoded together; only this many rendered frames are held in RAM
+RENDER_CHUNK_FRAMES = 32
+
+
+class PipelineModels:
+    """
+    Holds the player, ball and court keypoint models, and the optional pose
+    and shot type models, so they are loaded once and reused for every video
+    processed by the same process.
+    """
+
+    pose_estimator = None
+    shot_model = None
+    # Whether detect_video_chunked can rebuild the trackers in worker processes
+    supports_chunked_detection = True
+
+    def __init__(self, player_model_path="yolov8x", ball_model_path="models/last.pt",
+                 court_model_path="models/keypoints_model.pth", pose_model_path=None, shot_model_path=None):
+        self.player_model_path = player_model_path
+        self.ball_model_path = ball_model_path
+        self.court_model_path = court_model_path
+        self.pose_model_path = pose_model_path
+        self.shot_model_path = shot_model_path
+
+        self.player_tracker = PlayerTracker(model_path=player_model_path)
+        self.ball_tracker = BallTracker(model_path=ball_model_path)
+        self.court_line_detector = CourtLineDetector(court_model_path)
+        if pose_model_path:
+            self.pose_estimator = PoseEstimator(model_path=pose_model_path)
+        if shot_model_path:
+            self.shot_model = load_shot_model(shot_model_path)
+
+    def reset(self):
+        """Clear per-video state (tracker IDs, court region, ball tiling, input scales) before starting a new video"""
+        self.player_tracker.reset_tracking()
+        self.player_tracker.clear_court_region()
+        self.ball_tracker.clear_tiling()
+        self.player_tracker.resolution_planner = self.ball_tracker.resolution_planner = ResolutionPlanner()
+
+
+def compute_player_stats(ball_shot_frames, ball_mini_court_detections, player_mini_court_detections,
+                         mini_court, num_frames, shot_classifications=None, fps=24, rally_ids=None, bounces=None):
+    """
+    Build the per-frame player statistics table used by draw_player_stats.
+
+    Args:
+        ball_shot_frames: List of frame numbers where shots occur
+        ball_mini_court_detections: TrackStore of ball positions on the mini court
+        player_mini_court_detections: TrackStore of player positions on the mini court
+        mini_court: MiniCourt used for the pixel to metre conversion
+        num_frames: Number of frames in the video
+        shot_classifications: Optional shot classifications keyed by shot frame
+        fps: Frame rate of the video
+        rally_ids: Optional rally index per frame; shots followed by a shot in
+            another rally are not measured
+        bounces: Optional detect_ball_bounces output; adds the shots in and out
+            and the average depth of the shots in per player
+
+    Returns:
+        DataFrame with one row per frame
+    """
+    player_stats_data = [{
+        "frame_num": 0,
+        "player_1_number_of_shots": 0,
+        "player_1_total_shot_speed": 0,
+        "player_1_last_shot_speed": 0,
+        "player_1_total_player_speed": 0,
+        "player_1_last_player_speed": 0,
+
+        "player_2_number_of_shots": 0,
+        "player_2_total_shot_speed": 0,
+        "player_2_last_shot_speed": 0,
+        "player_2_total_player_speed": 0,
+        "player_2_last_player_speed": 0,
+    }]
+
+    bounce_calls = {}
+    if bounces is not None:
+        bounce_calls = {int(shot_index): (bool(is_in), float(depth))
+                        for shot_index, is_in, depth in zip(bounces["shot_index"], bounces["in"], bounces["depth"])}
+        for player_id in (1, 2):
+            player_stats_data[0].update({f"player_{player_id}_shots_in": 0, f"player_{player_id}_shots_out": 0,
+                                         f"player_{player_id}_total_shot_depth": 0})
+
+    ball_positions = as_track_store(ball_mini_court_detections, num_values=2).track_values(1).tolist()
+    # Dense per-player (num_frames, 2) positions, NaN where a player is still missing after interpolation
+    player_mini_court_detections = as_track_store(player_mini_court_detections, num_values=2)
+    player_positions = {player_id: player_mini_court_detections.track_values(player_id).tolist() for player_id in (1, 2)}
+
+    for ball_shot_ind in range(len(ball_shot_frames)-1):
+        start_frame = ball_shot_frames[ball_shot_ind]
+        end_frame = ball_shot_frames[ball_shot_ind + 1]
+        if rally_ids is not None and rally_ids[start_frame] != rally_ids[end_frame]:
+            continue
+        ball_shot_time_in_seconds = (end_frame - start_frame) / fps
+
+        # Get distance covered by the ball
+        distance_covered_by_ball_pixels = measure_distance_between_points(ball_positions[start_frame], ball_positions[end_frame])
+
+        distance_covered_by_ball_meters = convert_pixel_distance_to_meters(distance_covered_by_ball_pixels, constants.DOUBLE_LINE_WIDTH, mini_court.get_width_of_mini_court())
+
+        # Speed of the ball shot in km/h
+        speed_of_ball_shot = distance_covered_by_ball_meters / ball_shot_time_in_seconds * 3.6
+
+        # player who made the shot: the closest player seen in that frame
+        distances_to_ball = {player_id: measure_distance_between_points(positions[start_frame], ball_positions[start_frame])
+                             for player_id, positions in player_positions.items()}
+        distances_to_ball = {player_id: distance for player_id, distance in distances_to_ball.items() if not math.isnan(distance)}
+        if not distances_to_ball:
+            continue
+        player_shot_ball = min(distances_to_ball, key=distances_to_ball.get)
+
+        # Opponent player speed
+        opponent_player_id = 1 if player_shot_ball == 2 else 2
+
+        distance_covered_by_opponent_player_pixels = measure_distance_between_points(
+                                                                                        player_positions[opponent_player_id][start_frame],
+                                                                                        player_positions[opponent_player_id][end_frame]
+                                                                                    )
+
+        distance_covered_by_opponent_player_meters = convert_pixel_distance_to_meters(
+            distance_covered_by_opponent_player_pixels,
+            constants.DOUBLE_LINE_WIDTH,
+            mini_court.get_width_of_mini_court()
+        )
+        # Speed of the opponent player
+        speed_of_opponent_player = distance_covered_by_opponent_player_meters / ball_shot_time_in_seconds * 3.6
+
+        current_player_stats = deepcopy(player_stats_data[-1])
+        current_player_stats["frame_num"] = start_frame
+        current_player_stats[f"player_{player_shot_ball}_number_of_shots"] += 1
+        current_player_stats[f"player_{player_shot_ball}_total_shot_speed"] += speed_of_ball_shot
+        current_player_stats[f"player_{player_shot_ball}_last_shot_speed"] = speed_of_ball_shot
+
+        # An opponent missing at either end of the shot keeps their previous speed
+        if not math.isnan(speed_of_opponent_player):
+            current_player_stats[f"player_{opponent_player_id}_total_player_speed"] += speed_of_opponent_player
+            current_player_stats[f"player_{opponent_player_id}_last_player_speed"] = speed_of_opponent_player
+
+        # Add shot type to player stats if classification is enabled
+        if shot_classifications and start_frame in shot_classifications:
+            shot_type = shot_classifications[start_frame]['shot_type']
+            current_player_stats[f"player_{player_shot_ball}_shot_type"] = shot_type
+
+        # In/out call and depth of the shot's bounce
+        if ball_shot_ind in bounce_calls:
+            is_in, depth = bounce_calls[ball_shot_ind]
+            current_player_stats[f"player_{player_shot_ball}_shots_{'in' if is_in else 'out'}"] += 1
+            if is_in:
+                current_player_stats[f"player_{player_shot_ball}_total_shot_depth"] += depth
+
+        player_stats_data.append(current_player_stats)
+
+    player_stats_data_df = pd.DataFrame(player_stats_data)
+    frames_df = pd.DataFrame({"frame_num": range(num_frames)})
+
+    player_state_data_df = pd.merge(frames_df, player_stats_data_df, on="frame_num", how="left")
+    player_state_data_df = player_state_data_df.ffill()
+
+    # Fixed column names and division logic
+    player_state_data_df["player_1_average_shot_speed"] = player_state_data_df["player_1_total_shot_speed"] / player_state_data_df["player_1_number_of_shots"].replace(0, 1)
+    player_state_data_df["player_2_average_shot_speed"] = player_state_data_df["player_2_total_shot_speed"] / player_state_data_df["player_2_number_of_shots"].replace(0, 1)
+
+    player_state_data_df["player_1_average_player_speed"] = player_state_data_df["player_1_total_player_speed"] / player_state_data_df["player_1_number_of_shots"].replace(0, 1)
+    player_state_data_df["player_2_average_player_speed"] = player_state_data_df["player_2_total_player_speed"] / player_state_data_df["player_2_number_of_shots"].replace(0, 1)
+
+    if bounces is not None:
+        for player_id in (1, 2):
+            player_state_data_df[f"player_{player_id}_average_shot_depth"] = (
+                player_state_data_df[f"player_{player_id}_total_shot_depth"] / player_state_data_df[f"player_{player_id}_shots_in"].replace(0, 1))
+
+    return player_state_data_df
+
+
+def segment_rallies(segmenter, video_frames, court_keypoints, ball_present, person_boxes, motion_energy=None):
+    """
+    Frame numbers of the rallies found by a RallySegmenter, or of every frame
+    when none is found. motion_energy of video_frames is measured here unless
+    it was already, e.g. while the frames were decoded.
+    """
+    if motion_energy is None:
+        motion_energy = segmenter.motion_energy(video_frames, court_keypoints)
+    active = segmenter.segment(segmenter.activity_scores(motion_energy, ball_present, person_boxes,
+                                                         video_frames[0].shape[0]))
+    if not active.any():
+        print("WARNING: No rallies found, processing every frame")
+        active[:] = True
+    starts, ends = get_segments(active)
+    print(f"Found {len(starts)} rallies covering {active.sum()} of {len(active)} frames")
+    return np.flatnonzero(active)
+
+
+def consume(frames):
+    """Read an iterable of frames to its end, e.g. so frames decoded in the background are all collected"""
+    for _ in frames:
+        pass
+
+
+def save_full_length_stub(detections, frame_numbers, num_frames, stub_path):
+    """Save detections of the kept frames as a stub covering every frame, with no detections in the skipped ones"""
+    if stub_path is None:
+        return
+    with open(stub_path, 'wb') as f:
+        pickle.dump(expand_frames(detections, frame_numbers, num_frames).to_frame_dicts(), f)
+
+
+def filters_before_detection(options):
+    """
+    Whether the court view filter and rally segmentation drop frames before
+    detection, or afterwards from detections covering every frame (stubs,
+    chunked detection).
+    """
+    chunked_detection = options.detection_workers is not None and options.detection_workers > 1
+    return (options.rally_segmentation or options.court_view_filter) and not options.read_from_stub and not chunked_detection
+
+
+@dataclass
+class MatchDetections:
+    """
+    Output of detect_match: the decoded video and the detections of the frames
+    kept for analysis.
+
+    Attributes:
+        fps: Frame rate of the video
+        all_video_frames: Every decoded frame, for the dead time of the output video
+        video_frames: The kept frames
+        frame_numbers: Numbers of the kept frames in all_video_frames, None while every frame is kept
+        court_keypoints: Court keypoints of the first frame
+        player_detections: TrackStore of person boxes, one row per kept frame
+        ball_detections: TrackStore of ball boxes, one row per kept frame
+    """
+
+    fps: float
+    all_video_frames: list
+    video_frames: list
+    frame_numbers: np.ndarray
+    court_keypoints: np.ndarray
+    player_detections: object
+    ball_detections: object
+
+
+@dataclass
+class MatchAnalysis:
+    """
+    Output of analyse_match: everything render_match draws over the kept frames.
+
+    Attributes:
+        video_frames: The frames analysed (the rallies of the kept frames with rally_segmentation)
+        frame_numbers: Numbers of those frames in the decoded video
+        rally_ids: Segment of every frame, split wherever frames were skipped
+        frame_court_keypoints: Court keypoints, per frame with track_court_keypoints
+        player_detections: TrackStore of the two players
+        ball_detections: TrackStore of the interpolated ball
+        mini_court: MiniCourt the positions were projected onto
+        ball_shot_frames: Indices of the frames where the ball is hit
+        bounces: Bounces from detect_ball_bounces, or None
+        player_mini_court_detections: Player positions on the mini court
+        ball_mini_court_detections: Ball positions on the mini court
+        shot_classifications: Shot type of every classified shot, keyed by shot frame
+        player_state_data_df: DataFrame of the per-frame player stats
+    """
+
+    video_frames: list
+    frame_numbers: np.ndarray
+    rally_ids: np.ndarray
+    frame_court_keypoints: np.ndarray
+    player_detections: object
+    ball_detections: object
+    mini_court: MiniCourt
+    ball_shot_frames: list
+    bounces: dict
+    player_mini_court_detections: object
+    ball_mini_court_detections: object
+    shot_classifications: dict
+    player_state_data_df: pd.DataFrame
+
+
+def detect_match(input_video_path, models, options, profiler, report):
+    """
+    Decode the video, detect the court, pick the frames to analyse and detect
+    the players and the ball in them.
+
+    Args:
+        input_video_path: Path of the video to analyse
+        models: PipelineModels holding the already loaded models
+        options: PipelineOptions
+        profiler: PipelineProfiler that records per-stage timings
+        report: Callable receiving (stage_name, fraction_done)
+
+    Returns:
+        MatchDetections
+    """
+    player_tracker = models.player_tracker
+    ball_tracker = models.ball_tracker
+    court_line_detector = models.court_line_detector
+    read_from_stub = options.read_from_stub
+    decode_backend = options.decode_backend
+
+    frame_cache = FrameCache(options.frame_cache_dir) if options.frame_cache_dir else None
+    cached = None
+    if frame_cache is not None:
+        if decode_backend == "auto":
+            # Resolved first, as frames decoded by different backends are cached apart
+            decode_backend = available_decode_backend()
+        with profiler.stage("frame_cache_lookup"):
+            cache_key = frame_cache.key(input_video_path, options.decode_scale, decode_backend)
+            cached = frame_cache.load(cache_key)
+        profiler.set_metadata(frame_cache_hit=cached is not None)
+
+    chunked_detection = options.detection_workers is not None and options.detection_workers > 1
+    if chunked_detection and not models.supports_chunked_detection:
+        raise ValueError(f"{type(models).__name__} does not support chunked detection (detection_workers)")
+    background_decode = bool(options.decode_buffer_slots) and not read_from_stub and cached is None
+    filter_before_detection = filters_before_detection(options)
+    decode_options = {"backend": decode_backend, "scale": options.decode_scale}
+    if cached is not None:
+        fps = cached[1]["fps"]
+    else:
+        with open_video(input_video_path, **decode_options) as video_decoder:
+            fps = video_decoder.fps
+            decode_backend = video_decoder.backend_name
+
+    # Reading video frames. frame_stream is read once, in order, by the first stage that
+    # looks at every frame: the court view filter, rally motion energy or player detection
+    frame_reader = None
+    try:
+        if cached is not None:
+            # Frames are paged in from the memory-mapped cache as they are used
+            video_frames = cached[0]
+            first_frame = video_frames[0]
+            frame_stream = video_frames
+            report(f"Loaded {len(video_frames)} cached frames at {fps:g} fps for {input_video_path}", 0.05)
+        elif background_decode:
+            # Frames are decoded by another process into shared memory. The first stage reads
+            # each one in place, and it is copied into video_frames for the later stages as
+            # its slot is released
+            frame_reader = SharedMemoryVideoReader(input_video_path, num_slots=options.decode_buffer_slots,
+                                                   decode_options=decode_options).start()
+            video_frames = []
+            decoded_frames = frame_reader.frames(collected=video_frames)
+            first_view = next(decoded_frames, None)
+            if first_view is None:
+                raise ValueError(f"No frames could be read from {input_video_path}")
+            # The view is only valid until the next frame is read
+            first_frame = first_view.copy()
+            frame_stream = chain([first_view], decoded_frames)
+            del first_view
+            report(f"Decoding {input_video_path} in the background", 0.05)
+        else:
+            with profiler.stage("decode"):
+                video_frames = read_video(input_video_path, **decode_options)
+            profiler.add_frames("decode", len(video_frames))
+            if not video_frames:
+                raise ValueError(f"No frames could be read from {input_video_path}")
+            first_frame = video_frames[0]
+            frame_stream = video_frames
+            report(f"Loaded {len(video_frames)} frames at {fps:g} fps from {input_video_path}", 0.05)
+
+        # Court Line Detection, first so player detection can be restricted to the court
+        report("Detecting court lines...", 0.08)
+        with profiler.stage("court_keypoints", 1):
+            court_keypoints = court_line_detector.predict(first_frame)
+        if options.enable_court_mask and not options.track_court_keypoints:
+            # With tracking the camera moves, so the first frame's court region would drop the players
+            player_tracker.set_court_region(court_keypoints)
+        elif options.enable_court_mask:
+            print("Court mask disabled: court keypoints are tracked per frame, players are filtered on them instead")
+        if options.ball_tile_size:
+            ball_tracker.set_tiling(tile_size=options.ball_tile_size)
+        # One planner for both trackers, so each decoded frame is resized once per scale
+        resolution_planner = ResolutionPlanner({"players": options.player_input_scale})
+        player_tracker.resolution_planner = resolution_planner
+        ball_tracker.resolution_planner = resolution_planner
+
+        # Numbers of the frames kept for analysis, None while every frame is kept
+        all_video_frames = video_frames
+        frame_numbers = None
+        if options.court_view_filter:
+            report("Classifying camera views...", 0.085)
+            with profiler.stage("court_view_filter") as stats:
+                classifier = CourtViewClassifier(first_frame, court_keypoints, keypoint_detector=court_line_detector,
+                                                 fps=fps)
+                frame_numbers = np.flatnonzero(classifier.classify_frames(frame_stream))
+                frame_stream = all_video_frames
+                stats.frames += len(all_video_frames)
+            print(f"{len(frame_numbers)} of {len(all_video_frames)} frames show the main court camera")
+            profiler.set_metadata(court_view_frames=len(frame_numbers))
+            if len(frame_numbers) == 0:
+                print("WARNING: No court view frames found, processing every frame")
+                frame_numbers = None
+        if options.rally_segmentation and filter_before_detection:
+            report("Segmenting rallies...", 0.09)
+            with profiler.stage("rally_segmentation") as stats:
+                segmenter = RallySegmenter(fps=fps)
+                motion_energy = None
+                if frame_stream is not all_video_frames:
+                    # Every frame is still kept, so motion energy is measured as the frames are decoded
+                    motion_energy = segmenter.motion_energy(frame_stream, court_keypoints)
+                    frame_stream = all_video_frames
+                kept = np.arange(len(all_video_frames)) if frame_numbers is None else frame_numbers
+                kept_frames = [all_video_frames[i] for i in kept]
+                ball_present, person_boxes = segmenter.probe_models(kept_frames, player_tracker, ball_tracker)
+                frame_numbers = kept[segment_rallies(segmenter, kept_frames, court_keypoints, ball_present, person_boxes,
+                                                     motion_energy=motion_energy)]
+                stats.frames += len(kept_frames)
+        if filter_before_detection:
+            # Only the kept frames are detected; the rest is left out of every later stage
+            if frame_numbers is None:
+                frame_numbers = np.arange(len(all_video_frames))
+            video_frames = frame_stream = [all_video_frames[i] for i in frame_numbers]
+
+        # Detecting players and ball
+        report("Detecting players...", 0.1)
+        if chunked_detection:
+            with ThreadPoolExecutor(max_workers=1) as executor, profiler.stage("detect_players") as stats:
+                # The workers decode their own chunks, while this process collects the frames for the later stages
+                collecting = executor.submit(consume, frame_stream)
+                player_detections = player_tracker.detect_video_chunked(input_video_path,
+                                                                        num_workers=options.detection_workers,
+                                                                        read_from_stub=read_from_stub,
+                                                                        stub_path=options.player_stub_path,
+                                                                        decode_options=decode_options)
+                collecting.result()
+                stats.frames += len(video_frames)
+        else:
+            player_detections = player_tracker.detect_frames(profiler.timed_frames("detect_players", frame_stream),
+                                                             read_from_stub=read_from_stub,
+                                                             stub_path=None if filter_before_detection else options.player_stub_path)
+            if filter_before_detection:
+                save_full_length_stub(player_detections, frame_numbers, len(all_video_frames), options.player_stub_path)
+        if frame_reader is not None:
+            # Collect any frames no stage consumed
+            consume(decoded_frames)
+            profiler.add_frames("decode", len(all_video_frames))
+            profiler.set_metadata(decode_wait_seconds=round(frame_reader.wait_seconds, 6))
+    finally:
+        if frame_reader is not None:
+            frame_reader.close()
+
+    if frame_cache is not None and cached is None:
+        with profiler.stage("frame_cache_store", len(all_video_frames)):
+            frame_cache.store(cache_key, all_video_frames, fps, video_path=os.path.abspath(input_video_path),
+                              decode_backend=decode_backend)
+
+    num_frames = len(all_video_frames)
+    profiler.set_metadata(input_video_path=input_video_path, num_frames=num_frames,
+                          frame_shape=list(first_frame.shape), fps=fps, decode_backend=decode_backend)
+
+    report("Detecting ball...", 0.4)
+    if chunked_detection:
+        with profiler.stage("detect_ball", num_frames):
+            ball_detections = ball_tracker.detect_video_chunked(input_video_path, num_workers=options.detection_workers,
+                                                                read_from_stub=read_from_stub,
+                                                                stub_path=options.ball_stub_path,
+                                                                decode_options=decode_options)
+    else:
+        ball_detections = ball_tracker.detect_frames(profiler.timed_frames("detect_ball", video_frames),
+                                                     read_from_stub=read_from_stub,
+                                                     stub_path=None if filter_before_detection else options.ball_stub_path)
+        if filter_before_detection:
+            save_full_length_stub(ball_detections, frame_numbers, num_frames, options.ball_stub_path)
+
+    if frame_numbers is not None and not filter_before_detection:
+        # Detections cover every frame; keep those of the court view frames
+        video_frames = [all_video_frames[i] for i in frame_numbers]
+        player_detections = take_frames(player_detections, frame_numbers)
+        ball_detections = take_frames(ball_detections, frame_numbers)
+
+    return MatchDetections(fps=fps, all_video_frames=all_video_frames, video_frames=video_frames,
+                           frame_numbers=frame_numbers, court_keypoints=court_keypoints,
+                           player_detections=player_detections, ball_detections=ball_detections)
+
+
+def analyse_match(input_video_path, models, detections, options, profiler, report):
+    """
+    Turn the detections into the two players' tracks, shots, bounces and stats.
+
+    Args:
+        input_video_path: Path of the video, to key the pose cache
+        models: PipelineModels holding the already loaded models
+        detections: MatchDetections from detect_match
+        options: PipelineOptions
+        profiler: PipelineProfiler that records per-stage timings
+        report: Callable receiving (stage_name, fraction_done)
+
+    Returns:
+        MatchAnalysis
+    """
+    player_tracker = models.player_tracker
+    ball_tracker = models.ball_tracker
+    court_line_detector = models.court_line_detector
+    fps = detections.fps
+    court_keypoints = detections.court_keypoints
+    video_frames = detections.video_frames
+    frame_numbers = detections.frame_numbers
+    player_detections = detections.player_detections
+    ball_detections = detections.ball_detections
+    num_frames = len(detections.all_video_frames)
+
+    if options.rally_segmentation and not filters_before_detection(options):
+        report("Segmenting rallies...", 0.5)
+        kept = np.arange(num_frames) if frame_numbers is None else frame_numbers
+        with profiler.stage("rally_segmentation", len(kept)):
+            segmenter = RallySegmenter(fps=fps)
+            ball_present, person_boxes = segmenter.probe_detections(player_detections, ball_detections)
+            selection = segment_rallies(segmenter, video_frames, court_keypoints, ball_present, person_boxes)
+        frame_numbers = kept[selection]
+        video_frames = [video_frames[i] for i in selection]
+        player_detections = take_frames(player_detections, selection)
+        ball_detections = take_frames(ball_detections, selection)
+
+    # From here on every stage works on the kept frames; rally_ids keeps the segments between skipped frames apart
+    if frame_numbers is None:
+        frame_numbers = np.arange(num_frames)
+    else:
+        profiler.set_metadata(kept_frames=len(frame_numbers), segments=int(get_rally_ids(frame_numbers)[-1]) + 1)
+    rally_ids = get_rally_ids(frame_numbers)
+    num_frames = len(video_frames)
+
+    if options.track_court_keypoints:
+        report("Tracking court keypoints...", 0.58)
+        with profiler.stage("court_tracking", num_frames):
+            keypoint_tracker = CourtKeypointTracker(court_line_detector)
+            # Keypoints are detected again wherever skipped frames split the video
+            frame_court_keypoints = keypoint_tracker.track_frames(
+                video_frames, initial_keypoints=court_keypoints if frame_numbers[0] == 0 else None,
+                segment_starts=[start for start, end in get_rally_bounds(rally_ids)])
+        print(f"Tracked court keypoints with {keypoint_tracker.detections} keypoint model calls")
+        profiler.set_metadata(court_keypoint_detections=keypoint_tracker.detections)
+    else:
+        frame_court_keypoints = court_keypoints
+
+    report("Interpolating ball positions...", 0.6)
+    with profiler.stage("interpolate_ball", num_frames):
+        ball_detections = map_rallies(ball_detections, rally_ids, ball_tracker.interpolate_ball_positions)
+
+    # Choose players
+    report("Filtering players...", 0.64)
+    with profiler.stage("choose_players", num_frames):
+        player_detections = player_tracker.choose_and_filter_players(player_detections, frame_court_keypoints, fps=fps)
+    with profiler.stage("interpolate_players", num_frames):
+        player_detections = map_rallies(player_detections, rally_ids, player_tracker.interpolate_player_positions)
+
+    # MiniCourt
+    report("Setting up mini court visualization...", 0.65)
+    mini_court = MiniCourt(video_frames[0])
+
+    # Detect ball shots
+    report("Detecting ball shots...", 0.66)
+    with profiler.stage("shot_detection", num_frames):
+        ball_shot_frames = [start + shot_frame for start, end in get_rally_bounds(rally_ids)
+                            for shot_frame in ball_tracker.get_ball_shot_frames(take_frames(ball_detections, np.arange(start, end)))]
+    print(f"Detected ball shots at frames: {[int(frame_numbers[i]) for i in ball_shot_frames]}")
+
+    bounces = None
+    if options.detect_bounces:
+        report("Detecting ball bounces...", 0.67)
+        with profiler.stage("bounce_detection", num_frames):
+            bounces = detect_ball_bounces(ball_detections, ball_shot_frames, frame_court_keypoints,
+                                          player_detections=player_detections, rally_ids=rally_ids)
+        print(f"Detected {len(bounces['frames'])} bounces, {int((~bounces['in']).sum())} out")
+        profiler.set_metadata(bounces=len(bounces['frames']), bounces_out=int((~bounces['in']).sum()))
+
+    # Convert positions to mini court positions
+    report("Converting to mini court coordinates...", 0.68)
+    with profiler.stage("projection", num_frames):
+        player_mini_court_detections, ball_mini_court_detections = mini_court.convert_bounding_boxes_to_mini_court_coordinates(
+            player_detections, ball_detections, frame_court_keypoints)
+
+    # Shot Classification (if enabled)
+    shot_classifications = {}
+    if options.enable_shot_classification:
+        report("Classifying shots...", 0.7)
+        with profiler.stage("shot_classification"):
+            fallback_kwargs = {}
+            if models.pose_estimator is not None:
+                # Pose model on the hitter crops around each shot only
+                video_key = hash_video_file(input_video_path) if options.pose_cache_dir else None
+                shot_classifier = PoseShotClassifier(models.pose_estimator,
+                                                     cache=PoseShotCache(options.pose_cache_dir, video_key=video_key))
+                fallback_kwargs = dict(video_frames=video_frames, player_detections=player_detections,
+                                       ball_detections=ball_detections, frame_numbers=frame_numbers)
+            else:
+                shot_classifier = ShotClassifier()
+            if models.shot_model is not None:
+                # Trained model on the shot features, the classifier above where it is unsure
+                shot_classifier = ModelShotClassifier(models.shot_model, fallback=shot_classifier, fps=fps)
+            shot_classifications = shot_classifier.classify_shots(
+                player_mini_court_detections,
+                ball_mini_court_detections,
+                ball_shot_frames,
+                mini_court.court_height,
+                **fallback_kwargs
+            )
+            if models.pose_estimator is not None:
+                profiler.set_metadata(pose_classified_shots=sum(c['pose'] for c in shot_classifications.values()))
+            if models.shot_model is not None:
+                profiler.set_metadata(model_classified_shots=sum(c['model'] for c in shot_classifications.values()))
+        print(f"Classified {len(shot_classifications)} shots")
+
+    with profiler.stage("player_stats", num_frames):
+        player_state_data_df = compute_player_stats(ball_shot_frames, ball_mini_court_detections,
+                                                    player_mini_court_detections, mini_court,
+                                                    num_frames, shot_classifications, fps=fps, rally_ids=rally_ids,
+                                                    bounces=bounces)
+
+    # Higher confidence thresholds for both player and ball detections to reduce false positives
+    player_confidence_threshold = 0.7  # Only consider high-confidence player detections
+    ball_confidence_threshold = 0.6    # Slightly lower for ball as it's smaller and harder to detect
+
+    # Apply additional filtering to player detections based on court position and size
+    print("Enhancing player detection accuracy...")
+    player_detections = player_tracker.filter_by_confidence(player_detections, player_confidence_threshold)
+
+    # Apply additional filtering to ball detections
+    print("Enhancing ball detection accuracy...")
+    ball_detections = ball_tracker.filter_by_confidence(ball_detections, ball_confidence_threshold)
+
+    return MatchAnalysis(video_frames=video_frames, frame_numbers=frame_numbers, rally_ids=rally_ids,
+                         frame_court_keypoints=frame_court_keypoints, player_detections=player_detections,
+                         ball_detections=ball_detections, mini_court=mini_court, ball_shot_frames=ball_shot_frames,
+                         bounces=bounces, player_mini_court_detections=player_mini_court_detections,
+                         ball_mini_court_detections=ball_mini_court_detections,
+                         shot_classifications=shot_classifications, player_state_data_df=player_state_data_df)
+
+
+def render_match(output_video_path, models, detections, analysis, options, profiler, report):
+    """
+    Draw the analysis over the analysed frames and encode the output video.
+
+    Frames are rendered and encoded a chunk at a time. Overlays are drawn on
+    copies, so the decoded (or memory-mapped) frames are never written to and
+    only one chunk of rendered frames is held in RAM.
+
+    Args:
+        output_video_path: Path the annotated video is written to
+        models: PipelineModels holding the already loaded models
+        detections: MatchDetections from detect_match
+        analysis: MatchAnalysis from analyse_match
+        options: PipelineOptions
+        profiler: PipelineProfiler that records per-stage timings
+        report: Callable receiving (stage_name, fraction_done)
+
+    Returns:
+        Whether the video was written
+    """
+    player_tracker = models.player_tracker
+    ball_tracker = models.ball_tracker
+    court_line_detector = models.court_line_detector
+    fps = detections.fps
+    all_video_frames = detections.all_video_frames
+    video_frames = analysis.video_frames
+    frame_numbers = analysis.frame_numbers
+    frame_court_keypoints = analysis.frame_court_keypoints
+    mini_court = analysis.mini_court
+    bounces = analysis.bounces
+    num_frames = len(video_frames)
+
+    report("Creating output video...", 0.75)
+    output_dir = os.path.dirname(output_video_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    per_frame_keypoints = np.ndim(frame_court_keypoints) == 2
+    shot_frame_set = set(analysis.ball_shot_frames)
+    heatmap_overlay = None
+    if options.court_heatmaps:
+        # Player occupancy, re-rendered once a second of video
+        heatmap_overlay = HeatmapOverlay(mini_court, CourtHeatmap(), update_interval=max(1, int(fps)))
+    copy_dead_time = len(frame_numbers) < len(all_video_frames) and options.dead_time_output == "copy"
+    next_source_frame = 0
+
+    out = create_video_writer(output_video_path, fps, backend=options.video_writer, preset=options.encode_preset,
+                              crf=options.encode_crf)
+    try:
+        for start in range(0, num_frames, RENDER_CHUNK_FRAMES):
+            end = min(start + RENDER_CHUNK_FRAMES, num_frames)
+            chunk_frames = np.arange(start, end)
+            output_video_frames = [np.array(frame) for frame in video_frames[start:end]]
+
+            # Draw Player Bounding Boxes - with darker, more prominent outlines
+            with profiler.stage("render_player_bboxes", len(chunk_frames)):
+                output_video_frames = player_tracker.draw_bboxes(
+                    output_video_frames, take_frames(analysis.player_detections, chunk_frames), thickness=2)
+
+            # Draw Ball Bounding Boxes - with enhanced visibility
+            with profiler.stage("render_ball_bboxes", len(chunk_frames)):
+                output_video_frames = ball_tracker.draw_bboxes(
+                    output_video_frames, take_frames(analysis.ball_detections, chunk_frames), color=(0, 255, 255),
+                    thickness=2)
+
+            # Draw Player Stats
+            with profiler.stage("render_player_stats", len(chunk_frames)):
+                output_video_frames = draw_player_stats(output_video_frames,
+                                                        analysis.player_state_data_df.iloc[start:end].reset_index(drop=True))
+
+            # Draw Court Keypoints - matching the keypoints that will be shown on mini court
+            with profiler.stage("render_court_keypoints", len(chunk_frames)):
+                output_video_frames = court_line_detector.draw_keypoints_on_video(
+                    output_video_frames, frame_court_keypoints[start:end] if per_frame_keypoints else frame_court_keypoints,
+                    point_color=(0, 140, 255), radius=5)
+
+            # Draw Mini Court with improved visual styling without labels
+            with profiler.stage("render_mini_court", len(chunk_frames)):
+                output_video_frames = mini_court.draw_mini_court(output_video_frames)
+
+                if heatmap_overlay is not None:
+                    output_video_frames, _ = mini_court.draw_heatmaps(
+                        output_video_frames, take_frames(analysis.player_mini_court_detections, chunk_frames),
+                        bounces=bounces, overlay=heatmap_overlay, start_frame=start)
+
+                # Draw ball trajectory first as background layer with improved visual style
+                output_video_frames = mini_court.draw_ball_trajectory(
+                    output_video_frames, take_frames(analysis.ball_mini_court_detections, chunk_frames))
+
+                # Draw players with improved visibility - darker, more prominent circles
+                output_video_frames = mini_court.draw_points_on_mini_court(
+                    output_video_frames, take_frames(analysis.player_mini_court_detections, chunk_frames),
+                    color=(0, 255, 0), draw_trail=True, label=None)
+
+                # Draw current ball position with improved visibility
+                output_video_frames = mini_court.draw_points_on_mini_court(
+                    output_video_frames, take_frames(analysis.ball_mini_court_detections, chunk_frames),
+                    color=(0, 255, 255), label=None)
+
+                if bounces is not None:
+                    output_video_frames = mini_court.draw_bounces(output_video_frames, bounces, hold_frames=int(fps),
+                                                                  start_frame=start)
+
+            # Draw frame number and additional info on top left corner
+            with profiler.stage("render_frame_info", len(chunk_frames)):
+                for i, frame in zip(chunk_frames, output_video_frames):
+                    # Draw frame number
+                    cv2.putText(frame, f"Frame: {frame_numbers[i]}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+
+                    # Indicate if this is a ball shot frame
+                    if i in shot_frame_set:
+                        cv2.putText(frame, "BALL SHOT!", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+
+            # Add shot classification overlays if enabled
+            if options.enable_shot_classification:
+                with profiler.stage("render_shot_classifications", len(chunk_frames)):
+                    output_video_frames = draw_shot_classifications(output_video_frames, analysis.shot_classifications,
+                                                                    analysis.ball_shot_frames, start_frame=start)
+
+            with profiler.stage("encode", len(chunk_frames)):
+                for i, frame in zip(chunk_frames, output_video_frames):
+                    if copy_dead_time:
+                        # Skipped frames go out as decoded, between the rendered segments
+                        for source_frame in range(next_source_frame, frame_numbers[i]):
+                            out.write(all_video_frames[source_frame])
+                        next_source_frame = frame_numbers[i] + 1
+                    out.write(frame)
+        if copy_dead_time:
+            with profiler.stage("encode", len(all_video_frames) - next_source_frame):
+                for source_frame in range(next_source_frame, len(all_video_frames)):
+                    out.write(all_video_frames[source_frame])
+    except IOError as e:
+        print(f"CRITICAL ERROR: {e}")
+        out.close()
+        success = False
+    else:
+        success = out.close()
+        if success:
+            print(f"Successfully saved video to {output_video_path}")
+        else:
+            print(f"WARNING: Video file creation failed or file is empty")
+
+    if heatmap_overlay is not None and options.heatmap_path:
+        heatmap_overlay.heatmap.save(options.heatmap_path)
+        print(f"Saved court heatmaps to {options.heatmap_path}")
+
+    return success
+
+
+def process_video(input_video_path, output_video_path, models, options=None, progress_callback=None, profiler=None):
+    """
+    Run detection, analysis and rendering for a single match video.
+
+    Args:
+        input_video_path: Path of the video to analyse
+        output_video_path: Path the annotated video is written to
+        models: PipelineModels holding the already loaded models
+        options: PipelineOptions, the defaults when None
+        progress_callback: Optional callable receiving (stage_name, fraction_done)
+        profiler: Optional PipelineProfiler that records per-stage timings
+
+    Returns:
+        Path of the written video, or None if saving failed
+    """
+    def report(stage, fraction):
+        if progress_callback is None:
+            print(stage)
+        else:
+            progress_callback(stage, fraction)
+
+    options = options or PipelineOptions()
+    profiler = profiler or NULL_PROFILER
+    models.reset()
+
+    detections = detect_match(input_video_path, models, options, profiler, report)
+    analysis = analyse_match(input_video_path, models, detections, options, profiler, report)
+    if render_match(output_video_path, models, detections, analysis, options, profiler, report):
+        report(f"Processing complete! Video saved to {output_video_path}", 1.0)
+        return output_video_path
+
+    print(f"ERROR: Failed to save video to {output_video_path}")
+    return None
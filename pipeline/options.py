@@ -0,0 +1,84 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class PipelineOptions:
+    """
+    Every option of process_video, built once by main.py or batch_process.py
+    and passed unchanged through BatchRunner to the detect, analyse and render
+    stages.
+
+    Attributes:
+        read_from_stub: Whether to read cached detections from the stub paths
+        player_stub_path: Optional pickle path for player detections
+        ball_stub_path: Optional pickle path for ball detections
+        enable_shot_classification: Whether to classify and draw shot types
+        detection_workers: When greater than 1, run detection on overlapping video
+            chunks in this many worker processes instead of one sequential loop
+        enable_court_mask: Whether to only detect people inside the court region
+            derived from the court keypoints (of the first frame, so it is not
+            applied with track_court_keypoints)
+        ball_tile_size: When set, detect the ball on overlapping tiles of this
+            size at native resolution (for 4K input) instead of the whole frame
+        player_input_scale: When set, run the player model on frames downscaled
+            by this factor at the matching input size; the ball stays at full resolution
+        decode_buffer_slots: When set, decode in a separate process into a shared
+            memory ring buffer of this many frames while the first stage that
+            reads every frame (the court view filter, rally motion energy,
+            player detection, or frame collection during chunked detection)
+            runs, instead of decoding the whole video up front (ignored with
+            stubs and cached frames)
+        decode_backend: "opencv", "pyav", "ffmpeg" or "auto" for the best installed
+            decoder; the video's own frame rate is used for speeds and the output
+        decode_scale: When set, downscale frames by this factor while decoding, so
+            the whole pipeline runs at that resolution (stubs must match it)
+        video_writer: "ffmpeg" for H.264 (fragmented MP4 for .mp4 paths, playable
+            while it is written), "opencv" for XVID/mp4v, or "auto" for ffmpeg when installed
+        encode_preset: x264 preset used by the ffmpeg writer
+        encode_crf: x264 constant rate factor used by the ffmpeg writer
+        frame_cache_dir: When set, keep the decoded frames in a memory-mapped cache
+            in this directory, keyed by the video hash, and read them from there
+            instead of decoding on later runs (e.g. render-only reruns from stubs)
+        rally_segmentation: Whether to find the rallies first and run detection,
+            shot detection and stats only on them
+        dead_time_output: With rally_segmentation or court_view_filter, "copy" writes the
+            skipped frames without overlays and "skip" leaves them out of the output video
+        court_view_filter: Whether to skip frames not showing the main court camera
+            (replays, close-ups, graphics) in detection and every later stage
+        track_court_keypoints: Whether to follow the court keypoints through camera
+            pans and zooms with optical flow, instead of using the first frame's
+            keypoints for the whole video
+        pose_cache_dir: With a pose model in the models, keep the hitter crops, poses and
+            pose features of every shot in this directory, keyed by the video hash
+        detect_bounces: Whether to find the ball's bounce after every shot, call it
+            in or out against the court lines, add in/out and depth stats per player
+            and mark the bounces on the mini court
+        court_heatmaps: Whether to accumulate player (and, with detect_bounces, bounce)
+            occupancy heatmaps frame by frame and draw them over the mini court
+        heatmap_path: With court_heatmaps, .npz path the match's heatmaps are saved
+            to, so they can be merged across matches (set per video by BatchRunner)
+    """
+
+    read_from_stub: bool = False
+    player_stub_path: str = None
+    ball_stub_path: str = None
+    enable_shot_classification: bool = True
+    detection_workers: int = None
+    enable_court_mask: bool = True
+    ball_tile_size: int = None
+    player_input_scale: float = None
+    decode_buffer_slots: int = None
+    decode_backend: str = "opencv"
+    decode_scale: float = None
+    video_writer: str = "auto"
+    encode_preset: str = "veryfast"
+    encode_crf: int = 23
+    frame_cache_dir: str = None
+    rally_segmentation: bool = False
+    dead_time_output: str = "copy"
+    court_view_filter: bool = False
+    track_court_keypoints: bool = False
+    pose_cache_dir: str = None
+    detect_bounces: bool = False
+    court_heatmaps: bool = False
+    heatmap_path: str = None
@@ -0,0 +1,238 @@
+import cv2
+import numpy as np
+import sys
+sys.path.append("../")
+from utils import TrackStore, as_track_store, get_player_region_polygon
+
+
+class RallySegmenter:
+    """
+    Cheap detector of the frames where a point is being played, so dead time
+    (changeovers, towel breaks, walking between points) can skip inference.
+
+    Three signals are combined into a per-frame activity score:
+      - motion energy: mean frame difference inside the court region, on small
+        grayscale frames, relative to the video's own busy level
+      - ball density: share of probe frames in which the ball is detected
+      - player movement: how fast the people on court move between probe frames,
+        relative to a brisk rally pace
+    Probe frames are a sparse sample (every probe_interval_seconds) on which
+    the models run before the full detection pass. Each signal is averaged
+    over smoothing_seconds, and the score is thresholded with hysteresis; short
+    pauses are bridged, short bursts dropped and every rally is padded.
+    """
+
+    def __init__(self, fps=24, probe_interval_seconds=0.5, smoothing_seconds=1.0,
+                 enter_threshold=0.4, exit_threshold=0.25, min_rally_seconds=2.0, min_gap_seconds=3.0,
+                 padding_seconds=1.0, motion_downscale=8, weights=(0.4, 0.3, 0.3),
+                 reference_player_speed=0.15):
+        """
+        Args:
+            fps: Frame rate of the video
+            probe_interval_seconds: Time between probe frames
+            smoothing_seconds: Moving-average window applied to every signal
+            enter_threshold: Score at which a rally starts
+            exit_threshold: Score below which a rally ends
+            min_rally_seconds: Shorter active stretches are treated as dead time
+            min_gap_seconds: Shorter pauses between rallies are kept active
+            padding_seconds: Frames kept active before and after every rally
+            motion_downscale: Downscale factor of the frames used for motion energy
+            weights: Weights of the motion, ball and player signals
+            reference_player_speed: Player speed, in frame heights per second,
+                that counts as full rally activity
+        """
+        self.fps = fps
+        self.probe_stride = max(1, int(round(probe_interval_seconds * fps)))
+        self.smoothing_frames = max(1, int(round(smoothing_seconds * fps)))
+        self.enter_threshold = enter_threshold
+        self.exit_threshold = exit_threshold
+        self.min_rally_frames = int(round(min_rally_seconds * fps))
+        self.min_gap_frames = int(round(min_gap_seconds * fps))
+        self.padding_frames = int(round(padding_seconds * fps))
+        self.motion_downscale = motion_downscale
+        self.weights = np.asarray(weights, dtype=np.float64) / np.sum(weights)
+        self.reference_player_speed = reference_player_speed
+
+    def probe_frame_numbers(self, num_frames):
+        return np.arange(0, num_frames, self.probe_stride)
+
+    def motion_energy(self, frames, court_keypoints):
+        """
+        Mean absolute grayscale difference to the previous frame inside the
+        court region, per frame. frames may be any iterable read once in
+        order, e.g. frames streamed from a decoder.
+        """
+        energy = []
+        mask = None
+        previous = None
+        for frame in frames:
+            small = cv2.resize(frame, None, fx=1 / self.motion_downscale, fy=1 / self.motion_downscale,
+                               interpolation=cv2.INTER_AREA)
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            if mask is None:
+                mask = np.zeros(gray.shape, dtype=np.uint8)
+                polygon = get_player_region_polygon(court_keypoints) / self.motion_downscale
+                cv2.fillConvexPoly(mask, np.round(polygon).astype(np.int32), 1)
+                if not mask.any():
+                    mask[:] = 1
+            energy.append(cv2.mean(cv2.absdiff(gray, previous), mask=mask)[0] if previous is not None else 0.0)
+            previous = gray
+        energy = np.array(energy, dtype=np.float64)
+        if len(energy) > 1:
+            energy[0] = energy[1]
+        return energy
+
+    def probe_models(self, frames, player_tracker, ball_tracker, batch_size=8):
+        """
+        Run both models, without tracking, on the probe frames.
+
+        Returns:
+            (ball_present, person_boxes): a boolean per probe frame and a list
+            of [x1, y1, x2, y2, ...] boxes per probe frame
+        """
+        ball_present, person_boxes = [], []
+        probe_frames = [frames[i] for i in self.probe_frame_numbers(len(frames))]
+        for start in range(0, len(probe_frames), batch_size):
+            batch = probe_frames[start:start + batch_size]
+            ball_present.extend(1 in ball_dict for ball_dict in ball_tracker.detect_batch(batch))
+            person_boxes.extend(player_tracker.detect_persons_batch(batch))
+        return np.array(ball_present, dtype=bool), person_boxes
+
+    def probe_detections(self, player_detections, ball_detections):
+        """The probe signals read from detections that already cover every frame (stubs, chunked detection)"""
+        player_detections = as_track_store(player_detections)
+        ball_detections = as_track_store(ball_detections)
+        probes = self.probe_frame_numbers(len(ball_detections))
+        ball_present = ball_detections.present[probes].any(axis=1)
+        person_boxes = [player_detections.values[i][player_detections.present[i]] for i in probes]
+        return ball_present, person_boxes
+
+    def player_speed(self, person_boxes, frame_height):
+        """Mean speed of the people on court between consecutive probes, in frame heights per second"""
+        speeds = np.zeros(len(person_boxes), dtype=np.float64)
+        seconds = self.probe_stride / self.fps
+        for i in range(1, len(person_boxes)):
+            current, previous = np.asarray(person_boxes[i]), np.asarray(person_boxes[i - 1])
+            if len(current) == 0 or len(previous) == 0:
+                continue
+            # Each person is matched to the nearest person of the previous probe
+            current_centers = (current[:, :2] + current[:, 2:4]) / 2
+            previous_centers = (previous[:, :2] + previous[:, 2:4]) / 2
+            distances = np.linalg.norm(current_centers[:, None, :] - previous_centers[None, :, :], axis=-1)
+            speeds[i] = distances.min(axis=1).mean() / frame_height / seconds
+        return speeds
+
+    def _smooth(self, values):
+        """Centred moving average, over fewer frames near the ends of the video"""
+        kernel = np.ones(min(self.smoothing_frames, len(values)))
+        return np.convolve(values, kernel, mode="same") / np.convolve(np.ones(len(values)), kernel, mode="same")
+
+    def activity_scores(self, motion_energy, ball_present, person_boxes, frame_height):
+        """Per-frame activity score in [0, 1] from the three signals"""
+        num_frames = len(motion_energy)
+        probes = self.probe_frame_numbers(num_frames)
+        frame_numbers = np.arange(num_frames)
+
+        busy_level = np.percentile(motion_energy, 90) if num_frames else 0.0
+        motion = np.clip(motion_energy / busy_level, 0, 1) if busy_level > 0 else np.zeros(num_frames)
+        # Probe signals are spread to every frame by linear interpolation between probes
+        ball = np.interp(frame_numbers, probes, np.asarray(ball_present, dtype=np.float64))
+        speed = np.interp(frame_numbers, probes, self.player_speed(person_boxes, frame_height))
+        players = np.clip(speed / self.reference_player_speed, 0, 1)
+
+        signals = np.stack([self._smooth(motion), self._smooth(ball), self._smooth(players)])
+        return self.weights @ signals
+
+    def segment(self, scores):
+        """
+        Active frames from the activity scores.
+
+        Returns:
+            (N,) boolean array
+        """
+        active = np.zeros(len(scores), dtype=bool)
+        in_rally = False
+        for i, score in enumerate(scores):
+            in_rally = score >= self.exit_threshold if in_rally else score >= self.enter_threshold
+            active[i] = in_rally
+
+        active = self._fill_runs(active, False, self.min_gap_frames, keep_edges=True)
+        active = self._fill_runs(active, True, self.min_rally_frames, keep_edges=False)
+        padded = np.zeros_like(active)
+        for start, end in zip(*get_segments(active)):
+            padded[max(0, start - self.padding_frames):end + self.padding_frames] = True
+        return padded
+
+    @staticmethod
+    def _fill_runs(active, value, min_length, keep_edges):
+        """Flip runs of value shorter than min_length (runs touching the ends are kept when keep_edges)"""
+        active = active.copy()
+        starts, ends = get_segments(active == value)
+        for start, end in zip(starts, ends):
+            touches_edge = start == 0 or end == len(active)
+            if end - start < min_length and not (keep_edges and touches_edge):
+                active[start:end] = not value
+        return active
+
+
+def get_segments(active):
+    """
+    Runs of True in a boolean array.
+
+    Returns:
+        (starts, ends) arrays, ends exclusive
+    """
+    padded = np.concatenate([[False], np.asarray(active, dtype=bool), [False]])
+    changes = np.flatnonzero(padded[1:] != padded[:-1])
+    return changes[0::2], changes[1::2]
+
+
+def get_rally_ids(frame_numbers):
+    """Rally index of every kept frame; a new rally starts wherever the kept frame numbers jump"""
+    frame_numbers = np.asarray(frame_numbers)
+    if len(frame_numbers) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate([[0], np.cumsum(np.diff(frame_numbers) > 1)])
+
+
+def get_rally_bounds(rally_ids):
+    """(start, end) of every rally in the kept frames, ends exclusive"""
+    rally_ids = np.asarray(rally_ids)
+    starts = np.flatnonzero(np.diff(rally_ids, prepend=-1) != 0)
+    return list(zip(starts.tolist(), np.append(starts[1:], len(rally_ids)).tolist()))
+
+
+def take_frames(detections, frame_numbers):
+    """TrackStore holding only the given frames, in the given order"""
+    detections = as_track_store(detections)
+    return TrackStore.from_arrays(detections.values[frame_numbers], detections.present[frame_numbers],
+                                  detections.track_ids)
+
+
+def expand_frames(detections, frame_numbers, num_frames):
+    """Inverse of take_frames: a num_frames long TrackStore with the detections at frame_numbers and nothing elsewhere"""
+    detections = as_track_store(detections)
+    values = np.full((num_frames,) + detections.values.shape[1:], np.nan)
+    present = np.zeros((num_frames, detections.num_tracks), dtype=bool)
+    values[frame_numbers] = detections.values
+    present[frame_numbers] = detections.present
+    return TrackStore.from_arrays(values, present, detections.track_ids)
+
+
+def map_rallies(detections, rally_ids, function):
+    """
+    Apply a TrackStore -> TrackStore function to every rally separately and
+    join the results, so interpolation never bridges the dead time between rallies.
+    """
+    detections = as_track_store(detections)
+    parts = [(np.flatnonzero(rally_ids == rally), function(take_frames(detections, np.flatnonzero(rally_ids == rally))))
+             for rally in np.unique(rally_ids)]
+    track_ids = list(dict.fromkeys(track_id for _, part in parts for track_id in part.track_ids))
+    num_values = parts[0][1].num_values if parts else detections.num_values
+    values = np.full((len(rally_ids), len(track_ids), num_values), np.nan)
+    present = np.zeros((len(rally_ids), len(track_ids)), dtype=bool)
+    for frames, part in parts:
+        columns = [track_ids.index(track_id) for track_id in part.track_ids]
+        values[np.ix_(frames, columns)] = part.values
+        present[np.ix_(frames, columns)] = part.present
+    return TrackStore.from_arrays(values, present, track_ids)
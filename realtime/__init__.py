@@ -0,0 +1 @@
+from .live_pipeline import LivePipeline, LiveFrame, VideoReplaySource, CaptureSource, VideoFileSink, LatencyStats
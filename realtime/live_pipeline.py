@@ -0,0 +1,334 @@
+import asyncio
+import time
+import cv2
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import sys
+sys.path.append("../")
+import constants
+from utils import measure_distance_between_points, convert_pixel_distance_to_meters, create_video_writer
+from mini_visual_court import MiniCourt
+
+# Marks the end of the stream on every stage queue
+_END_OF_STREAM = None
+
+
+class LiveFrame:
+    """A frame travelling through the live pipeline together with its results"""
+
+    __slots__ = ("index", "image", "captured_at", "player_dict", "ball_dict",
+                 "player_mini_court", "ball_mini_court", "player_speeds")
+
+    def __init__(self, index, image, captured_at):
+        self.index = index
+        self.image = image
+        self.captured_at = captured_at
+        self.player_dict = {}
+        self.ball_dict = {}
+        self.player_mini_court = {}
+        self.ball_mini_court = {}
+        self.player_speeds = {}
+
+
+class VideoReplaySource:
+    """
+    Replays a video file as if it were a live camera.
+
+    With realtime=True frames are released at the file's frame rate, so a
+    slow pipeline falls behind the "camera" exactly like it would live.
+    """
+
+    def __init__(self, video_path, realtime=True, fps=None):
+        self.video_path = video_path
+        self.realtime = realtime
+        self.fps = fps
+
+    async def frames(self, executor):
+        loop = asyncio.get_running_loop()
+        cap = cv2.VideoCapture(self.video_path)
+        fps = self.fps or cap.get(cv2.CAP_PROP_FPS) or 24
+        frame_interval = 1.0 / fps
+        start_time = time.perf_counter()
+        index = 0
+        try:
+            while True:
+                if self.realtime:
+                    delay = start_time + index * frame_interval - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                ret, image = await loop.run_in_executor(executor, cap.read)
+                if not ret:
+                    break
+                yield image
+                index += 1
+        finally:
+            cap.release()
+
+
+class CaptureSource:
+    """Reads from a camera index or an RTSP/HTTP stream URL at whatever rate it delivers"""
+
+    def __init__(self, source):
+        self.source = int(source) if str(source).isdigit() else source
+
+    async def frames(self, executor):
+        loop = asyncio.get_running_loop()
+        cap = cv2.VideoCapture(self.source)
+        try:
+            while True:
+                ret, image = await loop.run_in_executor(executor, cap.read)
+                if not ret:
+                    break
+                yield image
+        finally:
+            cap.release()
+
+
+class LatencyStats:
+    """End-to-end per-frame latency and drop counters for a live run"""
+
+    def __init__(self, window=10000):
+        self.latencies_ms = deque(maxlen=window)
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.frames_emitted = 0
+        self.started_at = time.perf_counter()
+
+    def record(self, live_frame):
+        self.latencies_ms.append((time.perf_counter() - live_frame.captured_at) * 1000)
+        self.frames_emitted += 1
+
+    def summary(self):
+        latencies = np.array(self.latencies_ms) if self.latencies_ms else np.zeros(1)
+        elapsed = time.perf_counter() - self.started_at
+        return {
+            "frames_captured": self.frames_captured,
+            "frames_dropped": self.frames_dropped,
+            "frames_emitted": self.frames_emitted,
+            "output_fps": self.frames_emitted / elapsed if elapsed > 0 else 0.0,
+            "latency_ms": {
+                "mean": float(latencies.mean()),
+                "p50": float(np.percentile(latencies, 50)),
+                "p95": float(np.percentile(latencies, 95)),
+                "max": float(latencies.max()),
+            },
+        }
+
+
+def put_dropping_oldest(stage_queue, item):
+    """
+    Put item on a bounded queue, discarding the oldest waiting item when it is
+    full so the consumer always works on the freshest frame.
+
+    Returns:
+        True if an item was dropped
+    """
+    dropped = False
+    if stage_queue.full():
+        try:
+            stage_queue.get_nowait()
+            dropped = True
+        except asyncio.QueueEmpty:
+            pass
+    stage_queue.put_nowait(item)
+    return dropped
+
+
+class LivePipeline:
+    """
+    Asyncio pipeline for live input with capture, detect, analyse, render and
+    emit stages connected by bounded queues.
+
+    Capture never waits: when detection falls behind, the oldest frame waiting
+    for detection is dropped instead of letting latency grow. The later stages
+    use blocking puts, so backpressure from a slow sink propagates up to the
+    detector and from there into frame drops at capture.
+    """
+
+    def __init__(self, models, source, sink=None, queue_size=2, speed_window_frames=12):
+        """
+        Args:
+            models: PipelineModels (or RemotePipelineModels) providing the detectors
+            source: VideoReplaySource or CaptureSource
+            sink: Optional callable receiving each rendered LiveFrame
+            queue_size: Capacity of every inter-stage queue
+            speed_window_frames: Frames over which live player speed is measured
+        """
+        self.models = models
+        self.source = source
+        self.sink = sink
+        self.queue_size = queue_size
+        self.speed_window_frames = speed_window_frames
+
+        self.stats = LatencyStats()
+        self.court_keypoints = None
+        self.mini_court = None
+        self.chosen_players = None
+        self.player_history = {}
+        self.last_ball_dict = {}
+        self.fps = 24
+
+        # One thread for model calls keeps the models single-threaded; capture gets its own
+        self.inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="live-inference")
+        self.io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="live-capture")
+
+    async def _capture(self, detect_queue):
+        index = 0
+        async for image in self.source.frames(self.io_executor):
+            self.stats.frames_captured += 1
+            if put_dropping_oldest(detect_queue, LiveFrame(index, image, time.perf_counter())):
+                self.stats.frames_dropped += 1
+            index += 1
+            # Let the other stages run between frames
+            await asyncio.sleep(0)
+        await detect_queue.put(_END_OF_STREAM)
+
+    def _detect_sync(self, live_frame):
+        if self.court_keypoints is None:
+            self.court_keypoints = self.models.court_line_detector.predict(live_frame.image)
+            self.models.player_tracker.set_court_region(self.court_keypoints)
+            self.mini_court = MiniCourt(live_frame.image)
+        live_frame.player_dict = self.models.player_tracker.detect_frame(live_frame.image)
+        live_frame.ball_dict = self.models.ball_tracker.detect_frame(live_frame.image)
+        return live_frame
+
+    async def _detect(self, detect_queue, analyse_queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            live_frame = await detect_queue.get()
+            if live_frame is _END_OF_STREAM:
+                break
+            live_frame = await loop.run_in_executor(self.inference_executor, self._detect_sync, live_frame)
+            await analyse_queue.put(live_frame)
+        await analyse_queue.put(_END_OF_STREAM)
+
+    def _analyse_frame(self, live_frame):
+        # Pick the two players once, from the first frame that shows at least two people
+        if self.chosen_players is None and len(live_frame.player_dict) >= 2:
+            self.chosen_players = self.models.player_tracker.choose_players(self.court_keypoints, live_frame.player_dict)
+        chosen_players = self.chosen_players or []
+        live_frame.player_dict = {track_id: bbox for track_id, bbox in live_frame.player_dict.items() if track_id in chosen_players}
+
+        # Hold the last ball position for a few frames instead of interpolating, which needs the future
+        if live_frame.ball_dict:
+            self.last_ball_dict = live_frame.ball_dict
+        else:
+            live_frame.ball_dict = self.last_ball_dict
+
+        player_mini_court, ball_mini_court = self.mini_court.convert_bounding_boxes_to_mini_court_coordinates(
+            [live_frame.player_dict], [live_frame.ball_dict], self.court_keypoints)
+        live_frame.player_mini_court = player_mini_court[0]
+        live_frame.ball_mini_court = ball_mini_court[0]
+
+        # Live player speed over a short sliding window of captured frame indices
+        for track_id, position in live_frame.player_mini_court.items():
+            history = self.player_history.setdefault(track_id, deque(maxlen=self.speed_window_frames))
+            history.append((live_frame.index, position))
+            if len(history) > 1:
+                (first_index, first_position), (last_index, last_position) = history[0], history[-1]
+                distance_meters = convert_pixel_distance_to_meters(
+                    measure_distance_between_points(first_position, last_position),
+                    constants.DOUBLE_LINE_WIDTH,
+                    self.mini_court.get_width_of_mini_court())
+                seconds = (last_index - first_index) / self.fps
+                live_frame.player_speeds[track_id] = distance_meters / seconds * 3.6 if seconds > 0 else 0.0
+
+    async def _analyse(self, analyse_queue, render_queue):
+        while True:
+            live_frame = await analyse_queue.get()
+            if live_frame is _END_OF_STREAM:
+                break
+            self._analyse_frame(live_frame)
+            await render_queue.put(live_frame)
+        await render_queue.put(_END_OF_STREAM)
+
+    def _render_sync(self, live_frame):
+        frames = [live_frame.image]
+        frames = self.models.player_tracker.draw_bboxes(frames, [live_frame.player_dict], thickness=2)
+        frames = self.models.ball_tracker.draw_bboxes(frames, [live_frame.ball_dict], color=(0, 255, 255), thickness=2)
+        frames = self.models.court_line_detector.draw_keypoints_on_video(frames, self.court_keypoints, point_color=(0, 140, 255), radius=5)
+        frames = self.mini_court.draw_mini_court(frames)
+        frames = self.mini_court.draw_points_on_mini_court(frames, [live_frame.player_mini_court], color=(0, 255, 0))
+        frames = self.mini_court.draw_points_on_mini_court(frames, [live_frame.ball_mini_court], color=(0, 255, 255))
+
+        image = frames[0]
+        latency_ms = (time.perf_counter() - live_frame.captured_at) * 1000
+        cv2.putText(image, f"Frame: {live_frame.index}  Latency: {latency_ms:.0f} ms", (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+        for row, (track_id, speed) in enumerate(sorted(live_frame.player_speeds.items())):
+            cv2.putText(image, f"Player {row + 1}: {speed:.1f} km/h", (10, 60 + row * 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        live_frame.image = image
+        return live_frame
+
+    async def _render(self, render_queue, emit_queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            live_frame = await render_queue.get()
+            if live_frame is _END_OF_STREAM:
+                break
+            # Drawing releases the GIL inside OpenCV, so it can overlap with inference
+            live_frame = await loop.run_in_executor(None, self._render_sync, live_frame)
+            await emit_queue.put(live_frame)
+        await emit_queue.put(_END_OF_STREAM)
+
+    async def _emit(self, emit_queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            live_frame = await emit_queue.get()
+            if live_frame is _END_OF_STREAM:
+                break
+            if self.sink is not None:
+                await loop.run_in_executor(None, self.sink, live_frame)
+            self.stats.record(live_frame)
+
+    async def run(self):
+        """Run until the source is exhausted and return the latency summary"""
+        if isinstance(self.source, VideoReplaySource):
+            cap = cv2.VideoCapture(self.source.video_path)
+            self.fps = self.source.fps or cap.get(cv2.CAP_PROP_FPS) or 24
+            cap.release()
+
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(4)]
+        detect_queue, analyse_queue, render_queue, emit_queue = queues
+        self.stats = LatencyStats()
+
+        try:
+            await asyncio.gather(
+                self._capture(detect_queue),
+                self._detect(detect_queue, analyse_queue),
+                self._analyse(analyse_queue, render_queue),
+                self._render(render_queue, emit_queue),
+                self._emit(emit_queue),
+            )
+        finally:
+            self.inference_executor.shutdown(wait=False)
+            self.io_executor.shutdown(wait=False)
+
+        return self.stats.summary()
+
+
+class VideoFileSink:
+    """
+    Writes emitted frames to a video file, opening the writer on the first frame.
+    With the ffmpeg writer and an .mp4 path the recording is fragmented MP4,
+    playable while the stream is still running.
+    """
+
+    def __init__(self, output_path, fps=24, writer="auto", **writer_options):
+        self.output_path = output_path
+        self.fps = fps
+        self.writer_backend = writer
+        self.writer_options = writer_options
+        self.writer = None
+
+    def __call__(self, live_frame):
+        if self.writer is None:
+            self.writer = create_video_writer(self.output_path, self.fps, backend=self.writer_backend,
+                                              **self.writer_options)
+        self.writer.write(live_frame.image)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
@@ -0,0 +1,32 @@
+import argparse
+from pipeline import PipelineModels
+from inference_server import InferenceServer
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve the player, ball and court models to local pipeline clients")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: loopback only)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch-size", type=int, default=8, help="Largest micro-batch per model")
+    parser.add_argument("--max-wait-ms", type=float, default=10, help="How long to wait for a micro-batch to fill")
+    parser.add_argument("--player-model", default="yolov8x")
+    parser.add_argument("--ball-model", default="models/last.pt")
+    parser.add_argument("--court-model", default="models/keypoints_model.pth")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    print("Loading models...")
+    models = PipelineModels(player_model_path=args.player_model,
+                            ball_model_path=args.ball_model,
+                            court_model_path=args.court_model)
+
+    server = InferenceServer(models, host=args.host, port=args.port,
+                             max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
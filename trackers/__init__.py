@@ -1,3 +1,4 @@
 from .player_tracker import PlayerTracker
 from .ball_tracker import BallTracker
-
+from .player_selection import select_player_tracks, compute_track_statistics
+from .pose_estimator import PoseEstimator
@@ -1,18 +1,54 @@
 from ultralytics import YOLO 
 import cv2
 import pickle
+import numpy as np
 import  pandas as pd
+import sys
+sys.path.append("../")
+from utils import TrackStore, as_track_store, ResolutionPlanner, scale_boxes_to_frame
+from .chunked_detection import detect_video_chunked_with_stub
+from .tiled_detection import plan_tiles, MotionMask, non_max_suppression
 
 
 class BallTracker:
     def __init__(self,model_path):
+        self.model_path = model_path
         self.model = YOLO(model_path)
+        self.resolution_planner = ResolutionPlanner()
+        self.clear_tiling()
+
+    def set_tiling(self, tile_size=640, overlap=0.2, diff_threshold=20, min_changed_pixels=2, nms_iou_threshold=0.5):
+        """
+        Detect the ball on overlapping tiles at native resolution instead of
+        the downscaled whole frame, for 4K input where the ball is only a few
+        pixels wide. Only tiles with motion since the previous frame, or
+        holding the last ball position, are run, as one batch.
+
+        Args:
+            tile_size: Tile side in pixels, also used as the model input size
+            overlap: Fraction of a tile shared with its neighbours
+            diff_threshold: Grayscale difference counted as motion
+            min_changed_pixels: Moving pixels (at 1/4 resolution) needed to run a tile
+            nms_iou_threshold: IoU above which boxes from overlapping tiles are merged
+        """
+        self.tiling = {"tile_size": tile_size, "overlap": overlap, "diff_threshold": diff_threshold,
+                       "min_changed_pixels": min_changed_pixels, "nms_iou_threshold": nms_iou_threshold}
+        self.motion_mask = MotionMask(diff_threshold=diff_threshold, min_changed_pixels=min_changed_pixels)
+        self._tiles = None
+        self._last_ball_bbox = None
+
+    def clear_tiling(self):
+        """Run the ball model on the whole frame again"""
+        self.tiling = None
+        self.motion_mask = None
+        self._tiles = None
+        self._last_ball_bbox = None
 
     def interpolate_ball_positions(self, ball_positions):
         """Enhanced ball position interpolation with improved handling of missing values and smoothing"""
-        ball_positions = [x.get(1, []) for x in ball_positions]
+        ball_positions = as_track_store(ball_positions).track_values(1)
 
-        # Convert the list into a pandas dataframe
+        # Convert the ball track into a pandas dataframe
         df_ball_positions = pd.DataFrame(ball_positions, columns=['x1', 'y1', 'x2', 'y2'])
         
         # Check for NaN or empty values
@@ -34,16 +70,17 @@ class BallTracker:
         for col in df_ball_positions.columns:
             df_ball_positions[col] = df_ball_positions[col].rolling(window=window_size, min_periods=1, center=True).mean()
             
-        # Reconvert to original format
-        ball_positions = [{1:x} for x in df_ball_positions.to_numpy().tolist()]
-        
-        return ball_positions
+        # Reconvert to a single-track store
+        ball_positions = df_ball_positions.to_numpy(dtype=np.float64)
+        present = np.isfinite(ball_positions).all(axis=1)
+
+        return TrackStore.from_arrays(ball_positions[:, None, :], present[:, None], [1])
 
 
     
     def get_ball_shot_frames(self,ball_positions):
-        ball_positions = [x.get(1,[]) for x in ball_positions]
-        # convert the list into pandas dataframe
+        ball_positions = as_track_store(ball_positions).track_values(1)
+        # convert the ball track into pandas dataframe
         df_ball_positions = pd.DataFrame(ball_positions,columns=['x1','y1','x2','y2'])
 
         df_ball_positions['ball_hit'] = 0
@@ -81,62 +118,183 @@ class BallTracker:
         if read_from_stub and stub_path is not None:
             with open(stub_path, 'rb') as f:
                 ball_detections = pickle.load(f)
-            return ball_detections
+            return as_track_store(ball_detections)
 
         for frame in frames:
             player_dict = self.detect_frame(frame)
             ball_detections.append(player_dict)
         
+        # Stubs stay lists of per-frame dicts so existing stub files keep working
         if stub_path is not None:
             with open(stub_path, 'wb') as f:
                 pickle.dump(ball_detections, f)
         
-        return ball_detections  
+        return as_track_store(ball_detections)
     
 
+    def detect_video_chunked(self, video_path, chunk_size=600, overlap=30, num_workers=None,
+                             read_from_stub=False, stub_path=None, decode_options=None):
+        """
+        Detect the ball in overlapping temporal chunks of a video, each decoded
+        and processed in a separate worker process.
+        The ball has a single ID, so chunks are simply joined at the overlap.
+
+        Args:
+            video_path: Path of the video to process
+            chunk_size: Frames per chunk, including the overlap
+            overlap: Frames shared by consecutive chunks
+            num_workers: Worker processes (default: one per CPU core)
+            read_from_stub: Whether to read cached detections from stub_path
+            stub_path: Optional pickle path for cached detections
+            decode_options: Optional open_video arguments for the workers' decoders
+
+        Returns:
+            TrackStore of ball detections, as returned by detect_frames
+        """
+        return detect_video_chunked_with_stub(self, video_path, reconcile_ids=False,
+                                              read_from_stub=read_from_stub, stub_path=stub_path,
+                                              chunk_size=chunk_size, overlap=overlap, num_workers=num_workers,
+                                              decode_options=decode_options,
+                                              tiling=self.tiling)
+
     def detect_frame(self,frame):
-        results = self.model.predict(frame,conf = 0.15)[0]
+        if self.tiling is not None:
+            return self.detect_frame_tiled(frame)
+
+        image, scale, predict_kwargs = self.resolution_planner.prepare("ball", frame)
+        results = self.model.predict(image,conf = 0.15, **predict_kwargs)[0]
         
 
         ball_dict = {}
         for box in results.boxes:
-            result = box.xyxy.tolist()[0]
+            result = scale_boxes_to_frame(box.xyxy.tolist()[0], scale)
             ball_dict[1] = result
         
         return ball_dict
+
+    def detect_frame_tiled(self, frame):
+        """Tiled detection as configured by set_tiling, returning the best ball box in full-frame pixels"""
+        tiles = self._frame_tiles(frame)
+        active = self.motion_mask.moving_tiles(frame, tiles)
+        # Keep watching where the ball was, in case it is momentarily still (e.g. before a serve)
+        if self._last_ball_bbox is not None:
+            x1, y1, x2, y2 = self._last_ball_bbox
+            active |= (tiles[:, 0] < x2) & (tiles[:, 2] > x1) & (tiles[:, 1] < y2) & (tiles[:, 3] > y1)
+
+        active_tiles = tiles[active]
+        tile_boxes = self.predict_tiles([frame[y1:y2, x1:x2] for x1, y1, x2, y2 in active_tiles])
+        ball_dict = self._merge_tile_boxes(frame, active_tiles, tile_boxes)
+        self._last_ball_bbox = ball_dict.get(1)
+        return ball_dict
+
+    def _frame_tiles(self, frame):
+        frame_height, frame_width = frame.shape[:2]
+        if self._tiles is None or self._tiles[:, 2:].max(axis=0).tolist() != [frame_width, frame_height]:
+            self._tiles = plan_tiles(frame_width, frame_height, self.tiling["tile_size"], self.tiling["overlap"])
+            self.motion_mask.reset()
+        return self._tiles
+
+    def predict_tiles(self, crops, input_size=None):
+        """
+        Run the ball model on tile crops in one call.
+
+        Args:
+            crops: Tile crops of one or more frames
+            input_size: Model input size, by default the tile size of set_tiling
+
+        Returns:
+            One list of ([x1, y1, x2, y2], confidence) per crop, in crop pixels
+        """
+        if not crops:
+            return []
+        results = self.model.predict(crops, conf=0.15, imgsz=input_size or self.tiling["tile_size"], verbose=False)
+        return [[(box.xyxy.tolist()[0], box.conf.tolist()[0]) for box in result.boxes] for result in results]
+
+    def _merge_tile_boxes(self, frame, tiles, tile_boxes):
+        """Best ball box of a frame from the boxes found on its tiles, merged with cross-tile NMS"""
+        frame_height, frame_width = frame.shape[:2]
+        boxes, scores = [], []
+        for (tile_x1, tile_y1, tile_x2, tile_y2), crop_boxes in zip(tiles, tile_boxes):
+            for (x1, y1, x2, y2), score in crop_boxes:
+                # A box cut by an edge shared with another tile is ranked below the whole copy in that tile
+                cut = ((x1 <= 1 and tile_x1 > 0) or (y1 <= 1 and tile_y1 > 0) or
+                       (x2 >= tile_x2 - tile_x1 - 1 and tile_x2 < frame_width) or
+                       (y2 >= tile_y2 - tile_y1 - 1 and tile_y2 < frame_height))
+                boxes.append([x1 + tile_x1, y1 + tile_y1, x2 + tile_x1, y2 + tile_y1])
+                scores.append(score - 1.0 if cut else score)
+
+        ball_dict = {}
+        if boxes:
+            keep = non_max_suppression(boxes, scores, self.tiling["nms_iou_threshold"])
+            ball_dict[1] = boxes[keep[0]]
+        return ball_dict
+
+    def detect_batch(self, frames, input_size=None):
+        """
+        Run the ball model on several frames in one call, returning one ball dict per frame.
+
+        With tiling set, every tile of every frame is run as one batch: the
+        frames are usually far apart (e.g. rally probes), so the motion gating
+        and tracking state of detect_frame_tiled do not apply. input_size is
+        the model input size for whole frames the caller already resized (e.g.
+        an inference client) and bypasses tiling and the resolution planner.
+        """
+        if input_size is not None:
+            if not frames:
+                return []
+            results = self.model.predict(list(frames), conf=0.15, verbose=False, imgsz=input_size)
+            return [{1: box.xyxy.tolist()[0] for box in result.boxes} for result in results]
+
+        if self.tiling is not None:
+            frame_tiles = [self._frame_tiles(frame) for frame in frames]
+            crops = [frame[y1:y2, x1:x2] for frame, tiles in zip(frames, frame_tiles) for x1, y1, x2, y2 in tiles]
+            tile_boxes = self.predict_tiles(crops)
+            ball_detections = []
+            start = 0
+            for frame, tiles in zip(frames, frame_tiles):
+                ball_detections.append(self._merge_tile_boxes(frame, tiles, tile_boxes[start:start + len(tiles)]))
+                start += len(tiles)
+            return ball_detections
+
+        prepared = [self.resolution_planner.prepare("ball", frame) for frame in frames]
+        if not prepared:
+            return []
+        _, scale, predict_kwargs = prepared[0]
+        results = self.model.predict([image for image, _, _ in prepared], conf=0.15, verbose=False, **predict_kwargs)
+
+        ball_detections = []
+        for result in results:
+            ball_dict = {}
+            for box in result.boxes:
+                ball_dict[1] = scale_boxes_to_frame(box.xyxy.tolist()[0], scale)
+            ball_detections.append(ball_dict)
+
+        return ball_detections
     
     def filter_by_confidence(self, ball_detections, confidence_threshold=0.6):
         """
         Filter ball detections by confidence and size criteria for improved accuracy
         
         Args:
-            ball_detections: Dictionary of ball detections by frame
+            ball_detections: TrackStore of ball detections
             confidence_threshold: Minimum confidence score to keep (default: 0.6)
             
         Returns:
             Filtered ball detections with only high-confidence detections retained
         """
-        filtered_detections = []
-        
-        for frame_detections in ball_detections:
-            filtered_frame = {}
-            
-            for track_id, bbox in frame_detections.items():
-                if bbox and len(bbox) == 4:  # Ensure valid bbox format
-                    x1, y1, x2, y2 = bbox
-                    width = x2 - x1
-                    height = y2 - y1
-                    
-                    # Tennis balls should be small and relatively square-ish
-                    if 5 <= width <= 40 and 5 <= height <= 40:
-                        # Check aspect ratio - tennis balls should be roughly circular
-                        aspect_ratio = width / height if height > 0 else 0
-                        if 0.7 <= aspect_ratio <= 1.3:  # Allow some deformation
-                            filtered_frame[track_id] = bbox
-            
-            filtered_detections.append(filtered_frame)
-            
-        return filtered_detections
+        ball_detections = as_track_store(ball_detections)
+        boxes = ball_detections.values
+        width = boxes[..., 2] - boxes[..., 0]
+        height = boxes[..., 3] - boxes[..., 1]
+
+        # Tennis balls should be small and relatively square-ish
+        keep = (width >= 5) & (width <= 40) & (height >= 5) & (height <= 40)
+        # Check aspect ratio - tennis balls should be roughly circular, allowing some deformation
+        with np.errstate(divide='ignore', invalid='ignore'):
+            aspect_ratio = np.where(height > 0, width / height, 0)
+        keep &= (aspect_ratio >= 0.7) & (aspect_ratio <= 1.3)
+
+        return ball_detections.with_present(ball_detections.present & keep)
     
     def draw_bboxes(self, video_frames, ball_detections, color=(0, 255, 255), thickness=2):
         """
@@ -154,10 +312,11 @@ class BallTracker:
         # Instead of creating a copy of each frame, we'll draw directly on the input frames
         # This is more memory efficient for high-resolution videos
         
-        for i, (frame, ball_dict) in enumerate(zip(video_frames, ball_detections)):
+        ball_detections = as_track_store(ball_detections)
+        for frame, (track_ids, bboxes) in zip(video_frames, ball_detections.iter_frames()):
             # Draw Bounding Boxes with enhanced visibility
-            for track_id, bbox in ball_dict.items():
-                if bbox and len(bbox) == 4:  # Ensure valid bbox format
+            for track_id, bbox in zip(track_ids, bboxes):
+                if len(bbox) == 4:  # Ensure valid bbox format
                     x1, y1, x2, y2 = bbox
                     
                     # Calculate center point and radius for circular highlight
@@ -0,0 +1,198 @@
+import os
+import pickle
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import sys
+sys.path.append("../")
+from utils import compute_iou_matrix, as_track_store, ResolutionPlanner, open_video
+
+# Tracker loaded once per worker process by _init_chunk_worker
+_CHUNK_TRACKER = None
+
+
+def get_video_frame_count(video_path, decode_options=None):
+    with open_video(video_path, **(decode_options or {})) as decoder:
+        frame_count = decoder.frame_count
+    return frame_count
+
+
+def plan_chunks(frame_count, chunk_size, overlap):
+    """
+    Split [0, frame_count) into chunks of chunk_size frames where each chunk
+    also re-reads the last `overlap` frames of the previous one.
+
+    Returns:
+        List of (start_frame, end_frame) pairs, end exclusive. The last chunk
+        has end_frame None so it reads to the end of the file even when the
+        container's frame count is inaccurate.
+    """
+    if chunk_size <= overlap:
+        raise ValueError("chunk_size must be larger than overlap")
+
+    chunks = []
+    start = 0
+    while True:
+        end = start + chunk_size
+        if end >= frame_count:
+            chunks.append((start, None))
+            break
+        chunks.append((start, end))
+        start = end - overlap
+    return chunks
+
+
+def _init_chunk_worker(tracker_class, model_path, court_keypoints=None, tiling=None, resolution_scales=None):
+    global _CHUNK_TRACKER
+    _CHUNK_TRACKER = tracker_class(model_path=model_path)
+    _CHUNK_TRACKER.resolution_planner = ResolutionPlanner(resolution_scales)
+    if court_keypoints is not None:
+        _CHUNK_TRACKER.set_court_region(court_keypoints)
+    if tiling is not None:
+        _CHUNK_TRACKER.set_tiling(**tiling)
+
+
+def _detect_chunk(video_path, start_frame, end_frame, decode_options=None):
+    """Seek to start_frame and run the worker's tracker on frames up to end_frame"""
+    if hasattr(_CHUNK_TRACKER, "reset_tracking"):
+        _CHUNK_TRACKER.reset_tracking()
+    if getattr(_CHUNK_TRACKER, "motion_mask", None) is not None:
+        _CHUNK_TRACKER.motion_mask.reset()
+
+    with open_video(video_path, **(decode_options or {})) as decoder:
+        detections = [_CHUNK_TRACKER.detect_frame(frame) for frame in decoder.frames(start_frame, end_frame)]
+
+    return start_frame, detections
+
+
+def match_track_ids(previous_overlap, current_overlap, iou_threshold=0.3):
+    """
+    Map the track IDs of a new chunk onto the IDs of the previous chunk.
+
+    Both arguments hold the detections of the same overlap frames, one dict
+    of {track_id: bbox} per frame. Pairs are scored by their mean IoU over the
+    overlap and matched greedily, best pair first.
+
+    Returns:
+        Dictionary mapping current chunk track IDs to previous chunk track IDs
+    """
+    iou_sums = {}
+    for previous_dict, current_dict in zip(previous_overlap, current_overlap):
+        if not previous_dict or not current_dict:
+            continue
+        previous_ids = list(previous_dict.keys())
+        current_ids = list(current_dict.keys())
+        ious = compute_iou_matrix([previous_dict[i] for i in previous_ids], [current_dict[i] for i in current_ids])
+        for row, previous_id in enumerate(previous_ids):
+            for col, current_id in enumerate(current_ids):
+                if ious[row, col] > 0:
+                    iou_sums[(previous_id, current_id)] = iou_sums.get((previous_id, current_id), 0.0) + ious[row, col]
+
+    num_frames = max(len(previous_overlap), 1)
+    candidates = sorted(((total / num_frames, pair) for pair, total in iou_sums.items()), reverse=True)
+
+    id_map = {}
+    used_previous_ids = set()
+    for mean_iou, (previous_id, current_id) in candidates:
+        if mean_iou < iou_threshold:
+            break
+        if previous_id in used_previous_ids or current_id in id_map:
+            continue
+        id_map[current_id] = previous_id
+        used_previous_ids.add(previous_id)
+
+    return id_map
+
+
+def stitch_chunk_detections(chunk_results, reconcile_ids=True, iou_threshold=0.3):
+    """
+    Join per-chunk detections into one list covering the whole video.
+
+    The overlap frames are taken from the earlier chunk, whose tracker has
+    already settled, and are used to relabel the later chunk's track IDs.
+    Tracks that cannot be matched get fresh IDs that don't collide with any
+    ID already used.
+
+    Args:
+        chunk_results: List of (start_frame, detections) sorted by start_frame
+        reconcile_ids: Whether to reconcile track IDs (False for the ball)
+        iou_threshold: Minimum mean IoU for two tracks to be considered the same
+
+    Returns:
+        List with one detection dict per frame
+    """
+    stitched = []
+    used_ids = set()
+
+    for start_frame, detections in chunk_results:
+        shared = max(len(stitched) - start_frame, 0)
+        if reconcile_ids:
+            id_map = match_track_ids(stitched[start_frame:], detections[:shared], iou_threshold) if shared else {}
+            for frame_dict in detections[shared:]:
+                for track_id in frame_dict:
+                    if track_id not in id_map:
+                        id_map[track_id] = track_id if track_id not in used_ids else max(used_ids) + 1
+                    used_ids.add(id_map[track_id])
+            detections = [{id_map[track_id]: bbox for track_id, bbox in frame_dict.items() if track_id in id_map}
+                          for frame_dict in detections[shared:]]
+        else:
+            detections = detections[shared:]
+
+        stitched.extend(detections)
+
+    return stitched
+
+
+def detect_video_chunked(video_path, tracker_class, model_path, chunk_size=600, overlap=30,
+                         num_workers=None, reconcile_ids=True, court_keypoints=None, tiling=None,
+                         resolution_scales=None, decode_options=None):
+    """
+    Run a tracker's detect_frame over a video split into overlapping temporal
+    chunks, each decoded and detected in its own worker process.
+
+    Args:
+        video_path: Path of the video to process
+        tracker_class: PlayerTracker or BallTracker
+        model_path: Model path passed to tracker_class in every worker
+        chunk_size: Frames per chunk, including the overlap
+        overlap: Frames shared by consecutive chunks for track ID reconciliation
+        num_workers: Worker processes (default: one per CPU core, at most one per chunk)
+        reconcile_ids: Whether to reconcile track IDs across chunk boundaries
+        court_keypoints: Optional court keypoints restricting player detection to the court
+        tiling: Optional BallTracker.set_tiling arguments for tiled ball detection
+        resolution_scales: Optional ResolutionPlanner scales for the worker's model
+        decode_options: Optional open_video arguments (backend, threads, scale); the
+            PyAV and ffmpeg backends seek frame-accurately to each chunk start
+
+    Returns:
+        List with one detection dict per frame
+    """
+    frame_count = get_video_frame_count(video_path, decode_options)
+    chunks = plan_chunks(frame_count, chunk_size, overlap)
+    num_workers = min(num_workers or os.cpu_count() or 1, len(chunks))
+    print(f"Detecting {frame_count} frames in {len(chunks)} chunks with {num_workers} workers")
+
+    with ProcessPoolExecutor(max_workers=num_workers,
+                             mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_chunk_worker,
+                             initargs=(tracker_class, model_path, court_keypoints, tiling, resolution_scales)) as pool:
+        futures = [pool.submit(_detect_chunk, video_path, start, end, decode_options) for start, end in chunks]
+        chunk_results = [future.result() for future in futures]
+
+    return stitch_chunk_detections(chunk_results, reconcile_ids=reconcile_ids)
+
+
+def detect_video_chunked_with_stub(tracker, video_path, reconcile_ids, read_from_stub=False, stub_path=None, **kwargs):
+    """Shared stub handling for the trackers' detect_video_chunked methods"""
+    if read_from_stub and stub_path is not None:
+        with open(stub_path, 'rb') as f:
+            return as_track_store(pickle.load(f))
+
+    detections = detect_video_chunked(video_path, type(tracker), tracker.model_path,
+                                      reconcile_ids=reconcile_ids,
+                                      resolution_scales=tracker.resolution_planner.scales, **kwargs)
+
+    if stub_path is not None:
+        with open(stub_path, 'wb') as f:
+            pickle.dump(detections, f)
+
+    return as_track_store(detections)
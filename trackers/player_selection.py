@@ -0,0 +1,220 @@
+import numpy as np
+import sys
+sys.path.append("../")
+import constants
+from utils import TrackStore, as_track_store, get_court_homography, get_court_homographies, project_points, project_points_each
+
+_COURT_LENGTH = constants.HALF_COURT_LINE_HEIGHT * 2
+_COURT_WIDTH = constants.DOUBLE_LINE_WIDTH
+
+NEAR_PLAYER_ID = 1  # Bottom of the image at the start of the video
+FAR_PLAYER_ID = 2   # Top of the image at the start of the video
+
+
+def project_feet(player_detections, court_keypoints):
+    """
+    Foot point (bottom centre of the box) of every detection in court metres.
+
+    Returns:
+        (frame_index, column_index, feet_meters) of the present detections
+    """
+    store = as_track_store(player_detections)
+    frame_index, column_index = np.nonzero(store.present)
+    boxes = store.values[frame_index, column_index]
+
+    feet = np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, boxes[:, 3]], axis=1)
+    if not len(feet):
+        feet_meters = np.zeros((0, 2))
+    elif np.ndim(court_keypoints) == 2:
+        image_to_court = np.linalg.inv(get_court_homographies(court_keypoints))
+        feet_meters = project_points_each(feet, image_to_court[frame_index])
+    else:
+        image_to_court = np.linalg.inv(get_court_homography(court_keypoints))
+        feet_meters = project_points(feet, image_to_court).astype(np.float64)
+    return frame_index, column_index, feet_meters
+
+
+def compute_track_statistics(player_detections, court_keypoints, side_margin_meters=1.5, baseline_margin_meters=4.0):
+    """
+    Per-track statistics over the whole video, computed in one pass over the
+    detections.
+
+    Every detection's foot point (bottom centre of the box) is projected to
+    court metres with the keypoint homography.
+
+    Args:
+        player_detections: TrackStore of player boxes
+        court_keypoints: Court keypoints from CourtLineDetector, or an (N, 28) array
+            with the keypoints of every frame
+        side_margin_meters: Ground beyond the doubles sidelines that still counts as on court
+        baseline_margin_meters: Ground behind the baselines that still counts as on court
+
+    Returns:
+        Dict of (num_tracks,) arrays: frames (detections per track), duration
+        (fraction of the video), occupancy (fraction of the track's detections
+        on court), baseline_distance (mean distance in metres to the nearest
+        baseline while on court) and near_fraction (fraction of on-court
+        detections in the near half)
+    """
+    store = as_track_store(player_detections)
+    num_tracks = store.num_tracks
+    _, column_index, feet_meters = project_feet(store, court_keypoints)
+
+    on_court = ((feet_meters[:, 0] >= -side_margin_meters) & (feet_meters[:, 0] <= _COURT_WIDTH + side_margin_meters) &
+                (feet_meters[:, 1] >= -baseline_margin_meters) & (feet_meters[:, 1] <= _COURT_LENGTH + baseline_margin_meters))
+    baseline_distance = np.minimum(np.abs(feet_meters[:, 1]), np.abs(feet_meters[:, 1] - _COURT_LENGTH))
+    near_half = feet_meters[:, 1] > _COURT_LENGTH / 2
+
+    frames = np.bincount(column_index, minlength=num_tracks)
+    on_court_frames = np.bincount(column_index, weights=on_court, minlength=num_tracks)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        occupancy = np.where(frames > 0, on_court_frames / frames, 0.0)
+        mean_baseline_distance = np.where(
+            on_court_frames > 0,
+            np.bincount(column_index, weights=baseline_distance * on_court, minlength=num_tracks) / on_court_frames,
+            np.inf)
+        near_fraction = np.where(
+            on_court_frames > 0,
+            np.bincount(column_index, weights=near_half & on_court, minlength=num_tracks) / on_court_frames,
+            0.5)
+
+    return {
+        "frames": frames,
+        "duration": frames / max(store.num_frames, 1),
+        "occupancy": occupancy,
+        "baseline_distance": mean_baseline_distance,
+        "near_fraction": near_fraction,
+    }
+
+
+def score_tracks(statistics, baseline_distance_scale=4.0):
+    """
+    How likely each track is to be a player: long-lived, mostly on court and
+    close to a baseline, where players spend most of a rally.
+    """
+    return (statistics["duration"] * statistics["occupancy"] /
+            (1.0 + statistics["baseline_distance"] / baseline_distance_scale))
+
+
+def _boundary_links(present, start, end):
+    """
+    The closest frames of a merged player before and after a fragment
+    spanning frames start..end (inclusive).
+
+    Returns:
+        List of (gap in frames, player frame, fragment frame), one per side the player was seen on
+    """
+    frames = np.flatnonzero(present)
+    links = []
+    before = np.searchsorted(frames, start) - 1
+    if before >= 0:
+        links.append((start - frames[before], frames[before], start))
+    after = np.searchsorted(frames, end, side="right")
+    if after < len(frames):
+        links.append((frames[after] - end, frames[after], end))
+    return links
+
+
+def select_player_tracks(player_detections, court_keypoints, min_occupancy=0.5, min_frames=5, max_overlap=0.1,
+                         fps=24, max_speed_meters_per_second=8.0, position_slack_meters=2.0):
+    """
+    Pick the two players from whole-video track statistics and merge the
+    fragments a player's track breaks into when its ID changes mid-match.
+
+    Fragments are merged by continuity rather than by court side, so a player
+    keeps their ID through changeovers. The best scoring track seeds the
+    first player and the best scoring track sharing the video with it (or,
+    failing that, the best on the other half) seeds the second. The remaining
+    tracks are then taken in order of score. Each one joins the player whose
+    detections just before and after it are closest to its own first and last
+    foot positions, provided it overlaps that player's frames by at most
+    max_overlap of its detections and the player could have walked the
+    distance in the gap. Tracks that fit neither player are other people,
+    e.g. a ball kid.
+
+    Args:
+        player_detections: TrackStore of player boxes
+        court_keypoints: Court keypoints from CourtLineDetector, or an (N, 28)
+            array with the keypoints of every frame
+        min_occupancy: Smallest fraction of a track's detections that must be on court
+        min_frames: Shortest track considered
+        max_overlap: Largest fraction of a fragment's frames allowed to overlap the merged track
+        fps: Frame rate of the video
+        max_speed_meters_per_second: Fastest a player moves between two fragments
+        position_slack_meters: Distance allowed on top of max_speed for detection noise
+
+    Returns:
+        TrackStore with track 1 = the player on the near half and track 2 =
+        the player on the far half at the start of the video, and a dict
+        mapping each of those IDs to the source track IDs merged into it
+    """
+    store = as_track_store(player_detections)
+    statistics = compute_track_statistics(store, court_keypoints)
+    scores = score_tracks(statistics)
+    candidates = (statistics["occupancy"] >= min_occupancy) & (statistics["frames"] >= min_frames)
+    order = np.flatnonzero(candidates)[np.argsort(-scores[candidates], kind="stable")]
+
+    # Dense foot positions of every track, NaN where absent
+    frame_index, column_index, feet_meters = project_feet(store, court_keypoints)
+    track_feet = np.full((store.num_frames, store.num_tracks, 2), np.nan)
+    track_feet[frame_index, column_index] = feet_meters
+
+    values = np.full((store.num_frames, 2, store.num_values), np.nan)
+    present = np.zeros((store.num_frames, 2), dtype=bool)
+    feet = np.full((store.num_frames, 2, 2), np.nan)
+    track_columns = [[], []]
+
+    def add(column, track_column):
+        fill = store.present[:, track_column] & ~present[:, column]
+        values[fill, column] = store.values[fill, track_column]
+        feet[fill, column] = track_feet[fill, track_column]
+        present[fill, column] = True
+        track_columns[column].append(track_column)
+
+    def overlap(column, track_column):
+        return np.count_nonzero(store.present[:, track_column] & present[:, column])
+
+    # Seeds: the best track, and the best one playing alongside it
+    remaining = list(order)
+    if remaining:
+        add(0, remaining.pop(0))
+        partners = [track_column for track_column in remaining
+                    if overlap(0, track_column) > max_overlap * statistics["frames"][track_column]]
+        if not partners:
+            seed_near = statistics["near_fraction"][track_columns[0][0]] >= 0.5
+            partners = [track_column for track_column in remaining
+                        if (statistics["near_fraction"][track_column] >= 0.5) != seed_near]
+        if partners:
+            add(1, partners[0])
+            remaining.remove(partners[0])
+
+    for track_column in remaining:
+        track_frames = np.flatnonzero(store.present[:, track_column])
+        start, end = track_frames[0], track_frames[-1]
+        best_column, best_distance = None, np.inf
+        for column in range(2):
+            if not present[:, column].any() or overlap(column, track_column) > max_overlap * len(track_frames):
+                continue
+            distances = []
+            for gap, player_frame, track_frame in _boundary_links(present[:, column], start, end):
+                distance = np.linalg.norm(feet[player_frame, column] - track_feet[track_frame, track_column])
+                if not distance <= position_slack_meters + max_speed_meters_per_second * gap / fps:
+                    break
+                distances.append(distance)
+            else:
+                if distances and np.mean(distances) < best_distance:
+                    best_column, best_distance = column, np.mean(distances)
+        if best_column is not None:
+            add(best_column, track_column)
+
+    # Player 1 is whoever is on the near half when first seen
+    first_y = [feet[np.flatnonzero(present[:, column])[0], column, 1] if present[:, column].any() else np.nan
+               for column in range(2)]
+    if present[:, 1].any() and (not present[:, 0].any() or first_y[1] > first_y[0]):
+        values, present = values[:, ::-1], present[:, ::-1]
+        track_columns = track_columns[::-1]
+
+    merged_track_ids = {player_id: [store.track_ids[track_column] for track_column in columns]
+                        for player_id, columns in zip((NEAR_PLAYER_ID, FAR_PLAYER_ID), track_columns)}
+    return TrackStore.from_arrays(np.ascontiguousarray(values), np.ascontiguousarray(present),
+                                  [NEAR_PLAYER_ID, FAR_PLAYER_ID]), merged_track_ids
@@ -1,28 +1,125 @@
 from ultralytics import YOLO 
 import cv2
 import pickle
+import numpy as np
 import sys
 sys.path.append("../")
-from utils import get_center_of_bbox, measure_distance_between_points
+from utils import (get_center_of_bbox,
+                   measure_distance_between_points,
+                   as_track_store,
+                   TrackStore,
+                   get_court_polygon,
+                   get_player_region_polygon,
+                   points_in_polygon,
+                   ResolutionPlanner,
+                   scale_boxes_to_frame
+                   )
+from .chunked_detection import detect_video_chunked_with_stub
+from .player_selection import select_player_tracks
+from .player_trajectory import fill_gaps, savgol_smooth
 
+# COCO class index of "person"
+PERSON_CLASS_ID = 0
 
 
 class PlayerTracker:
     def __init__(self,model_path):
+        self.model_path = model_path
         self.model = YOLO(model_path)
+        self.resolution_planner = ResolutionPlanner()
+        self.clear_court_region()
 
+    def set_court_region(self, court_keypoints, side_margin_meters=3.0, baseline_margin_meters=5.0):
+        """
+        Restrict detection to the court: pixels outside the area a player on
+        the (margin-extended) court can cover are blanked before inference, and
+        people whose feet are off that ground area are dropped.
+
+        Args:
+            court_keypoints: Court keypoints from CourtLineDetector
+            side_margin_meters: Ground kept beyond the doubles sidelines
+            baseline_margin_meters: Ground kept behind the baselines
+        """
+        self.court_keypoints = np.asarray(court_keypoints, dtype=np.float32)
+        self.court_polygon = get_court_polygon(court_keypoints, side_margin_meters, baseline_margin_meters)
+        self.detection_polygon = get_player_region_polygon(court_keypoints, side_margin_meters, baseline_margin_meters)
+        self._court_mask = None
 
-    def choose_and_filter_players(self, player_detections, court_keypoints):
-        player_detections_first_frame = player_detections[0]
-        chosen_player = self.choose_players(court_keypoints, player_detections_first_frame)
-        filtered_player_detections = []
-        for player_dict in player_detections:
-            filtered_player_dict = {track_id: bbox for track_id, bbox in player_dict.items() if track_id in chosen_player}
-            filtered_player_detections.append(filtered_player_dict)
+    def clear_court_region(self):
+        """Detect people anywhere in the frame again"""
+        self.court_keypoints = None
+        self.court_polygon = None
+        self.detection_polygon = None
+        self._court_mask = None
+
+    def mask_to_court(self, frame, scale=1.0):
+        """
+        Blank every pixel outside the player region, so the crowd never reaches
+        the detector. scale is the size of frame relative to the full frame.
+        """
+        if self.detection_polygon is None:
+            return frame
+        if self._court_mask is None or self._court_mask.shape != frame.shape[:2]:
+            self._court_mask = np.zeros(frame.shape[:2], dtype=np.uint8)
+            polygon = np.round(self.detection_polygon * scale).astype(np.int32)
+            cv2.fillConvexPoly(self._court_mask, polygon, 255)
+        return cv2.bitwise_and(frame, frame, mask=self._court_mask)
 
-        return filtered_player_detections
+    def is_on_court(self, boxes):
+        """Whether the foot position of each [x1, y1, x2, y2, ...] box is on the court ground area"""
+        if self.court_polygon is None or len(boxes) == 0:
+            return np.ones(len(boxes), dtype=bool)
+        boxes_array = np.asarray([box[:4] for box in boxes], dtype=np.float64)
+        feet = np.stack([(boxes_array[:, 0] + boxes_array[:, 2]) / 2, boxes_array[:, 3]], axis=1)
+        return points_in_polygon(feet, self.court_polygon)
 
+    def filter_boxes_to_court(self, boxes):
+        """Keep the boxes whose foot position is on the court ground area"""
+        return [box for box, keep in zip(boxes, self.is_on_court(boxes)) if keep]
 
+    def reset_tracking(self):
+        """Reset the persistent tracker state so a new video starts with fresh track IDs"""
+        predictor = getattr(self.model, "predictor", None)
+        for tracker in getattr(predictor, "trackers", None) or []:
+            tracker.reset()
+
+    def choose_and_filter_players(self, player_detections, court_keypoints, fps=24):
+        """
+        Keep the two players, chosen from track statistics over the whole video.
+
+        Returns:
+            TrackStore with track 1 = the player starting on the near half and
+            track 2 = the one starting on the far half, each merged from every
+            track ID the player had during the video and kept through changeovers
+        """
+        chosen_players, merged_track_ids = select_player_tracks(player_detections, court_keypoints, fps=fps)
+        for player_id, track_ids in merged_track_ids.items():
+            if not track_ids:
+                print(f"Warning: no track found for player {player_id}")
+            elif len(track_ids) > 1:
+                print(f"Player {player_id} merged from tracks {track_ids}")
+        return chosen_players
+
+
+
+    def interpolate_player_positions(self, player_detections, max_gap_frames=48, window_length=9, polyorder=2):
+        """
+        Fill short gaps in every player track and smooth the boxes, so each
+        player has a position in (almost) every frame.
+
+        Args:
+            player_detections: TrackStore of the chosen players' boxes
+            max_gap_frames: Longest run of missing frames that is interpolated
+            window_length: Savitzky-Golay window in frames
+            polyorder: Savitzky-Golay polynomial order
+
+        Returns:
+            TrackStore with the filled, smoothed boxes
+        """
+        player_detections = as_track_store(player_detections)
+        values, present = fill_gaps(player_detections.values, player_detections.present, max_gap_frames)
+        values = savgol_smooth(values, present, window_length, polyorder)
+        return TrackStore.from_arrays(values, present, player_detections.track_ids)
 
     def choose_players(self, court_keypoints, player_dict):
         distances = []
@@ -53,40 +150,107 @@ class PlayerTracker:
         if read_from_stub and stub_path is not None:
             with open(stub_path, 'rb') as f:
                 player_detections = pickle.load(f)
-            return player_detections
+            return as_track_store(player_detections)
 
         for frame in frames:
             player_dict = self.detect_frame(frame)
             player_detections.append(player_dict)
         
+        # Stubs stay lists of per-frame dicts so existing stub files keep working
         if stub_path is not None:
             with open(stub_path, 'wb') as f:
                 pickle.dump(player_detections, f)
         
-        return player_detections  
+        return as_track_store(player_detections)
     
 
+    def detect_video_chunked(self, video_path, chunk_size=600, overlap=30, num_workers=None,
+                             read_from_stub=False, stub_path=None, decode_options=None):
+        """
+        Detect players in overlapping temporal chunks of a video, each decoded
+        and processed in a separate worker process.
+        Track IDs are reconciled across chunk boundaries using the overlap frames.
+
+        Args:
+            video_path: Path of the video to process
+            chunk_size: Frames per chunk, including the overlap
+            overlap: Frames shared by consecutive chunks
+            num_workers: Worker processes (default: one per CPU core)
+            read_from_stub: Whether to read cached detections from stub_path
+            stub_path: Optional pickle path for cached detections
+            decode_options: Optional open_video arguments for the workers' decoders
+
+        Returns:
+            TrackStore of player detections, as returned by detect_frames
+        """
+        return detect_video_chunked_with_stub(self, video_path, reconcile_ids=True,
+                                              read_from_stub=read_from_stub, stub_path=stub_path,
+                                              chunk_size=chunk_size, overlap=overlap, num_workers=num_workers,
+                                              decode_options=decode_options,
+                                              court_keypoints=self.court_keypoints)
+
     def detect_frame(self,frame):
-        results = self.model.track(frame, persist=True)[0]
+        # Only people are detected and tracked, and only inside the court region when one is set
+        # The player model may run on a downscaled copy of the frame; boxes are mapped back to full-frame pixels
+        image, scale, predict_kwargs = self.resolution_planner.prepare("players", frame)
+        results = self.model.track(self.mask_to_court(image, scale), persist=True, classes=[PERSON_CLASS_ID],
+                                   **predict_kwargs)[0]
         id_name_dict = results.names
 
         player_dict = {}
         for box in results.boxes:
+            if box.id is None:
+                continue
             track_id = int(box.id.tolist()[0])
-            result = box.xyxy.tolist()[0]
+            result = scale_boxes_to_frame(box.xyxy.tolist()[0], scale)
             object_cls_id = box.cls.tolist()[0]
             object_cls_name = id_name_dict[object_cls_id]
             if object_cls_name == "person":
                 player_dict[track_id] = result
-        
-        return player_dict
+
+        # Drop people standing off the court (e.g. a line judge inside the masked region)
+        on_court = self.is_on_court(list(player_dict.values()))
+        return {track_id: bbox for (track_id, bbox), keep in zip(player_dict.items(), on_court) if keep}
+
+    def detect_persons_batch(self, frames, input_size=None):
+        """
+        Detect people on several frames in one model call, without tracking.
+
+        Args:
+            frames: Frames to run the model on
+            input_size: Model input size for frames the caller already resized
+                (e.g. an inference client); bypasses the resolution planner
+
+        Returns:
+            One list of [x1, y1, x2, y2, confidence] boxes per frame
+        """
+        if input_size is None:
+            prepared = [self.resolution_planner.prepare("players", frame) for frame in frames]
+        else:
+            prepared = [(frame, 1.0, {"imgsz": input_size}) for frame in frames]
+        if not prepared:
+            return []
+        _, scale, predict_kwargs = prepared[0]
+        results = self.model.predict([self.mask_to_court(image, scale) for image, _, _ in prepared], verbose=False,
+                                     classes=[PERSON_CLASS_ID], **predict_kwargs)
+
+        person_detections = []
+        for result in results:
+            id_name_dict = result.names
+            boxes = []
+            for box in result.boxes:
+                if id_name_dict[box.cls.tolist()[0]] == "person":
+                    boxes.append(scale_boxes_to_frame(box.xyxy.tolist()[0], scale) + [box.conf.tolist()[0]])
+            person_detections.append(self.filter_boxes_to_court(boxes))
+
+        return person_detections
     
     def filter_by_confidence(self, player_detections, confidence_threshold=0.7):
         """
         Filter player detections by confidence score to improve accuracy
         
         Args:
-            player_detections: Dictionary of player detections by frame
+            player_detections: TrackStore of player detections
             confidence_threshold: Minimum confidence score to keep (default: 0.7)
             
         Returns:
@@ -94,26 +258,15 @@ class PlayerTracker:
         """
         # For this implementation, we'll use size and position-based filtering
         # since confidence scores might not be directly available from stubs
-        
-        filtered_detections = []
-        
-        for frame_detections in player_detections:
-            # Create a new dictionary for filtered detections in this frame
-            filtered_frame = {}
-            
-            for track_id, bbox in frame_detections.items():
-                if bbox and len(bbox) == 4:  # Ensure valid bbox format
-                    x1, y1, x2, y2 = bbox
-                    width = x2 - x1
-                    height = y2 - y1
-                    
-                    # Filter based on size (too small objects are likely false positives)
-                    if width > 20 and height > 50:  # Minimum size for a player
-                        filtered_frame[track_id] = bbox
-            
-            filtered_detections.append(filtered_frame)
-            
-        return filtered_detections
+        player_detections = as_track_store(player_detections)
+        boxes = player_detections.values
+        width = boxes[..., 2] - boxes[..., 0]
+        height = boxes[..., 3] - boxes[..., 1]
+
+        # Filter based on size (too small objects are likely false positives)
+        keep = (width > 20) & (height > 50)  # Minimum size for a player
+
+        return player_detections.with_present(player_detections.present & keep)
 
     def draw_bboxes(self, video_frames, player_detections, thickness=2, color=None):
         """
@@ -131,10 +284,11 @@ class PlayerTracker:
         # Instead of creating a copy of each frame, we'll draw directly on the input frames
         # This is more memory efficient for high-resolution videos
         
-        for i, (frame, player_dict) in enumerate(zip(video_frames, player_detections)):
+        player_detections = as_track_store(player_detections)
+        for frame, (track_ids, bboxes) in zip(video_frames, player_detections.iter_frames()):
             # Draw Bounding Boxes with enhanced visibility
-            for track_id, bbox in player_dict.items():
-                if bbox and len(bbox) == 4:  # Ensure valid bbox format
+            for track_id, bbox in zip(track_ids, bboxes):
+                if len(bbox) == 4:  # Ensure valid bbox format
                     x1, y1, x2, y2 = bbox
                     
                     # Use different colors for different players with darker outlines
@@ -143,7 +297,7 @@ class PlayerTracker:
                     else:
                         # Define consistent colors regardless of track_id value
                         # Always use player 1 and player 2 (never higher numbers)
-                        player_num = 1 if track_id == list(player_dict.keys())[0] else 2
+                        player_num = 1 if track_id == track_ids[0] else 2
                         if player_num == 1:
                             box_color = (0, 0, 255)  # Red for Player 1 (BGR format)
                         else:
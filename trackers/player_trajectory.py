@@ -0,0 +1,83 @@
+import numpy as np
+
+
+def fill_gaps(values, present, max_gap):
+    """
+    Linearly interpolate every track across gaps of at most max_gap frames, and
+    hold the first/last position over leading/trailing gaps of at most max_gap.
+
+    Args:
+        values: (num_frames, num_tracks, num_values) array
+        present: (num_frames, num_tracks) boolean array
+        max_gap: Longest run of missing frames that is filled
+
+    Returns:
+        Filled values and the new presence mask
+    """
+    num_frames = values.shape[0]
+    frame_index = np.broadcast_to(np.arange(num_frames)[:, None], present.shape)
+
+    # Last seen frame at or before each frame and next seen frame at or after it (-1 / num_frames if none)
+    previous_seen = np.maximum.accumulate(np.where(present, frame_index, -1), axis=0)
+    next_seen = np.minimum.accumulate(np.where(present, frame_index, num_frames)[::-1], axis=0)[::-1]
+    has_previous = previous_seen >= 0
+    has_next = next_seen < num_frames
+
+    gap_length = np.where(has_previous & has_next, next_seen - previous_seen - 1,
+                          np.where(has_previous, num_frames - 1 - previous_seen, next_seen))
+    fill = ~present & (has_previous | has_next) & (gap_length <= max_gap)
+
+    previous_values = np.take_along_axis(values, np.clip(previous_seen, 0, num_frames - 1)[..., None], axis=0)
+    next_values = np.take_along_axis(values, np.clip(next_seen, 0, num_frames - 1)[..., None], axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weight = (frame_index - previous_seen) / (next_seen - previous_seen)
+    interpolated = previous_values + weight[..., None] * (next_values - previous_values)
+    # Leading and trailing gaps hold the one neighbour they have
+    interpolated = np.where((has_previous & ~has_next)[..., None], previous_values, interpolated)
+    interpolated = np.where((~has_previous & has_next)[..., None], next_values, interpolated)
+
+    filled_values = np.where(fill[..., None], interpolated, values)
+    return filled_values, present | fill
+
+
+def savgol_coefficients(window_length, polyorder):
+    """Savitzky-Golay smoothing weights: least-squares polynomial fit evaluated at the window centre"""
+    half_window = window_length // 2
+    offsets = np.arange(-half_window, half_window + 1, dtype=np.float64)
+    design = offsets[:, None] ** np.arange(polyorder + 1)
+    return np.linalg.pinv(design)[0]
+
+
+def savgol_smooth(values, present, window_length=9, polyorder=2):
+    """
+    Savitzky-Golay filter along the frame axis of every track. Only frames whose
+    whole window lies inside one run of present frames are smoothed; the rest
+    keep their values.
+
+    Args:
+        values: (num_frames, num_tracks, num_values) array
+        present: (num_frames, num_tracks) boolean array
+        window_length: Odd number of frames in the filter window
+        polyorder: Order of the fitted polynomial, below window_length
+
+    Returns:
+        Smoothed copy of values
+    """
+    num_frames = values.shape[0]
+    if num_frames < window_length:
+        return values.copy()
+    half_window = window_length // 2
+    coefficients = savgol_coefficients(window_length, polyorder)
+
+    windows = np.lib.stride_tricks.sliding_window_view(np.where(present[..., None], values, 0.0),
+                                                       window_length, axis=0)
+    smoothed_centre = windows @ coefficients
+
+    present_count = np.concatenate([np.zeros((1,) + present.shape[1:], dtype=np.int64),
+                                    np.cumsum(present, axis=0)])
+    full_window = (present_count[window_length:] - present_count[:-window_length]) == window_length
+
+    smoothed = values.copy()
+    centre = smoothed[half_window:num_frames - half_window]
+    smoothed[half_window:num_frames - half_window] = np.where(full_window[..., None], smoothed_centre, centre)
+    return smoothed
@@ -0,0 +1,46 @@
+from ultralytics import YOLO
+import numpy as np
+import sys
+sys.path.append("../")
+from utils import NUM_POSE_KEYPOINTS
+
+
+class PoseEstimator:
+    """
+    Lightweight body keypoint model (a YOLOv8 pose model) run on player crops
+    only, never on whole frames.
+    """
+
+    def __init__(self, model_path="yolov8n-pose.pt", input_size=256, batch_size=16):
+        """
+        Args:
+            model_path: Ultralytics pose model
+            input_size: Size crops are resized to for inference
+            batch_size: Crops per forward pass
+        """
+        self.model_path = model_path
+        self.model = YOLO(model_path)
+        self.input_size = input_size
+        self.batch_size = batch_size
+
+    def estimate(self, crops):
+        """
+        Keypoints of the most confident person in each crop.
+
+        Args:
+            crops: List of BGR crops
+
+        Returns:
+            (N, 17, 3) float32 array of (x, y, confidence) in crop pixels, with
+            zero confidence where no person was found
+        """
+        keypoints = np.zeros((len(crops), NUM_POSE_KEYPOINTS, 3), dtype=np.float32)
+        for start in range(0, len(crops), self.batch_size):
+            batch = crops[start:start + self.batch_size]
+            results = self.model.predict(batch, imgsz=self.input_size, verbose=False)
+            for offset, result in enumerate(results):
+                if result.keypoints is None or len(result.boxes) == 0:
+                    continue
+                best = int(result.boxes.conf.argmax())
+                keypoints[start + offset] = result.keypoints.data[best].cpu().numpy()
+        return keypoints
@@ -0,0 +1,86 @@
+import cv2
+import numpy as np
+import sys
+sys.path.append("../")
+from utils import compute_iou_matrix
+
+
+def _tile_starts(length, tile_size, stride):
+    if length <= tile_size:
+        return [0]
+    starts = list(range(0, length - tile_size, stride))
+    return starts + [length - tile_size]
+
+
+def plan_tiles(frame_width, frame_height, tile_size=640, overlap=0.2):
+    """
+    Cover a frame with square tiles that overlap by the given fraction, the
+    last row and column aligned to the frame edge.
+
+    Returns:
+        (N, 4) int array of [x1, y1, x2, y2] tiles
+    """
+    stride = max(1, int(tile_size * (1 - overlap)))
+    tiles = [[x, y, min(x + tile_size, frame_width), min(y + tile_size, frame_height)]
+             for y in _tile_starts(frame_height, tile_size, stride)
+             for x in _tile_starts(frame_width, tile_size, stride)]
+    return np.array(tiles, dtype=np.int64)
+
+
+class MotionMask:
+    """
+    Cheap frame-differencing motion detector used to skip static tiles.
+    Frames are compared at 1/downscale resolution in grayscale.
+    """
+
+    def __init__(self, downscale=4, diff_threshold=20, min_changed_pixels=2):
+        self.downscale = downscale
+        self.diff_threshold = diff_threshold
+        self.min_changed_pixels = min_changed_pixels
+        self.reset()
+
+    def reset(self):
+        self.previous_gray = None
+
+    def moving_tiles(self, frame, tiles):
+        """
+        Which tiles contain motion since the previous frame. Every tile counts
+        as moving on the first frame or after a change of frame size.
+
+        Returns:
+            (N,) boolean array
+        """
+        small = cv2.resize(frame, None, fx=1 / self.downscale, fy=1 / self.downscale, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        previous_gray, self.previous_gray = self.previous_gray, gray
+        if previous_gray is None or previous_gray.shape != gray.shape:
+            return np.ones(len(tiles), dtype=bool)
+
+        changed = (cv2.absdiff(gray, previous_gray) > self.diff_threshold).astype(np.uint8)
+        # Changed pixels per tile from the integral image, all tiles at once
+        integral = cv2.integral(changed)
+        x1, y1 = (tiles[:, :2] // self.downscale).T
+        x2 = np.minimum(-(-tiles[:, 2] // self.downscale), gray.shape[1])
+        y2 = np.minimum(-(-tiles[:, 3] // self.downscale), gray.shape[0])
+        counts = integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+        return counts >= self.min_changed_pixels
+
+
+def non_max_suppression(boxes, scores, iou_threshold=0.5):
+    """
+    Greedy NMS over boxes gathered from all tiles.
+
+    Returns:
+        Indices of the kept boxes, highest score first
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    order = np.argsort(-np.asarray(scores, dtype=np.float64), kind="stable")
+    ious = compute_iou_matrix(boxes, boxes)
+    keep = []
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    for index in order:
+        if suppressed[index]:
+            continue
+        keep.append(index)
+        suppressed |= ious[index] > iou_threshold
+    return np.array(keep, dtype=np.int64)
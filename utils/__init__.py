@@ -1,5 +1,17 @@
 from .video_utils import read_video, save_video
-from .bbox_utils import get_center_of_bbox, measure_distance_between_points, get_foot_position, get_closest_keypoint_index, get_height_of_bbox, measure_xy_distance, get_center_of_bbox
+from .video_backends import VideoDecoder, OpenCVDecoder, PyAVDecoder, FFmpegPipeDecoder, open_video, available_decode_backend
+from .video_writers import VideoWriter, OpenCVVideoWriter, FFmpegVideoWriter, create_video_writer, available_video_writer
+from .bbox_utils import get_center_of_bbox, measure_distance_between_points, get_foot_position, get_closest_keypoint_index, get_height_of_bbox, measure_xy_distance, get_center_of_bbox, compute_iou_matrix
+from .track_store import TrackStore, FrameView, as_track_store
+from .keypoint_lookup import KeypointLookup, get_keypoint_lookup
+from .resolution_planner import ResolutionPlanner, scale_boxes_to_frame
+from .frame_ring_buffer import FrameRingBuffer, SharedMemoryVideoReader
+from .frame_cache import FrameCache, hash_video_file
+from .court_geometry import COURT_KEYPOINTS_METERS, COURT_LINES, get_court_homography, get_court_homographies, project_points, project_points_each, get_court_polygon, get_player_region_polygon, points_in_polygon
 from .conversions import convert_pixel_distance_to_meters, convert_meters_to_pixel_distance
 from .player_stats_drawer_utils import draw_player_stats
 from .shot_classifier import ShotClassifier, draw_shot_classifications
+from .pose_shot_classifier import PoseShotClassifier, PoseShotCache, crop_box, NUM_POSE_KEYPOINTS
+from .ball_bounces import detect_ball_bounces, get_ball_bounce_frames, get_bounce_contact_points, project_to_court_meters, call_bounces, get_hitter_foot_points
+from .shot_model import ModelShotClassifier, SHOT_FEATURE_NAMES, extract_shot_features, train_shot_model, save_shot_model, load_shot_model
+from .profiler import PipelineProfiler, NullProfiler, NULL_PROFILER, create_profiler, get_peak_rss_mb, get_current_rss_mb
@@ -0,0 +1,272 @@
+import numpy as np
+from .court_geometry import (COURT_KEYPOINTS_METERS, get_court_homography, get_court_homographies, project_points,
+                             project_points_each)
+from .track_store import as_track_store
+
+# Court boundaries in metres, from the keypoints MiniCourt draws its lines between
+SINGLES_LEFT_X = float(COURT_KEYPOINTS_METERS[4, 0])
+SINGLES_RIGHT_X = float(COURT_KEYPOINTS_METERS[6, 0])
+FAR_BASELINE_Y = float(COURT_KEYPOINTS_METERS[0, 1])
+NEAR_BASELINE_Y = float(COURT_KEYPOINTS_METERS[2, 1])
+FAR_SERVICE_LINE_Y = float(COURT_KEYPOINTS_METERS[8, 1])
+NEAR_SERVICE_LINE_Y = float(COURT_KEYPOINTS_METERS[10, 1])
+NET_Y = (FAR_BASELINE_Y + NEAR_BASELINE_Y) / 2
+
+
+def _court_length_pixels(court_keypoints):
+    """Image distance between the baseline midpoints, the scale bounce thresholds are relative to"""
+    keypoints = np.asarray(court_keypoints, dtype=np.float64).reshape(-1, 14, 2)
+    far = (keypoints[:, 0] + keypoints[:, 1]) / 2
+    near = (keypoints[:, 2] + keypoints[:, 3]) / 2
+    return float(np.median(np.linalg.norm(near - far, axis=1)))
+
+
+def get_ball_bounce_frames(ball_positions, shot_frames, court_keypoints, min_velocity_change=0.005, velocity_frames=2,
+                           hit_margin=3):
+    """
+    Bounce after every hit, from the vertical velocity of the ball in the
+    image, in one vectorized pass.
+
+    A bounce turns the ball from moving down the image to moving up it (or
+    sharply slows its descent when it travels towards the camera), so it shows
+    as a local minimum of the change in vertical velocity across the frame.
+    Between two hits the strongest such minimum is kept: it is the first
+    bounce, as later ones lose height, and it stands out of detection noise
+    better than the earliest candidate. Frames within hit_margin of a hit are
+    ignored, since hits flip the velocity too.
+
+    Args:
+        ball_positions: TrackStore of interpolated ball boxes (track 1)
+        shot_frames: Sorted frame numbers of the hits
+        court_keypoints: Flat or per-frame (N, 28) court keypoints, for the image scale
+        min_velocity_change: Smallest drop in vertical velocity counted as a bounce,
+            in court lengths (baseline to baseline in the image) per frame
+        velocity_frames: Frames before and after each frame the velocities are measured over
+        hit_margin: Frames around each hit in which no bounce is looked for
+
+    Returns:
+        (bounce_frames, shot_indices): int arrays with the frame of each bounce
+        and the index in shot_frames of the hit it follows
+    """
+    boxes = as_track_store(ball_positions).track_values(1)
+    shot_frames = np.asarray(shot_frames, dtype=np.int64)
+    k = velocity_frames
+    if len(shot_frames) == 0 or len(boxes) <= 2 * k:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    y = (boxes[:, 1] + boxes[:, 3]) / 2
+    velocity_change = np.full(len(y), np.nan)
+    velocity_change[k:-k] = (y[2 * k:] - 2 * y[k:-k] + y[:-2 * k]) / k
+    threshold = -min_velocity_change * _court_length_pixels(court_keypoints)
+
+    with np.errstate(invalid="ignore"):
+        candidate = velocity_change < threshold
+        candidate[1:-1] &= (velocity_change[1:-1] <= velocity_change[:-2]) & (velocity_change[1:-1] < velocity_change[2:])
+    frames = np.flatnonzero(candidate)
+
+    # The hit each candidate follows, and its distance to that hit and the next
+    shot_indices = np.searchsorted(shot_frames, frames, side="right") - 1
+    next_shots = np.append(shot_frames, np.iinfo(np.int64).max)[shot_indices + 1]
+    valid = (shot_indices >= 0) & (frames - shot_frames[np.maximum(shot_indices, 0)] > hit_margin) & (next_shots - frames > hit_margin)
+    frames, shot_indices = frames[valid], shot_indices[valid]
+
+    # Strongest candidate per hit: sort by hit, then by velocity change
+    order = np.lexsort((velocity_change[frames], shot_indices))
+    frames, shot_indices = frames[order], shot_indices[order]
+    shot_indices, strongest = np.unique(shot_indices, return_index=True)
+    return frames[strongest], shot_indices
+
+
+def get_bounce_contact_points(ball_positions, bounce_frames, velocity_frames=2):
+    """
+    Sub-frame image points where the ball touches the court.
+
+    The contact falls between frames, and the ball is already off the ground
+    in the nearest one, which far from the camera moves the projected point
+    by metres. The lines through the ball's vertical positions just before
+    and just after each bounce frame are intersected to find the contact time,
+    and the bottom centre of the ball box is interpolated to it.
+
+    Args:
+        ball_positions: TrackStore of interpolated ball boxes (track 1)
+        bounce_frames: Frames returned by get_ball_bounce_frames
+        velocity_frames: Frames the lines on each side are fitted through
+
+    Returns:
+        (M, 2) float64 array of image points
+    """
+    boxes = as_track_store(ball_positions).track_values(1)
+    bottom = np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, boxes[:, 3]], axis=1)
+    frames = np.asarray(bounce_frames, dtype=np.int64)
+    k = velocity_frames
+    contact = bottom[frames]
+
+    inside = (frames - 1 - k >= 0) & (frames + 1 + k < len(bottom))
+    i = frames[inside]
+    y = bottom[:, 1]
+    slope_before = (y[i - 1] - y[i - 1 - k]) / k
+    slope_after = (y[i + 1 + k] - y[i + 1]) / k
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # y[i - 1] + slope_before * (t - i + 1) == y[i + 1] + slope_after * (t - i - 1), for t relative to frame i
+        t = (y[i + 1] - y[i - 1] - slope_after - slope_before) / (slope_before - slope_after)
+    t = np.clip(np.nan_to_num(t), -1.0, 1.0)
+    neighbour = np.where(t < 0, i - 1, i + 1)
+    weight = np.abs(t)[:, None]
+    refined = bottom[i] * (1 - weight) + bottom[neighbour] * weight
+    refined[:, 1] = np.where(t < 0, y[i - 1] + slope_before * (t + 1), y[i + 1] + slope_after * (t - 1))
+    finite = np.isfinite(refined).all(axis=1)
+    contact[np.flatnonzero(inside)[finite]] = refined[finite]
+    return contact
+
+
+def project_to_court_meters(points, court_keypoints, frames=None):
+    """
+    Image points to court metres (x across the court, y from the far baseline).
+
+    Args:
+        points: (M, 2) image points
+        court_keypoints: Flat keypoints, or (N, 28) per-frame keypoints indexed by frames
+        frames: (M,) frame of every point, needed with per-frame keypoints
+
+    Returns:
+        (M, 2) float64 array
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    court_keypoints = np.asarray(court_keypoints, dtype=np.float64)
+    if court_keypoints.ndim == 1:
+        return project_points(points, np.linalg.inv(get_court_homography(court_keypoints))).astype(np.float64)
+    homographies = np.linalg.inv(get_court_homographies(court_keypoints[np.asarray(frames, dtype=np.int64)]))
+    return project_points_each(points, homographies)
+
+
+def call_bounces(bounce_meters, hitter_meters, is_serve, line_margin=0.05):
+    """
+    In/out calls, side and depth of bounces on the court.
+
+    A bounce is in when it lands in the singles court on the other half from
+    the hitter, or for serves in the service box diagonally opposite the
+    server, i.e. on the other side of the centre line from where they stand.
+    Balls touching a line are in, so boundaries are widened by line_margin.
+
+    Args:
+        bounce_meters: (M, 2) bounce positions in court metres
+        hitter_meters: (M, 2) court positions of the hitter's feet at the hit
+        is_serve: (M,) bool, True for bounces of a serve
+        line_margin: Metres a bounce may be outside a line and still touch it
+
+    Returns:
+        Dict of (M,) arrays: "in" (bool), "near_side" (bool, the half the ball
+        landed on), "depth" (metres from that half's baseline, negative behind it)
+        and "width" (metres from the centre line, towards the hitter's right)
+    """
+    x, y = bounce_meters[:, 0], bounce_meters[:, 1]
+    hitter_meters = np.asarray(hitter_meters, dtype=np.float64).reshape(-1, 2)
+    near_side = y > NET_Y
+    hit_from_near_side = hitter_meters[:, 1] > NET_Y
+    is_serve = np.asarray(is_serve, dtype=bool)
+    centre_x = (SINGLES_LEFT_X + SINGLES_RIGHT_X) / 2
+
+    within_sidelines = (x >= SINGLES_LEFT_X - line_margin) & (x <= SINGLES_RIGHT_X + line_margin)
+    # Serves go across the centre line: a server right of the centre mark (in court x) serves to the left box
+    served_from_right = hitter_meters[:, 0] > centre_x
+    within_service_box = np.where(served_from_right, x <= centre_x + line_margin, x >= centre_x - line_margin)
+    within_sidelines &= ~is_serve | within_service_box
+    back_line = np.where(is_serve,
+                         np.where(near_side, NEAR_SERVICE_LINE_Y + line_margin, FAR_SERVICE_LINE_Y - line_margin),
+                         np.where(near_side, NEAR_BASELINE_Y + line_margin, FAR_BASELINE_Y - line_margin))
+    within_back_line = np.where(near_side, y <= back_line, y >= back_line)
+    is_in = within_sidelines & within_back_line & (near_side != hit_from_near_side)
+
+    # The near player looks up the court, so their right is +x; the far player's is -x
+    return {
+        "in": is_in,
+        "near_side": near_side,
+        "depth": np.where(near_side, NEAR_BASELINE_Y - y, y - FAR_BASELINE_Y),
+        "width": np.where(hit_from_near_side, x - centre_x, centre_x - x),
+    }
+
+
+def get_hitter_foot_points(player_detections, ball_boxes, hit_frames):
+    """
+    Image foot positions (bottom centre of the box) of the player whose box is
+    closest to the ball at each hit, NaN where no player was detected.
+
+    Args:
+        player_detections: TrackStore of the chosen players' boxes
+        ball_boxes: (N, 4) ball boxes of every frame
+        hit_frames: (M,) frames of the hits
+
+    Returns:
+        (M, 2) float64 array of image points
+    """
+    players = as_track_store(player_detections)
+    feet = np.full((len(hit_frames), 2), np.nan)
+    if players.num_tracks == 0 or len(hit_frames) == 0:
+        return feet
+    boxes = np.where(players.present[hit_frames][..., None], players.values[hit_frames, :, :4], np.nan)
+    ball = ball_boxes[hit_frames]
+    ball_x, ball_y = ((ball[:, 0] + ball[:, 2]) / 2)[:, None], ((ball[:, 1] + ball[:, 3]) / 2)[:, None]
+    # Distance from the ball to each player's box rather than its centre, as a
+    # serve or smash is hit well above the player's head
+    dx = np.maximum(np.maximum(boxes[..., 0] - ball_x, ball_x - boxes[..., 2]), 0)
+    dy = np.maximum(np.maximum(boxes[..., 1] - ball_y, ball_y - boxes[..., 3]), 0)
+    distances = np.hypot(dx, dy)
+    found = np.isfinite(distances).any(axis=1)
+    closest = np.argmin(np.where(np.isfinite(distances), distances, np.inf), axis=1)
+    closest_boxes = boxes[np.arange(len(hit_frames)), closest]
+    feet[found] = np.stack([(closest_boxes[:, 0] + closest_boxes[:, 2]) / 2, closest_boxes[:, 3]], axis=1)[found]
+    return feet
+
+
+def detect_ball_bounces(ball_detections, shot_frames, court_keypoints, player_detections=None, rally_ids=None,
+                        **bounce_options):
+    """
+    Bounces of a match with their court positions and in/out calls.
+
+    The hitter is the chosen player closest to the ball at the hit, placed on
+    the court by their projected feet; the airborne ball itself projects
+    too far up the court, so it is only used where no player was detected.
+    The first hit of every rally (of the video, without rally_ids) is called
+    as a serve.
+
+    Args:
+        ball_detections: TrackStore of interpolated ball boxes (track 1)
+        shot_frames: Sorted frame numbers of the hits
+        court_keypoints: Flat or per-frame (N, 28) court keypoints
+        player_detections: Optional TrackStore of the chosen players' boxes
+        rally_ids: Optional rally index per frame; bounces are not matched to a
+            hit from another rally
+        **bounce_options: Passed on to get_ball_bounce_frames
+
+    Returns:
+        Dict of arrays, one entry per bounce: "frames", "shot_index", "x" and
+        "y" (court metres) plus the call_bounces entries
+    """
+    boxes = as_track_store(ball_detections).track_values(1)
+    shot_frames = np.asarray(shot_frames, dtype=np.int64)
+    frames, shot_indices = get_ball_bounce_frames(ball_detections, shot_frames, court_keypoints, **bounce_options)
+    if rally_ids is not None and len(frames):
+        same_rally = rally_ids[frames] == rally_ids[shot_frames[shot_indices]]
+        frames, shot_indices = frames[same_rally], shot_indices[same_rally]
+
+    contact = get_bounce_contact_points(ball_detections, frames, bounce_options.get("velocity_frames", 2))
+    hit_frames = shot_frames[shot_indices]
+    at_hit = np.stack([(boxes[hit_frames, 0] + boxes[hit_frames, 2]) / 2, boxes[hit_frames, 3]], axis=1)
+    if player_detections is not None:
+        feet = get_hitter_foot_points(player_detections, boxes, hit_frames)
+        found = np.isfinite(feet).all(axis=1)
+        at_hit[found] = feet[found]
+    bounce_meters = project_to_court_meters(contact, court_keypoints, frames)
+    hit_meters = project_to_court_meters(at_hit, court_keypoints, hit_frames)
+
+    if rally_ids is None:
+        is_serve = shot_indices == 0
+    else:
+        shot_rallies = rally_ids[shot_frames]
+        first_of_rally = np.ones(len(shot_frames), dtype=bool)
+        first_of_rally[1:] = shot_rallies[1:] != shot_rallies[:-1]
+        is_serve = first_of_rally[shot_indices]
+
+    bounces = {"frames": frames, "shot_index": shot_indices, "x": bounce_meters[:, 0], "y": bounce_meters[:, 1]}
+    bounces.update(call_bounces(bounce_meters, hit_meters, is_serve))
+    return bounces
@@ -1,3 +1,6 @@
+import numpy as np
+from .keypoint_lookup import get_keypoint_lookup
+
 def get_center_of_bbox(bbox):
     x1, y1, x2, y2 = bbox
     center_x = int((x1 + x2) / 2)
@@ -12,18 +15,8 @@ def get_foot_position(bbox):
     return (int((x1+x2)/2), y2)
 
 def get_closest_keypoint_index(point, keypoints, keypoint_indices):
-    closest_distance = float('inf')
-
-    key_point_ind = keypoint_indices[0]
-    for keypoint_index in keypoint_indices:
-        keypoint = keypoints[keypoint_index*2], keypoints[keypoint_index*2+1]
-        distance = abs(point[1]-keypoint[1])
-
-        if distance < closest_distance:
-            closest_distance = distance
-            key_point_ind = keypoint_index
-
-    return key_point_ind   
+    # Same nearest-keypoint answer as the mini court projection, from the court's precomputed lookup
+    return int(get_keypoint_lookup(keypoints, keypoint_indices).nearest(point))
 
 def get_height_of_bbox(bbox):
     return bbox[3] - bbox[1] 
@@ -36,3 +29,21 @@ def get_center_of_bbox(bbox):
     return (int((bbox[0]+bbox[2])/2),int((bbox[1]+bbox[3])/2))
     
 
+
+
+def compute_iou_matrix(boxes_a, boxes_b):
+    """Pairwise intersection over union between two lists of [x1, y1, x2, y2] boxes"""
+    boxes_a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+
+    inter_x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    inter_y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    inter_x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    inter_y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(inter_x2 - inter_x1, 0, None) * np.clip(inter_y2 - inter_y1, 0, None)
+
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
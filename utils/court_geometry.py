@@ -0,0 +1,122 @@
+import cv2
+import numpy as np
+import sys
+sys.path.append("../")
+import constants
+
+_W = constants.DOUBLE_LINE_WIDTH
+_L = constants.HALF_COURT_LINE_HEIGHT * 2
+_A = constants.DOUBLE_ALLY_DIFFERENCE
+_S = constants.NO_MANS_LAND_HEIGHT
+
+# Court keypoints in metres, in the order predicted by CourtLineDetector and
+# drawn by MiniCourt: x across the court, y from the far baseline
+COURT_KEYPOINTS_METERS = np.array([
+    (0, 0), (_W, 0), (0, _L), (_W, _L),
+    (_A, 0), (_A, _L), (_W - _A, 0), (_W - _A, _L),
+    (_A, _S), (_W - _A, _S), (_A, _L - _S), (_W - _A, _L - _S),
+    (_W / 2, _S), (_W / 2, _L - _S),
+], dtype=np.float32)
+
+# Keypoint index pairs joined by a painted court line
+COURT_LINES = [(0, 1), (2, 3), (0, 2), (1, 3), (4, 5), (6, 7), (8, 9), (10, 11), (12, 13)]
+
+
+def get_court_homography(court_keypoints):
+    """
+    Least-squares homography from court metres to image pixels fitted to all
+    detected keypoints.
+
+    Args:
+        court_keypoints: Flat [x0, y0, ..., x13, y13] keypoints from CourtLineDetector
+
+    Returns:
+        3x3 homography matrix
+    """
+    image_points = np.asarray(court_keypoints, dtype=np.float32).reshape(-1, 2)
+    homography, _ = cv2.findHomography(COURT_KEYPOINTS_METERS[:len(image_points)], image_points, 0)
+    return homography
+
+
+def project_points(points, homography):
+    """Apply a homography to an (N, 2) array of points"""
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 1, 2)
+    if len(points) == 0:
+        return np.zeros((0, 2), dtype=np.float32)
+    return cv2.perspectiveTransform(points, homography).reshape(-1, 2)
+
+
+def get_court_homographies(keypoints_per_frame):
+    """get_court_homography for every row of an (N, 28) per-frame keypoint array, as an (N, 3, 3) array"""
+    return np.array([get_court_homography(keypoints) for keypoints in np.asarray(keypoints_per_frame)]).reshape(-1, 3, 3)
+
+
+def project_points_each(points, homographies):
+    """Apply homographies[i] to points[i], for (N, 2) points and (N, 3, 3) homographies"""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    projected = np.einsum("nij,nj->ni", homographies, np.concatenate([points, np.ones((len(points), 1))], axis=1))
+    return projected[:, :2] / projected[:, 2:]
+
+
+def _court_corners_meters(side_margin_meters, baseline_margin_meters):
+    return np.array([
+        (-side_margin_meters, -baseline_margin_meters),
+        (_W + side_margin_meters, -baseline_margin_meters),
+        (_W + side_margin_meters, _L + baseline_margin_meters),
+        (-side_margin_meters, _L + baseline_margin_meters),
+    ], dtype=np.float32)
+
+
+def get_court_polygon(court_keypoints, side_margin_meters=3.0, baseline_margin_meters=5.0):
+    """
+    Ground area players can stand on: the doubles court extended by the given
+    margins to the sides and behind the baselines, in image pixels.
+
+    Returns:
+        (4, 2) float32 polygon, clockwise from the far left corner
+    """
+    corners = _court_corners_meters(side_margin_meters, baseline_margin_meters)
+    return project_points(corners, get_court_homography(court_keypoints))
+
+
+def get_player_region_polygon(court_keypoints, side_margin_meters=3.0, baseline_margin_meters=5.0,
+                              player_height_meters=2.5):
+    """
+    Image area a player standing on the court polygon can cover: the court
+    polygon plus every corner raised by a standing player's height (with room
+    for a raised racquet), as a convex polygon.
+
+    Returns:
+        (N, 2) int32 convex polygon
+    """
+    homography = get_court_homography(court_keypoints)
+    corners_meters = _court_corners_meters(side_margin_meters, baseline_margin_meters)
+    ground = project_points(corners_meters, homography)
+
+    # Local pixels per metre at each corner, measured along the court width
+    shifted = project_points(corners_meters + [1.0, 0.0], homography)
+    pixels_per_meter = np.linalg.norm(shifted - ground, axis=1)
+
+    raised = ground.copy()
+    raised[:, 1] -= player_height_meters * pixels_per_meter
+    hull = cv2.convexHull(np.concatenate([ground, raised]).astype(np.float32))
+    return np.round(hull.reshape(-1, 2)).astype(np.int32)
+
+
+def points_in_polygon(points, polygon):
+    """
+    Vectorized test of which points lie inside a convex polygon.
+
+    Args:
+        points: (N, 2) array of points
+        polygon: (M, 2) convex polygon, in either winding order
+
+    Returns:
+        (N,) boolean array
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    polygon = np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+    edges = np.roll(polygon, -1, axis=0) - polygon
+    to_points = points[:, None, :] - polygon[None, :, :]
+    cross = edges[None, :, 0] * to_points[..., 1] - edges[None, :, 1] * to_points[..., 0]
+    return np.all(cross >= 0, axis=1) | np.all(cross <= 0, axis=1)
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+
+def hash_video_file(video_path, chunk_size=1 << 20):
+    """BLAKE2b digest of the video file contents"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(video_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FrameCache:
+    """
+    On-disk cache of decoded frames, so reruns that only change the rendering
+    skip decoding entirely.
+
+    Each entry is a raw uint8 file holding an (N, H, W, 3) array plus a JSON
+    sidecar with its shape, fps and source, keyed by the hash of the video
+    file, the decode backend (backends do not decode to identical pixels) and
+    the decode scale. Entries are opened as read-only memory maps: frames are
+    paged in from disk as they are read and can be dropped again by the OS,
+    so unused frames do not have to stay in RAM. Draw on copies of the
+    frames, not on the frames themselves. Delete the directory to clear the
+    cache.
+    """
+
+    def __init__(self, cache_dir="frame_cache"):
+        self.cache_dir = cache_dir
+
+    def key(self, video_path, decode_scale=None, decode_backend=None):
+        key = hash_video_file(video_path)
+        if decode_backend:
+            key += f"_{decode_backend}"
+        if decode_scale and decode_scale != 1.0:
+            key += f"_scale{decode_scale:g}"
+        return key
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + ".frames", base + ".json"
+
+    def load(self, key):
+        """
+        Returns:
+            (frames, metadata) with frames an (N, H, W, 3) read-only
+            np.memmap, or None when the entry is missing or incomplete
+        """
+        frames_path, metadata_path = self._paths(key)
+        if not os.path.exists(metadata_path) or not os.path.exists(frames_path):
+            return None
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+        shape = (metadata["frame_count"],) + tuple(metadata["frame_shape"])
+        if os.path.getsize(frames_path) != int(np.prod(shape)):
+            return None
+        return np.memmap(frames_path, dtype=np.uint8, mode="r", shape=shape), metadata
+
+    def store(self, key, frames, fps, **metadata):
+        """
+        Write decoded frames to the cache. The sidecar is written last, so an
+        interrupted store is never loaded.
+
+        Args:
+            key: Entry key from key()
+            frames: Sequence of equally sized BGR uint8 frames
+            fps: Frame rate of the video
+            **metadata: Extra JSON-serialisable fields for the sidecar
+
+        Returns:
+            Path of the raw frames file
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        frames_path, metadata_path = self._paths(key)
+        shape = (len(frames),) + frames[0].shape
+        temp_path = frames_path + ".tmp"
+        cached = np.memmap(temp_path, dtype=np.uint8, mode="w+", shape=shape)
+        for i, frame in enumerate(frames):
+            cached[i] = frame
+        cached.flush()
+        del cached
+        os.replace(temp_path, frames_path)
+
+        metadata.update(frame_count=shape[0], frame_shape=list(shape[1:]), fps=fps)
+        with open(metadata_path, "w") as f:
+            json.dump(metadata, f, indent=2)
+        return frames_path
@@ -0,0 +1,203 @@
+import multiprocessing
+import queue
+import time
+import weakref
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from .video_backends import open_video
+
+
+class FrameRingBuffer:
+    """
+    Fixed-shape uint8 frame slots in one preallocated shared memory block.
+    Any process that knows the block name can map the same slots with attach()
+    and read a frame by slot index without copying it.
+    """
+
+    def __init__(self, num_slots, frame_shape, name=None, create=True):
+        self.num_slots = num_slots
+        self.frame_shape = tuple(frame_shape)
+        slot_bytes = int(np.prod(self.frame_shape))
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=slot_bytes * num_slots)
+        self.frames = np.ndarray((num_slots,) + self.frame_shape, dtype=np.uint8, buffer=self.shm.buf)
+
+    @classmethod
+    def attach(cls, name, num_slots, frame_shape):
+        return cls(num_slots, frame_shape, name=name, create=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def slot(self, index):
+        """Zero-copy view of one slot"""
+        return self.frames[index]
+
+    def close(self):
+        # Slot views keep self.frames alive as their base, and reading one after the mapping
+        # is closed would crash, so the mapping is closed once the last of them is gone
+        frames, self.frames = self.frames, None
+        weakref.finalize(frames, self.shm.close)
+        del frames
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+def _decode_into_ring_buffer(video_path, buffer_name, num_slots, frame_shape, free_slots, filled_slots, stop_event,
+                             decode_options=None):
+    """Decoder process: fill free slots with decoded frames and publish (sequence, slot) in decode order"""
+    ring_buffer = FrameRingBuffer.attach(buffer_name, num_slots, frame_shape)
+    decoder = open_video(video_path, **(decode_options or {}))
+    sequence = 0
+    try:
+        for frame in decoder.frames():
+            if stop_event.is_set():
+                break
+            # Blocks while every slot is still in use by the readers (backpressure)
+            slot = None
+            while slot is None and not stop_event.is_set():
+                try:
+                    slot = free_slots.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            if slot is None:
+                break
+            if frame.shape != ring_buffer.frame_shape:
+                frame = cv2.resize(frame, (frame_shape[1], frame_shape[0]))
+            ring_buffer.frames[slot] = frame
+            filled_slots.put((sequence, slot))
+            sequence += 1
+    finally:
+        filled_slots.put(None)
+        decoder.close()
+        ring_buffer.close()
+
+
+class SharedMemoryVideoReader:
+    """
+    Decodes a video in a separate process into a FrameRingBuffer, so decoding
+    runs alongside inference instead of on its critical path.
+
+    Readers take (sequence, slot) pairs in decode order, read the slot in
+    place and release it when done; the decoder waits for a released slot
+    once all num_slots are in use.
+
+    Usage:
+        with SharedMemoryVideoReader(path) as reader:
+            for sequence, slot in reader:
+                detect(reader.frame(slot))
+                reader.release(slot)
+
+    or, with the slot released when the next frame is requested:
+        with SharedMemoryVideoReader(path) as reader:
+            for frame in reader.frames():
+                detect(frame)
+    """
+
+    def __init__(self, video_path, num_slots=32, decode_options=None):
+        self.video_path = video_path
+        self.num_slots = num_slots
+        # open_video arguments (backend, threads, scale) used by the decoder process
+        self.decode_options = decode_options or {}
+        self.ring_buffer = None
+        self.decoder = None
+        self.wait_seconds = 0.0
+        self._finished = False
+
+    def start(self):
+        # The frame shape is probed here so the buffer is created, and later unlinked, by this process
+        with open_video(self.video_path, **self.decode_options) as decoder:
+            self.fps = decoder.fps
+            self.frame_count = decoder.frame_count
+            first_frame = next(decoder.frames(0, 1), None)
+        if first_frame is None:
+            raise ValueError(f"No frames could be read from {self.video_path}")
+
+        self.ring_buffer = FrameRingBuffer(self.num_slots, first_frame.shape)
+        # Spawned rather than forked: the caller may already run model, OpenCV or CUDA threads, which a
+        # forked child would inherit in whatever state they were in, and the decoder only needs the backends
+        context = multiprocessing.get_context("spawn")
+        self._free_slots = context.Queue()
+        self._filled_slots = context.Queue()
+        self._stop_event = context.Event()
+        for slot in range(self.num_slots):
+            self._free_slots.put(slot)
+
+        self.decoder = context.Process(
+            target=_decode_into_ring_buffer,
+            args=(self.video_path, self.ring_buffer.name, self.num_slots, first_frame.shape,
+                  self._free_slots, self._filled_slots, self._stop_event, self.decode_options),
+            daemon=True)
+        self.decoder.start()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self):
+        """Yield (sequence, slot) pairs in decode order until the video ends"""
+        while not self._finished:
+            start = time.perf_counter()
+            try:
+                item = self._filled_slots.get(timeout=1.0)
+            except queue.Empty:
+                if not self.decoder.is_alive():
+                    raise RuntimeError(f"Decoder process for {self.video_path} exited with code {self.decoder.exitcode}")
+                continue
+            finally:
+                self.wait_seconds += time.perf_counter() - start
+            if item is None:
+                self._finished = True
+                return
+            yield item
+
+    def frame(self, slot):
+        """Zero-copy view of a slot, valid until the slot is released"""
+        return self.ring_buffer.slot(slot)
+
+    def release(self, slot):
+        self._free_slots.put(slot)
+
+    def frames(self, collected=None):
+        """
+        Yield a zero-copy view of every frame, in decode order.
+
+        A view is only valid until the next frame is requested: its slot is
+        released then, so the consumer must be done with it, e.g. have run
+        inference on it, before moving on. With collected, every frame is
+        also copied into that list just before its slot is released, for
+        the stages that need the frames afterwards.
+        """
+        for _, slot in self:
+            frame = self.ring_buffer.slot(slot)
+            try:
+                yield frame
+            finally:
+                if collected is not None:
+                    collected.append(frame.copy())
+                del frame
+                self.release(slot)
+
+    def close(self):
+        if self.decoder is not None:
+            self._stop_event.set()
+            # Drain so the decoder is never blocked on a full queue while exiting
+            while not self._finished:
+                try:
+                    self._finished = self._filled_slots.get(timeout=0.1) is None
+                except queue.Empty:
+                    if not self.decoder.is_alive():
+                        break
+            self.decoder.join(timeout=5)
+            if self.decoder.is_alive():
+                self.decoder.terminate()
+            self.decoder = None
+        if self.ring_buffer is not None:
+            self.ring_buffer.close()
+            self.ring_buffer.unlink()
+            self.ring_buffer = None
@@ -0,0 +1,87 @@
+from functools import lru_cache
+import numpy as np
+
+
+class KeypointLookup:
+    """
+    Nearest court keypoint for any image position, precomputed once per court.
+
+    The area around the keypoints is divided into cell_size x cell_size cells.
+    Voronoi regions are convex, so a cell whose four corners share the same
+    nearest keypoint lies entirely inside that keypoint's region and a lookup
+    there is a single array index. Points in the few cells a region boundary
+    crosses, or outside the raster, are resolved exactly against the
+    keypoints, so the answer always matches a full scan.
+    """
+
+    def __init__(self, court_keypoints, keypoint_indices=None, cell_size=8, padding=0.5):
+        """
+        Args:
+            court_keypoints: Flat [x0, y0, ..., x13, y13] keypoints
+            keypoint_indices: Optional subset of keypoint indices to choose from
+            cell_size: Raster cell size in pixels
+            padding: Raster margin around the keypoints, as a fraction of their extent
+        """
+        keypoints = np.asarray(court_keypoints, dtype=np.float64).reshape(-1, 2)
+        if keypoint_indices is None:
+            keypoint_indices = range(len(keypoints))
+        self.keypoint_indices = np.asarray(list(keypoint_indices), dtype=np.intp)
+        self.keypoints = keypoints[self.keypoint_indices]
+        self.cell_size = float(cell_size)
+
+        low, high = self.keypoints.min(axis=0), self.keypoints.max(axis=0)
+        margin = np.maximum((high - low) * padding, self.cell_size)
+        self.origin = low - margin
+        self.shape = tuple(np.ceil((high + margin - self.origin) / self.cell_size).astype(int)[::-1])
+
+        # Nearest keypoint at every cell corner, then -1 for cells whose corners disagree
+        rows, columns = self.shape
+        corner_y, corner_x = np.mgrid[0:rows + 1, 0:columns + 1]
+        corners = self.origin + np.stack([corner_x, corner_y], axis=-1) * self.cell_size
+        corner_labels = self._exact(corners.reshape(-1, 2)).reshape(rows + 1, columns + 1)
+        top_left = corner_labels[:-1, :-1]
+        uniform = ((top_left == corner_labels[:-1, 1:]) & (top_left == corner_labels[1:, :-1]) &
+                   (top_left == corner_labels[1:, 1:]))
+        self.raster = np.where(uniform, top_left, -1).astype(np.int8)
+
+    def _exact(self, points):
+        """Position in self.keypoints of the nearest keypoint to each (N, 2) point"""
+        distances = np.linalg.norm(points[:, None, :] - self.keypoints[None, :, :], axis=-1)
+        return np.argmin(np.nan_to_num(distances, nan=np.inf), axis=1)
+
+    def nearest(self, positions):
+        """
+        Index of the nearest court keypoint for positions of shape (..., 2).
+        Non-finite positions get the first allowed keypoint.
+
+        Returns:
+            Integer array of shape positions.shape[:-1]
+        """
+        positions = np.asarray(positions, dtype=np.float64)
+        points = positions.reshape(-1, 2)
+        cells = np.floor((points - self.origin) / self.cell_size)
+        rows, columns = self.shape
+        inside = np.isfinite(cells).all(axis=1) & (cells[:, 0] >= 0) & (cells[:, 0] < columns) & \
+            (cells[:, 1] >= 0) & (cells[:, 1] < rows)
+
+        labels = np.full(len(points), -1, dtype=np.intp)
+        inside_cells = cells[inside].astype(np.intp)
+        labels[inside] = self.raster[inside_cells[:, 1], inside_cells[:, 0]]
+
+        unresolved = labels < 0
+        if unresolved.any():
+            labels[unresolved] = self._exact(points[unresolved])
+        return self.keypoint_indices[labels].reshape(positions.shape[:-1])
+
+
+@lru_cache(maxsize=8)
+def _cached_keypoint_lookup(court_keypoints, keypoint_indices):
+    return KeypointLookup(court_keypoints, keypoint_indices)
+
+
+def get_keypoint_lookup(court_keypoints, keypoint_indices=None):
+    """Shared KeypointLookup for a court, built on first use and reused while the keypoints stay the same"""
+    court_keypoints = tuple(np.asarray(court_keypoints, dtype=np.float64).reshape(-1).tolist())
+    if keypoint_indices is not None:
+        keypoint_indices = tuple(int(index) for index in keypoint_indices)
+    return _cached_keypoint_lookup(court_keypoints, keypoint_indices)
@@ -0,0 +1,261 @@
+import os
+import numpy as np
+from .shot_classifier import ShotClassifier
+from .track_store import as_track_store
+
+# COCO body keypoint indices returned by the YOLOv8 pose models
+LEFT_SHOULDER, RIGHT_SHOULDER = 5, 6
+LEFT_WRIST, RIGHT_WRIST = 9, 10
+LEFT_HIP, RIGHT_HIP = 11, 12
+NUM_POSE_KEYPOINTS = 17
+
+
+def crop_box(bbox, frame_shape, padding=0.25):
+    """
+    Integer crop window around a bounding box, grown by padding on every side
+    so raised arms and the racquet stay inside, and clipped to the frame.
+
+    Returns:
+        (x1, y1, x2, y2), or None for a missing or degenerate box
+    """
+    if bbox is None or not np.isfinite(bbox[:4]).all():
+        return None
+    x1, y1, x2, y2 = bbox[:4]
+    pad_x, pad_y = (x2 - x1) * padding, (y2 - y1) * padding
+    height, width = frame_shape[:2]
+    x1, y1 = max(0, int(x1 - pad_x)), max(0, int(y1 - pad_y))
+    x2, y2 = min(width, int(np.ceil(x2 + pad_x))), min(height, int(np.ceil(y2 + pad_y)))
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return None
+    return x1, y1, x2, y2
+
+
+class PoseShotCache:
+    """
+    Pose crops, keypoints and features per shot, kept in memory and, with a
+    cache_dir, as one .npz file per shot so reruns of the same video skip the
+    pose model. Entries are keyed by (source frame number, player id).
+    """
+
+    def __init__(self, cache_dir=None, video_key=None):
+        self.cache_dir = cache_dir
+        self.video_key = video_key or "video"
+        self.entries = {}
+
+    def _path(self, key):
+        frame_num, player_id = key
+        return os.path.join(self.cache_dir, f"{self.video_key}_shot{frame_num}_player{player_id}.npz")
+
+    def get(self, key):
+        if key in self.entries:
+            return self.entries[key]
+        if self.cache_dir is None or not os.path.exists(self._path(key)):
+            return None
+        with np.load(self._path(key)) as data:
+            entry = {"boxes": data["boxes"], "keypoints": data["keypoints"],
+                     "crops": [data[f"crop_{i}"] for i in range(len(data["boxes"]))],
+                     "features": {name[len("feature_"):]: float(data[name]) for name in data.files
+                                  if name.startswith("feature_")}}
+        self.entries[key] = entry
+        return entry
+
+    def put(self, key, crops, boxes, keypoints, features):
+        entry = {"crops": crops, "boxes": boxes, "keypoints": keypoints, "features": features}
+        self.entries[key] = entry
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            arrays = {f"crop_{i}": crop for i, crop in enumerate(crops)}
+            arrays.update({f"feature_{name}": value for name, value in features.items()})
+            np.savez_compressed(self._path(key), boxes=boxes, keypoints=keypoints, **arrays)
+        return entry
+
+
+class PoseShotClassifier(ShotClassifier):
+    """
+    ShotClassifier that looks at the hitter's body for forehands, backhands
+    and smashes.
+
+    The position rules still find the hitter, serves and volleys. For every
+    other shot the pose model runs on crops of the hitter only, in the frames
+    within window_frames of the shot, so pose cost grows with the number of
+    shots rather than frames. From the poses:
+      - overhead: how far the highest wrist rises above the shoulders, in
+        torso lengths; a racquet arm well above the head is a smash
+      - hitting side: where the ball (or, without a ball detection, the
+        wrist that reaches furthest from the body) is relative to the torso,
+        along the hitter's left-to-right shoulder axis; the dominant-hand side
+        is a forehand, the other side a backhand
+    Shots whose poses are not confident enough keep the rule-based label.
+    """
+
+    def __init__(self, pose_estimator, window_frames=4, crop_padding=0.25, min_pose_confidence=0.4,
+                 overhead_threshold=0.5, handedness=None, cache=None):
+        """
+        Args:
+            pose_estimator: PoseEstimator run on the hitter crops
+            window_frames: Frames before and after each shot whose hitter crop is posed
+            crop_padding: Crop margin around the hitter's box, as a fraction of its size
+            min_pose_confidence: Mean shoulder and wrist confidence needed to use a pose
+            overhead_threshold: Wrist height above the shoulders, in torso lengths, from which a shot is a smash
+            handedness: Optional {player_id: "right" or "left"}, right-handed by default
+            cache: Optional PoseShotCache
+        """
+        super().__init__()
+        self.pose_estimator = pose_estimator
+        self.window_frames = window_frames
+        self.crop_padding = crop_padding
+        self.min_pose_confidence = min_pose_confidence
+        self.overhead_threshold = overhead_threshold
+        self.handedness = handedness or {}
+        self.cache = cache or PoseShotCache()
+
+    def classify_shots(self, player_mini_court_detections, ball_mini_court_detections, ball_shot_frames,
+                       mini_court_height, video_frames=None, player_detections=None, ball_detections=None,
+                       frame_numbers=None):
+        """
+        Classify each shot, from the hitter's pose where one is available.
+
+        Args:
+            player_mini_court_detections: TrackStore of player positions on mini court
+            ball_mini_court_detections: TrackStore of ball positions on mini court
+            ball_shot_frames: List of frame numbers where shots occur
+            mini_court_height: Height of the mini court for relative positioning
+            video_frames: Frames the shot frames index into; without them only the rules are used
+            player_detections: TrackStore of the chosen players' boxes in frame pixels
+            ball_detections: Optional TrackStore of ball boxes in frame pixels
+            frame_numbers: Optional source frame number of every frame, used as the cache key
+
+        Returns:
+            Dictionary mapping each shot frame to its classification, the player
+            who made it and whether the pose decided it ("pose": True)
+        """
+        shot_classifications = super().classify_shots(player_mini_court_detections, ball_mini_court_detections,
+                                                      ball_shot_frames, mini_court_height)
+        for classification in shot_classifications.values():
+            classification['pose'] = False
+        if video_frames is None or player_detections is None:
+            return shot_classifications
+
+        player_detections = as_track_store(player_detections)
+        ball_detections = as_track_store(ball_detections) if ball_detections is not None else None
+        shots = [(shot_frame, classification) for shot_frame, classification in shot_classifications.items()
+                 if classification['shot_type'] != self.SHOT_TYPES['SERVE']]
+        features = self.shot_features(shots, video_frames, player_detections, ball_detections, frame_numbers)
+
+        for (shot_frame, classification), shot_features in zip(shots, features):
+            if shot_features is None or shot_features["confidence"] < self.min_pose_confidence:
+                continue
+            classification['pose'] = True
+            if shot_features["overhead"] >= self.overhead_threshold:
+                classification['shot_type'] = self.SHOT_TYPES['SMASH']
+            elif classification['shot_type'] != self.SHOT_TYPES['VOLLEY']:
+                dominant = -1 if self.handedness.get(classification['player_id'], "right") == "left" else 1
+                on_dominant_side = shot_features["hitting_side"] * dominant >= 0
+                classification['shot_type'] = self.SHOT_TYPES['FOREHAND' if on_dominant_side else 'BACKHAND']
+        return shot_classifications
+
+    def shot_features(self, shots, video_frames, player_detections, ball_detections=None, frame_numbers=None):
+        """
+        Pose features of every (shot_frame, classification) pair, taken from
+        the cache or computed with one batched pose pass over all missing shots.
+
+        Returns:
+            List with a feature dict, or None when the hitter is never visible, per shot
+        """
+        num_frames = len(video_frames)
+        entries = [None] * len(shots)
+        pending = []
+        for index, (shot_frame, classification) in enumerate(shots):
+            player_id = classification['player_id']
+            key = (int(frame_numbers[shot_frame]) if frame_numbers is not None else int(shot_frame), player_id)
+            entries[index] = self.cache.get(key)
+            if entries[index] is not None:
+                # Features are cheap, so recompute them from the cached poses in case the rules changed
+                entries[index]["features"] = self._pose_features(entries[index]["keypoints"],
+                                                                 entries[index]["boxes"][:, 0], shot_frame,
+                                                                 ball_detections)
+                continue
+            if player_id not in player_detections.track_ids:
+                continue
+            boxes = player_detections.track_values(player_id)
+            window = range(max(0, shot_frame - self.window_frames), min(num_frames, shot_frame + self.window_frames + 1))
+            crops, crop_boxes = [], []
+            for frame_num in window:
+                window_box = crop_box(boxes[frame_num], video_frames[frame_num].shape, self.crop_padding)
+                if window_box is not None:
+                    x1, y1, x2, y2 = window_box
+                    crops.append(np.ascontiguousarray(video_frames[frame_num][y1:y2, x1:x2]))
+                    crop_boxes.append((frame_num,) + window_box)
+            if crops:
+                pending.append((index, key, shot_frame, crops, np.array(crop_boxes, dtype=np.int64)))
+
+        all_crops = [crop for _, _, _, crops, _ in pending for crop in crops]
+        all_keypoints = self.pose_estimator.estimate(all_crops) if all_crops else None
+        start = 0
+        for index, key, shot_frame, crops, crop_boxes in pending:
+            keypoints = all_keypoints[start:start + len(crops)].copy()
+            start += len(crops)
+            # Crop pixels to frame pixels
+            keypoints[:, :, 0] += crop_boxes[:, 1, None]
+            keypoints[:, :, 1] += crop_boxes[:, 2, None]
+            entries[index] = self.cache.put(key, crops, crop_boxes, keypoints,
+                                            self._pose_features(keypoints, crop_boxes[:, 0], shot_frame,
+                                                                ball_detections))
+        return [entry["features"] if entry is not None else None for entry in entries]
+
+    @staticmethod
+    def _ball_center(ball_detections, frame_num):
+        if ball_detections is None or 1 not in ball_detections.track_ids or frame_num >= len(ball_detections):
+            return None
+        box = ball_detections.track_values(1)[frame_num]
+        if not np.isfinite(box).all():
+            return None
+        return np.array([(box[0] + box[2]) / 2, (box[1] + box[3]) / 2])
+
+    def _pose_features(self, keypoints, pose_frames, shot_frame, ball_detections=None):
+        """
+        Args:
+            keypoints: (W, 17, 3) poses in frame pixels across the shot window
+            pose_frames: (W,) frame number of every pose
+            shot_frame: Frame of the shot
+            ball_detections: Optional TrackStore of ball boxes in frame pixels
+
+        Returns:
+            Dict with confidence, overhead and hitting_side
+        """
+        points, confidence = keypoints[:, :, :2], keypoints[:, :, 2]
+        upper_body = [LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_WRIST, RIGHT_WRIST]
+        pose_confidence = confidence[:, upper_body].mean(axis=1)
+        if not pose_confidence.any():
+            return {"confidence": 0.0, "overhead": 0.0, "hitting_side": 0.0}
+
+        shoulders = (points[:, LEFT_SHOULDER] + points[:, RIGHT_SHOULDER]) / 2
+        hips = (points[:, LEFT_HIP] + points[:, RIGHT_HIP]) / 2
+        torso_length = np.maximum(np.linalg.norm(shoulders - hips, axis=1), 1.0)
+        wrists = points[:, [LEFT_WRIST, RIGHT_WRIST]]
+        wrists_visible = confidence[:, [LEFT_WRIST, RIGHT_WRIST]] >= self.min_pose_confidence
+
+        # The pose closest to the shot, among the confident ones
+        usable = np.flatnonzero(pose_confidence >= self.min_pose_confidence)
+        if len(usable) == 0:
+            usable = np.arange(len(pose_frames))
+        contact = usable[np.argmin(np.abs(pose_frames[usable] - shot_frame))]
+
+        # Image y grows downwards, so a raised wrist has a smaller y than the shoulders.
+        # Only the swing up to contact counts: a high forehand or backhand finish is not a smash.
+        swing = pose_frames <= pose_frames[contact]
+        wrist_height = np.where(wrists_visible, (shoulders[:, None, 1] - wrists[:, :, 1]) / torso_length[:, None], -np.inf)
+        overhead = float(wrist_height[swing].max()) if wrists_visible[swing].any() else 0.0
+
+        right_axis = points[contact, RIGHT_SHOULDER] - points[contact, LEFT_SHOULDER]
+        shoulder_width = max(np.linalg.norm(right_axis), 1.0)
+        ball_center = self._ball_center(ball_detections, int(pose_frames[contact]))
+        if ball_center is not None:
+            contact_point = ball_center
+        else:
+            reach = np.linalg.norm(wrists[contact] - shoulders[contact], axis=1)
+            reach[~wrists_visible[contact]] = -np.inf
+            contact_point = wrists[contact, int(np.argmax(reach))]
+        hitting_side = float(np.dot(contact_point - shoulders[contact], right_axis) / shoulder_width ** 2)
+
+        return {"confidence": float(pose_confidence[contact]), "overhead": overhead, "hitting_side": hitting_side}
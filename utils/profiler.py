@@ -0,0 +1,236 @@
+import json
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+import numpy as np
+
+# Per-frame latency histogram bin edges in milliseconds (log spaced, 0.1 ms to 10 s)
+LATENCY_BIN_EDGES_MS = np.logspace(-1, 4, 26)
+
+
+def get_peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unavailable"""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            memory_info = psutil.Process().memory_info()
+            return getattr(memory_info, "peak_wset", memory_info.rss) / 1024**2
+        except ImportError:
+            return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def get_current_rss_mb():
+    """Current resident set size of this process in MB, or None if unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024**2
+    except ImportError:
+        return None
+
+
+class StageStats:
+    __slots__ = ("name", "calls", "wall_seconds", "cpu_seconds", "frames", "frame_latencies_ms", "peak_rss_mb")
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.frames = 0
+        self.frame_latencies_ms = []
+        self.peak_rss_mb = None
+
+    def to_dict(self):
+        stage = {
+            "calls": self.calls,
+            "wall_seconds": round(self.wall_seconds, 6),
+            "cpu_seconds": round(self.cpu_seconds, 6),
+            "frames": self.frames,
+            "fps": round(self.frames / self.wall_seconds, 3) if self.frames and self.wall_seconds > 0 else None,
+            "peak_rss_mb": round(self.peak_rss_mb, 1) if self.peak_rss_mb is not None else None,
+        }
+        if self.frame_latencies_ms:
+            latencies = np.asarray(self.frame_latencies_ms)
+            counts, _ = np.histogram(latencies, bins=LATENCY_BIN_EDGES_MS)
+            stage["frame_latency_ms"] = {
+                "mean": round(float(latencies.mean()), 3),
+                "p50": round(float(np.percentile(latencies, 50)), 3),
+                "p95": round(float(np.percentile(latencies, 95)), 3),
+                "p99": round(float(np.percentile(latencies, 99)), 3),
+                "max": round(float(latencies.max()), 3),
+                "histogram": {
+                    "bin_edges_ms": [round(float(edge), 4) for edge in LATENCY_BIN_EDGES_MS],
+                    "counts": counts.tolist(),
+                },
+            }
+        return stage
+
+
+class PipelineProfiler:
+    """
+    Collects per-stage wall and CPU time, per-frame latencies, frames/sec and
+    peak RSS for one pipeline run.
+
+    Usage:
+        profiler = create_profiler(enabled=True)
+        with profiler.stage("decode"):
+            frames = read_video(path)
+        for frame in profiler.timed_frames("detect_players", frames):
+            ...
+        profiler.save_report("output_videos/profile.json")
+    """
+
+    enabled = True
+
+    def __init__(self, chrome_trace=False):
+        self.chrome_trace = chrome_trace
+        self.stages = {}
+        self.trace_events = []
+        self.metadata = {}
+        self.started_at = time.perf_counter()
+        self.started_cpu = time.process_time()
+        self.pid = os.getpid()
+
+    def _stats(self, name):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats(name)
+        return stats
+
+    def _trace(self, name, start, duration, category):
+        if self.chrome_trace:
+            self.trace_events.append({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self.started_at) * 1e6,
+                "dur": duration * 1e6,
+                "pid": self.pid,
+                "tid": threading.get_ident(),
+            })
+
+    @contextmanager
+    def stage(self, name, num_frames=None):
+        """Time a block of work as one call of the named stage"""
+        stats = self._stats(name)
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield stats
+        finally:
+            wall = time.perf_counter() - start_wall
+            stats.calls += 1
+            stats.wall_seconds += wall
+            stats.cpu_seconds += time.process_time() - start_cpu
+            if num_frames is not None:
+                stats.frames += num_frames
+            stats.peak_rss_mb = get_peak_rss_mb()
+            self._trace(name, start_wall, wall, "stage")
+
+    def timed_frames(self, name, frames):
+        """
+        Yield frames while timing the work done on each one by the consumer.
+
+        The stage is timed as a whole and the time between consecutive yields
+        is recorded as that frame's latency.
+        """
+        with self.stage(name) as stats:
+            for frame in frames:
+                start = time.perf_counter()
+                yield frame
+                latency = time.perf_counter() - start
+                stats.frames += 1
+                stats.frame_latencies_ms.append(latency * 1000)
+                self._trace(f"{name}[{stats.frames - 1}]", start, latency, "frame")
+
+    def add_frames(self, name, count):
+        """Credit frames to a stage whose frame count is only known after it ran"""
+        self._stats(name).frames += count
+
+    def add_frame_latency(self, name, seconds):
+        stats = self._stats(name)
+        stats.frames += 1
+        stats.frame_latencies_ms.append(seconds * 1000)
+
+    def set_metadata(self, **metadata):
+        self.metadata.update(metadata)
+
+    def report(self):
+        total_wall = time.perf_counter() - self.started_at
+        return {
+            "metadata": self.metadata,
+            "total_wall_seconds": round(total_wall, 6),
+            "total_cpu_seconds": round(time.process_time() - self.started_cpu, 6),
+            "peak_rss_mb": get_peak_rss_mb(),
+            "stages": {name: stats.to_dict() for name, stats in self.stages.items()},
+        }
+
+    def save_report(self, report_path, chrome_trace_path=None):
+        """Write the JSON report, and a Chrome trace (chrome://tracing, Perfetto) if enabled"""
+        report_dir = os.path.dirname(report_path)
+        if report_dir:
+            os.makedirs(report_dir, exist_ok=True)
+        with open(report_path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+        if self.chrome_trace:
+            chrome_trace_path = chrome_trace_path or os.path.splitext(report_path)[0] + ".trace.json"
+            with open(chrome_trace_path, "w") as f:
+                json.dump({"traceEvents": self.trace_events, "displayTimeUnit": "ms"}, f)
+
+    def print_summary(self):
+        print("Stage timings:")
+        for name, stats in self.stages.items():
+            print(f"  {name:<32} {stats.wall_seconds:9.3f}s wall {stats.cpu_seconds:9.3f}s cpu")
+
+
+class NullProfiler:
+    """Profiler used when profiling is disabled; every method is a no-op"""
+
+    enabled = False
+    _null_stage = nullcontext()
+
+    def stage(self, name, num_frames=None):
+        return self._null_stage
+
+    def timed_frames(self, name, frames):
+        return frames
+
+    def add_frames(self, name, count):
+        pass
+
+    def add_frame_latency(self, name, seconds):
+        pass
+
+    def set_metadata(self, **metadata):
+        pass
+
+    def report(self):
+        return {}
+
+    def save_report(self, report_path, chrome_trace_path=None):
+        pass
+
+    def print_summary(self):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def create_profiler(enabled=False, chrome_trace=False):
+    """Return a PipelineProfiler when enabled, otherwise the shared no-op profiler"""
+    return PipelineProfiler(chrome_trace=chrome_trace) if enabled else NULL_PROFILER
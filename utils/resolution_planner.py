@@ -0,0 +1,75 @@
+import cv2
+import numpy as np
+
+
+class ResolutionPlanner:
+    """
+    Routes each model to its own input resolution.
+
+    scales maps a model name ("players", "ball") to the fraction of the
+    model's default input size (and of the decoded frame) that model runs at,
+    so inference cost drops with the square of the scale. The downscaled
+    copies of a frame form a small pyramid built once per frame and shared by
+    every model asking for the same frame, each level resized from the
+    closest larger one. Models without a scale get the full frame and keep
+    their default input size.
+    """
+
+    def __init__(self, scales=None, stride=32, default_input_size=640):
+        """
+        Args:
+            scales: Dict of model name to scale, None or 0 for unscaled
+            stride: Model stride input sizes are rounded up to
+            default_input_size: Input size the models run at unscaled (YOLO's imgsz default)
+        """
+        self.scales = {name: scale for name, scale in (scales or {}).items() if scale}
+        self.stride = stride
+        self.default_input_size = default_input_size
+        self._frame = None
+        self._levels = {}
+
+    def scale_for(self, name):
+        return self.scales.get(name, 1.0)
+
+    def level(self, frame, scale):
+        """The frame resized by scale, cached for the current frame"""
+        if scale == 1.0:
+            return frame
+        if self._frame is not frame:
+            self._frame = frame
+            self._levels = {}
+        if scale not in self._levels:
+            larger = [level_scale for level_scale in self._levels if level_scale > scale]
+            source = self._levels[min(larger)] if larger else frame
+            height, width = frame.shape[:2]
+            size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+            self._levels[scale] = cv2.resize(source, size, interpolation=cv2.INTER_AREA)
+        return self._levels[scale]
+
+    def prepare(self, name, frame):
+        """
+        Model input for one frame.
+
+        Returns:
+            (image, scale, predict_kwargs): the resized frame, its scale and the
+            extra model arguments (the matching input size when scaled)
+        """
+        scale = self.scale_for(name)
+        if name not in self.scales:
+            return frame, 1.0, {}
+        image = self.level(frame, scale)
+        return image, scale, {"imgsz": self.input_size(scale)}
+
+    def input_size(self, scale):
+        """Default input size times scale, rounded up to the model stride"""
+        size = self.default_input_size * scale
+        return int(max(1, -(-size // self.stride)) * self.stride)
+
+
+def scale_boxes_to_frame(boxes, scale):
+    """Map [x1, y1, x2, y2, ...] boxes detected on a frame resized by scale back to full-frame pixels"""
+    if scale == 1.0:
+        return boxes
+    boxes = np.asarray(boxes, dtype=np.float64).copy()
+    boxes[..., :4] /= scale
+    return boxes.tolist()
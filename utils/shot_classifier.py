@@ -1,5 +1,6 @@
 import numpy as np
 from utils import measure_distance_between_points, measure_xy_distance
+from .track_store import as_track_store
 import pandas as pd
 
 class ShotClassifier:
@@ -39,8 +40,8 @@ class ShotClassifier:
         Classify each shot in the tennis match.
         
         Args:
-            player_mini_court_detections: Dictionary of player positions on mini court
-            ball_mini_court_detections: Dictionary of ball positions on mini court
+            player_mini_court_detections: TrackStore of player positions on mini court
+            ball_mini_court_detections: TrackStore of ball positions on mini court
             ball_shot_frames: List of frame numbers where shots occur
             mini_court_height: Height of the mini court for relative positioning
             
@@ -52,6 +53,10 @@ class ShotClassifier:
         # Skip if not enough shots
         if len(ball_shot_frames) <= 1:
             return shot_classifications
+
+        player_mini_court_detections = as_track_store(player_mini_court_detections, num_values=2)
+        ball_mini_court_detections = as_track_store(ball_mini_court_detections, num_values=2)
+        ball_positions = ball_mini_court_detections.track_values(1)
         
         # Classify each shot
         for i in range(len(ball_shot_frames)-1):
@@ -59,23 +64,21 @@ class ShotClassifier:
             next_shot_frame = ball_shot_frames[i+1]
             
             # Get player who made the shot (closest to ball at shot frame)
-            player_positions = player_mini_court_detections[shot_frame]
-            if not player_positions or not ball_mini_court_detections.get(shot_frame, {}).get(1):
+            player_ids, player_positions = player_mini_court_detections.frame(shot_frame)
+            ball_pos = ball_positions[shot_frame]
+            if not player_ids or np.isnan(ball_pos).any():
                 continue
                 
-            ball_pos = ball_mini_court_detections[shot_frame][1]
-            player_shot_id = min(player_positions.keys(), 
-                               key=lambda x: measure_distance_between_points(player_positions[x], ball_pos))
+            closest_player_index = int(np.argmin(np.linalg.norm(player_positions - ball_pos, axis=1)))
+            player_shot_id = player_ids[closest_player_index]
             
             # Extract player and ball positions
-            player_pos = player_positions[player_shot_id]
+            player_pos = player_positions[closest_player_index]
             player_y = player_pos[1]
             
             # Get ball trajectory
-            if shot_frame in ball_mini_court_detections and next_shot_frame in ball_mini_court_detections:
-                ball_start = ball_mini_court_detections[shot_frame][1]
-                ball_end = ball_mini_court_detections[next_shot_frame][1]
-                ball_trajectory_y = ball_end[1] - ball_start[1]
+            if next_shot_frame < len(ball_positions) and not np.isnan(ball_positions[next_shot_frame]).any():
+                ball_trajectory_y = ball_positions[next_shot_frame][1] - ball_pos[1]
             else:
                 ball_trajectory_y = 0
             
@@ -149,7 +152,7 @@ class ShotClassifier:
         return self.SHOT_COLORS.get(shot_type, (255, 255, 255))  # Default to white
 
 
-def draw_shot_classifications(frames, shot_classifications, ball_shot_frames):
+def draw_shot_classifications(frames, shot_classifications, ball_shot_frames, start_frame=0):
     """
     Draw shot classification information in a dedicated shot statistics board.
     
@@ -157,6 +160,7 @@ def draw_shot_classifications(frames, shot_classifications, ball_shot_frames):
         frames: List of video frames to draw on
         shot_classifications: Dictionary of shot classifications by frame
         ball_shot_frames: List of frame numbers where shots occur
+        start_frame: Frame number of frames[0], when drawing part of the video
         
     Returns:
         Frames with shot statistics board
@@ -172,7 +176,7 @@ def draw_shot_classifications(frames, shot_classifications, ball_shot_frames):
     thickness = 1
     
     # Process each frame
-    for i, frame in enumerate(frames):
+    for i, frame in enumerate(frames, start_frame):
         height, width = frame.shape[:2]
         
         # Create player shot histories up to the current frame
@@ -0,0 +1,219 @@
+import pickle
+import numpy as np
+from .shot_classifier import ShotClassifier
+from .track_store import as_track_store
+
+# Columns of the matrix returned by extract_shot_features. Directions are in
+# the hitter's frame of reference: "forward" points towards the opponent and
+# "right" is the hitter's right, so both ends of the court look the same.
+SHOT_FEATURE_NAMES = (
+    "net_distance",              # hitter's distance to the net, in court heights
+    "near_side",                 # 1 for the hitter on the near (bottom) half, 0 for the far half
+    "ball_offset_right",         # ball position relative to the hitter at the shot, in court heights
+    "ball_offset_forward",
+    "velocity_in_right",         # ball velocity arriving at the shot, in court heights per second
+    "velocity_in_forward",
+    "velocity_out_right",        # ball velocity leaving the shot
+    "velocity_out_forward",
+    "speed_in",
+    "speed_out",
+    "direction_change",          # angle between the incoming and outgoing ball, in radians
+    "time_to_next_shot",         # seconds, NaN for the last shot
+    "time_since_previous_shot",  # seconds, NaN for the first shot
+    "is_first_shot",
+)
+
+
+def extract_shot_features(player_mini_court_detections, ball_mini_court_detections, ball_shot_frames,
+                          mini_court_height, fps=24, velocity_frames=3):
+    """
+    Feature matrix of all shots of a match, computed in one vectorized pass.
+
+    The hitter is the player closest to the ball at the shot frame, as in
+    ShotClassifier. Missing positions give NaN features, which the
+    gradient-boosted model handles natively.
+
+    Args:
+        player_mini_court_detections: TrackStore of player positions on mini court
+        ball_mini_court_detections: TrackStore of ball positions on mini court
+        ball_shot_frames: List of frame numbers where shots occur
+        mini_court_height: Height of the mini court, used to normalise positions and velocities
+        fps: Frame rate of the video
+        velocity_frames: Frames before and after the shot the ball velocities are measured over
+
+    Returns:
+        (features, player_ids): (S, len(SHOT_FEATURE_NAMES)) float64 array and
+        (S,) int array with the hitter's track ID, 0 where no player or ball was seen
+    """
+    shot_frames = np.asarray(ball_shot_frames, dtype=np.int64)
+    features = np.full((len(shot_frames), len(SHOT_FEATURE_NAMES)), np.nan)
+    player_ids = np.zeros(len(shot_frames), dtype=np.int64)
+    if len(shot_frames) == 0:
+        return features, player_ids
+
+    player_mini_court_detections = as_track_store(player_mini_court_detections, num_values=2)
+    ball_mini_court_detections = as_track_store(ball_mini_court_detections, num_values=2)
+    scale = float(mini_court_height)
+    ball_positions = ball_mini_court_detections.track_values(1) / scale
+    last_frame = len(ball_positions) - 1
+
+    # Hitter: the closest present player to the ball at each shot
+    player_positions = np.where(player_mini_court_detections.present[..., None],
+                                player_mini_court_detections.values, np.nan)[shot_frames] / scale
+    ball_at_shot = ball_positions[shot_frames]
+    distances = np.linalg.norm(player_positions - ball_at_shot[:, None], axis=2)
+    found = np.isfinite(distances).any(axis=1)
+    closest = np.argmin(np.where(np.isfinite(distances), distances, np.inf), axis=1)
+    hitter = np.where(found[:, None], player_positions[np.arange(len(shot_frames)), closest], np.nan)
+    track_ids = np.asarray(player_mini_court_detections.track_ids or [0], dtype=np.int64)
+    player_ids[found] = track_ids[closest[found]]
+
+    # Net at the middle of the mini court; the near player faces up (towards smaller y)
+    net_y = 0.5
+    near_side = hitter[:, 1] > net_y
+    forward = np.where(near_side, -1.0, 1.0)
+    right = -forward
+
+    def velocity(start, end):
+        dt = (end - start) / fps
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where((dt > 0)[:, None], (ball_positions[end] - ball_positions[start]) / dt[:, None], np.nan)
+
+    velocity_in = velocity(np.maximum(shot_frames - velocity_frames, 0), shot_frames)
+    velocity_out = velocity(shot_frames, np.minimum(shot_frames + velocity_frames, last_frame))
+    offset = ball_at_shot - hitter
+    speed_in = np.linalg.norm(velocity_in, axis=1)
+    speed_out = np.linalg.norm(velocity_out, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cosine = np.einsum("ij,ij->i", velocity_in, velocity_out) / (speed_in * speed_out)
+
+    gaps = np.diff(shot_frames) / fps
+    features[:, 0] = np.abs(hitter[:, 1] - net_y)
+    features[:, 1] = np.where(found, near_side, np.nan)
+    features[:, 2] = offset[:, 0] * right
+    features[:, 3] = offset[:, 1] * forward
+    features[:, 4] = velocity_in[:, 0] * right
+    features[:, 5] = velocity_in[:, 1] * forward
+    features[:, 6] = velocity_out[:, 0] * right
+    features[:, 7] = velocity_out[:, 1] * forward
+    features[:, 8] = speed_in
+    features[:, 9] = speed_out
+    features[:, 10] = np.arccos(np.clip(cosine, -1.0, 1.0))
+    features[:-1, 11] = gaps
+    features[1:, 12] = gaps
+    features[:, 13] = np.arange(len(shot_frames)) == 0
+    return features, player_ids
+
+
+def train_shot_model(features, labels, max_iter=200, learning_rate=0.1, max_leaf_nodes=15, random_state=0):
+    """
+    Fit a gradient-boosted tree classifier on labelled shot features.
+
+    Args:
+        features: (S, len(SHOT_FEATURE_NAMES)) feature matrix, e.g. the stacked
+            extract_shot_features output of many matches
+        labels: (S,) shot type names (ShotClassifier.SHOT_TYPES values)
+
+    Returns:
+        Fitted sklearn HistGradientBoostingClassifier
+    """
+    # Only needed by the model-based classifier
+    from sklearn.ensemble import HistGradientBoostingClassifier
+
+    model = HistGradientBoostingClassifier(max_iter=max_iter, learning_rate=learning_rate,
+                                           max_leaf_nodes=max_leaf_nodes, random_state=random_state)
+    model.fit(np.asarray(features, dtype=np.float64), np.asarray(labels))
+    return model
+
+
+def save_shot_model(model, path):
+    with open(path, 'wb') as f:
+        pickle.dump(model, f)
+
+
+def load_shot_model(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+class ModelShotClassifier(ShotClassifier):
+    """
+    ShotClassifier backed by a trained model on extract_shot_features.
+
+    A fallback classifier (the position rules by default, or e.g. a
+    PoseShotClassifier) still decides which shots are classified and who hit
+    them; the model then relabels every shot it predicts with at least
+    min_probability. Without a model the fallback's labels are kept as is.
+    """
+
+    def __init__(self, model=None, fallback=None, min_probability=0.5, fps=24, velocity_frames=3, batch_size=65536):
+        """
+        Args:
+            model: Fitted classifier with predict_proba and classes_ (see train_shot_model), or None
+            fallback: ShotClassifier whose labels are used where the model is missing or unsure
+            min_probability: Lowest predicted class probability the model's label is used from
+            fps: Frame rate of the video
+            velocity_frames: Frames before and after the shot the ball velocities are measured over
+            batch_size: Shots per predict_proba call in predict
+        """
+        super().__init__()
+        self.model = model
+        self.fallback = fallback or ShotClassifier()
+        self.min_probability = min_probability
+        self.fps = fps
+        self.velocity_frames = velocity_frames
+        self.batch_size = batch_size
+
+    def classify_shots(self, player_mini_court_detections, ball_mini_court_detections, ball_shot_frames,
+                       mini_court_height, **fallback_kwargs):
+        """
+        Classify each shot with the model, keeping the fallback label where it is unsure.
+
+        Args:
+            player_mini_court_detections: TrackStore of player positions on mini court
+            ball_mini_court_detections: TrackStore of ball positions on mini court
+            ball_shot_frames: List of frame numbers where shots occur
+            mini_court_height: Height of the mini court for relative positioning
+            **fallback_kwargs: Passed on to the fallback's classify_shots
+
+        Returns:
+            Dictionary mapping each shot frame to its classification, the player
+            who made it and whether the model decided it ("model": True)
+        """
+        shot_classifications = self.fallback.classify_shots(player_mini_court_detections, ball_mini_court_detections,
+                                                            ball_shot_frames, mini_court_height, **fallback_kwargs)
+        for classification in shot_classifications.values():
+            classification['model'] = False
+        if self.model is None or not shot_classifications:
+            return shot_classifications
+
+        features, _ = extract_shot_features(player_mini_court_detections, ball_mini_court_detections, ball_shot_frames,
+                                            mini_court_height, fps=self.fps, velocity_frames=self.velocity_frames)
+        rows = [i for i, shot_frame in enumerate(ball_shot_frames) if shot_frame in shot_classifications]
+        shot_types, probabilities = self.predict(features[rows])
+        for row, shot_type, probability in zip(rows, shot_types, probabilities):
+            if probability >= self.min_probability:
+                classification = shot_classifications[ball_shot_frames[row]]
+                classification['shot_type'] = str(shot_type)
+                classification['model'] = True
+        return shot_classifications
+
+    def predict(self, features):
+        """
+        Shot types of a feature matrix of any length, e.g. a whole season of
+        shots stacked with np.vstack, predicted in batches of batch_size.
+
+        Returns:
+            (shot_types, probabilities): (S,) predicted shot type names and the
+            probability of each
+        """
+        features = np.asarray(features, dtype=np.float64).reshape(-1, len(SHOT_FEATURE_NAMES))
+        classes = np.asarray(self.model.classes_)
+        shot_types = np.empty(len(features), dtype=classes.dtype)
+        probabilities = np.empty(len(features))
+        for start in range(0, len(features), self.batch_size):
+            batch_probabilities = self.model.predict_proba(features[start:start + self.batch_size])
+            best = batch_probabilities.argmax(axis=1)
+            shot_types[start:start + len(best)] = classes[best]
+            probabilities[start:start + len(best)] = batch_probabilities[np.arange(len(best)), best]
+        return shot_types, probabilities
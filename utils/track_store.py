@@ -0,0 +1,198 @@
+import numpy as np
+from collections.abc import Mapping
+
+
+class FrameView(Mapping):
+    """
+    Read-only {track_id: values} view of one frame of a TrackStore, for code
+    that still expects the per-frame detection dicts.
+    """
+
+    __slots__ = ("_store", "_frame_num")
+
+    def __init__(self, store, frame_num):
+        self._store = store
+        self._frame_num = frame_num
+
+    def __getitem__(self, track_id):
+        column = self._store._columns.get(track_id)
+        if column is None or not self._store.present[self._frame_num, column]:
+            raise KeyError(track_id)
+        return self._store.values[self._frame_num, column].tolist()
+
+    def __contains__(self, track_id):
+        column = self._store._columns.get(track_id)
+        return column is not None and bool(self._store.present[self._frame_num, column])
+
+    def __iter__(self):
+        track_ids = self._store.track_ids
+        for column in np.flatnonzero(self._store.present[self._frame_num]):
+            yield track_ids[column]
+
+    def __len__(self):
+        return int(self._store.present[self._frame_num].sum())
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class TrackStore:
+    """
+    Per-frame boxes or positions of a set of tracks, held in contiguous arrays.
+
+    values has shape (num_frames, num_tracks, num_values), e.g. [x1, y1, x2, y2]
+    boxes or (x, y) mini court positions, and present marks which track was
+    seen in which frame. store.frame(i) and store.track(track_id) are O(1)
+    slices, and store[i] gives a dict-like FrameView so the store can be used
+    wherever a list of per-frame detection dicts was expected.
+    """
+
+    __slots__ = ("values", "present", "track_ids", "_columns")
+
+    def __init__(self, num_frames, track_ids=(), num_values=4):
+        self.track_ids = list(track_ids)
+        self._columns = {track_id: column for column, track_id in enumerate(self.track_ids)}
+        self.values = np.full((num_frames, len(self.track_ids), num_values), np.nan)
+        self.present = np.zeros((num_frames, len(self.track_ids)), dtype=bool)
+
+    @classmethod
+    def from_arrays(cls, values, present, track_ids):
+        store = cls.__new__(cls)
+        store.track_ids = list(track_ids)
+        store._columns = {track_id: column for column, track_id in enumerate(store.track_ids)}
+        store.values = np.asarray(values, dtype=np.float64)
+        store.present = np.asarray(present, dtype=bool)
+        return store
+
+    @classmethod
+    def from_frame_dicts(cls, detections, num_values=None):
+        """
+        Build a store from a list of {track_id: values} dicts, one per frame, or
+        from a {frame_num: {track_id: values}} dict. Entries with missing or
+        non-finite values are treated as absent.
+        """
+        if isinstance(detections, Mapping):
+            num_frames = max(detections.keys(), default=-1) + 1
+            frames = [detections.get(frame_num, {}) for frame_num in range(num_frames)]
+        else:
+            frames = list(detections)
+
+        track_ids = {}
+        for frame_dict in frames:
+            for track_id, value in frame_dict.items():
+                track_ids.setdefault(track_id, None)
+                if num_values is None and value is not None and len(value) > 0:
+                    num_values = len(value)
+
+        store = cls(len(frames), track_ids.keys(), num_values or 4)
+        for frame_num, frame_dict in enumerate(frames):
+            for track_id, value in frame_dict.items():
+                if value is not None and len(value) == store.num_values:
+                    store.values[frame_num, store._columns[track_id]] = value
+        store.present = np.isfinite(store.values).all(axis=2)
+        return store
+
+    def to_frame_dicts(self):
+        """List of {track_id: [values]} dicts, the format stored in the tracker stubs"""
+        return [dict(self[frame_num].items()) for frame_num in range(self.num_frames)]
+
+    @property
+    def num_frames(self):
+        return self.values.shape[0]
+
+    @property
+    def num_tracks(self):
+        return self.values.shape[1]
+
+    @property
+    def num_values(self):
+        return self.values.shape[2]
+
+    def __len__(self):
+        return self.num_frames
+
+    def __getitem__(self, frame_num):
+        if frame_num < 0:
+            frame_num += self.num_frames
+        if not 0 <= frame_num < self.num_frames:
+            raise IndexError(frame_num)
+        return FrameView(self, frame_num)
+
+    def __iter__(self):
+        for frame_num in range(self.num_frames):
+            yield FrameView(self, frame_num)
+
+    def __contains__(self, track_id):
+        return track_id in self._columns
+
+    def frame(self, frame_num):
+        """Track IDs and values of the tracks present in one frame"""
+        mask = self.present[frame_num]
+        return [self.track_ids[column] for column in np.flatnonzero(mask)], self.values[frame_num][mask]
+
+    def iter_frames(self):
+        """
+        Yield (track_ids, values) of the present tracks frame by frame as Python
+        lists, which is cheaper than frame() for per-frame drawing loops.
+        """
+        track_ids = self.track_ids
+        for present_row, values_row in zip(self.present.tolist(), self.values.tolist()):
+            yield ([track_id for track_id, present in zip(track_ids, present_row) if present],
+                   [values for values, present in zip(values_row, present_row) if present])
+
+    def track(self, track_id):
+        """Values (num_frames, num_values) and presence (num_frames,) of one track, as views"""
+        column = self._columns[track_id]
+        return self.values[:, column], self.present[:, column]
+
+    def track_values(self, track_id):
+        """Values of one track with NaN in the frames where it is absent"""
+        if track_id not in self._columns:
+            return np.full((self.num_frames, self.num_values), np.nan)
+        values, present = self.track(track_id)
+        return np.where(present[:, None], values, np.nan)
+
+    def get(self, frame_num, track_id, default=None):
+        column = self._columns.get(track_id)
+        if column is None or not self.present[frame_num, column]:
+            return default
+        return self.values[frame_num, column]
+
+    def add_track(self, track_id):
+        """Add an empty track and return its column"""
+        column = self._columns.get(track_id)
+        if column is None:
+            column = len(self.track_ids)
+            self.track_ids.append(track_id)
+            self._columns[track_id] = column
+            self.values = np.concatenate([self.values, np.full((self.num_frames, 1, self.num_values), np.nan)], axis=1)
+            self.present = np.concatenate([self.present, np.zeros((self.num_frames, 1), dtype=bool)], axis=1)
+        return column
+
+    def set(self, frame_num, track_id, values):
+        column = self.add_track(track_id)
+        self.values[frame_num, column] = values
+        self.present[frame_num, column] = True
+
+    def with_present(self, present):
+        """Copy of the store with a new presence mask, e.g. after filtering detections"""
+        return TrackStore.from_arrays(self.values.copy(), present, self.track_ids)
+
+    def select_tracks(self, track_ids):
+        """Copy of the store holding only the given tracks, in the given order"""
+        track_ids = [track_id for track_id in track_ids if track_id in self._columns]
+        columns = [self._columns[track_id] for track_id in track_ids]
+        return TrackStore.from_arrays(self.values[:, columns], self.present[:, columns], track_ids)
+
+    def copy(self):
+        return TrackStore.from_arrays(self.values.copy(), self.present.copy(), self.track_ids)
+
+    def __repr__(self):
+        return f"TrackStore(num_frames={self.num_frames}, track_ids={self.track_ids}, num_values={self.num_values})"
+
+
+def as_track_store(detections, num_values=None):
+    """Return detections as a TrackStore, converting per-frame dicts if needed"""
+    if isinstance(detections, TrackStore):
+        return detections
+    return TrackStore.from_frame_dicts(detections, num_values)
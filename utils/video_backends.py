@@ -0,0 +1,254 @@
+import json
+import shutil
+import subprocess
+from fractions import Fraction
+import cv2
+import numpy as np
+
+DEFAULT_FPS = 24
+
+
+class VideoDecoder:
+    """
+    Common interface of the decode backends. Metadata (fps, frame_count and
+    the output width/height, after optional decode-time downscaling) is read
+    when the decoder is created; frames() decodes BGR uint8 frames.
+
+    Args:
+        video_path: Path of the video to decode
+        threads: Decoder threads (0 lets the backend choose)
+        scale: Optional factor to downscale frames by while decoding
+    """
+
+    backend_name = None
+
+    def __init__(self, video_path, threads=0, scale=None):
+        self.video_path = video_path
+        self.threads = threads
+        self.scale = scale
+        self.fps = DEFAULT_FPS
+        self.frame_count = 0
+        self.source_width = self.source_height = 0
+
+    @property
+    def width(self):
+        return self._scaled(self.source_width)
+
+    @property
+    def height(self):
+        return self._scaled(self.source_height)
+
+    def _scaled(self, length):
+        if not self.scale or self.scale == 1.0:
+            return length
+        # Even sizes keep chroma-subsampled scalers happy
+        return max(2, int(round(length * self.scale / 2)) * 2)
+
+    def frames(self, start_frame=0, end_frame=None):
+        """Yield frames start_frame..end_frame (exclusive, None for the end of the video)"""
+        raise NotImplementedError
+
+    def read_all(self):
+        return list(self.frames())
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class OpenCVDecoder(VideoDecoder):
+    """cv2.VideoCapture backend; seeking goes through CAP_PROP_POS_FRAMES, which some codecs honour only approximately"""
+
+    backend_name = "opencv"
+
+    def __init__(self, video_path, threads=0, scale=None):
+        super().__init__(video_path, threads, scale)
+        cap = self._open()
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+        self.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.source_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.source_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+
+    def _open(self):
+        if self.threads and hasattr(cv2, "CAP_PROP_N_THREADS"):
+            return cv2.VideoCapture(self.video_path, cv2.CAP_ANY, [cv2.CAP_PROP_N_THREADS, self.threads])
+        return cv2.VideoCapture(self.video_path)
+
+    def frames(self, start_frame=0, end_frame=None):
+        cap = self._open()
+        if start_frame:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        resize = self.width != self.source_width or self.height != self.source_height
+        frame_num = start_frame
+        try:
+            while end_frame is None or frame_num < end_frame:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if resize:
+                    frame = cv2.resize(frame, (self.width, self.height), interpolation=cv2.INTER_AREA)
+                yield frame
+                frame_num += 1
+        finally:
+            cap.release()
+
+
+class PyAVDecoder(VideoDecoder):
+    """
+    PyAV (libav) backend with frame-threaded decoding, scaling and BGR
+    conversion in swscale, and frame-accurate seeking: it jumps to the last
+    keyframe at or before the target, from an index built by demuxing the
+    packets without decoding them, and decodes forward from there.
+    """
+
+    backend_name = "pyav"
+
+    def __init__(self, video_path, threads=0, scale=None):
+        super().__init__(video_path, threads, scale)
+        import av
+        self._av = av
+        self._keyframe_pts = None
+        with av.open(video_path) as container:
+            stream = container.streams.video[0]
+            self.fps = float(stream.average_rate or stream.guessed_rate or DEFAULT_FPS)
+            self.time_base = stream.time_base
+            self.start_pts = stream.start_time or 0
+            self.frame_count = stream.frames or int(round(float(stream.duration * stream.time_base) * self.fps)
+                                                    if stream.duration else 0)
+            self.source_width = stream.codec_context.width
+            self.source_height = stream.codec_context.height
+
+    def _frame_pts(self, frame_num):
+        return self.start_pts + int(round(Fraction(frame_num) / Fraction(self.fps) / self.time_base))
+
+    def keyframe_index(self):
+        """Presentation timestamps of every keyframe, from one demux-only pass"""
+        if self._keyframe_pts is None:
+            with self._av.open(self.video_path) as container:
+                stream = container.streams.video[0]
+                self._keyframe_pts = sorted(packet.pts for packet in container.demux(stream)
+                                            if packet.is_keyframe and packet.pts is not None)
+        return self._keyframe_pts
+
+    def frames(self, start_frame=0, end_frame=None):
+        with self._av.open(self.video_path) as container:
+            stream = container.streams.video[0]
+            stream.thread_type = "AUTO"
+            stream.thread_count = self.threads
+            target_pts = self._frame_pts(start_frame) if start_frame else None
+            if target_pts is not None:
+                keyframes = self.keyframe_index()
+                position = np.searchsorted(keyframes, target_pts, side="right") - 1
+                if position >= 0:
+                    container.seek(int(keyframes[position]), stream=stream, backward=True, any_frame=False)
+
+            frame_num = start_frame
+            for frame in container.decode(stream):
+                # Frames between the keyframe and the target are decoded but skipped
+                if target_pts is not None and frame.pts is not None and frame.pts < target_pts:
+                    continue
+                if end_frame is not None and frame_num >= end_frame:
+                    break
+                yield frame.to_ndarray(width=self.width, height=self.height, format="bgr24")
+                frame_num += 1
+
+
+class FFmpegPipeDecoder(VideoDecoder):
+    """
+    ffmpeg subprocess backend streaming raw BGR frames over a pipe. ffprobe
+    reads the metadata, ffmpeg decodes with its own threads and scales in the
+    filter graph, and input seeking (-ss before -i) jumps to the preceding
+    keyframe and decodes up to the exact frame.
+    """
+
+    backend_name = "ffmpeg"
+
+    def __init__(self, video_path, threads=0, scale=None):
+        super().__init__(video_path, threads, scale)
+        probe = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "v:0", "-count_packets",
+             "-show_entries", "stream=width,height,avg_frame_rate,r_frame_rate,nb_frames,nb_read_packets",
+             "-of", "json", video_path],
+            check=True, capture_output=True, text=True)
+        stream = json.loads(probe.stdout)["streams"][0]
+        rate = stream.get("avg_frame_rate") or stream.get("r_frame_rate") or "0/1"
+        self.fps = float(Fraction(rate)) if Fraction(rate) else DEFAULT_FPS
+        self.frame_count = int(stream.get("nb_frames") or stream.get("nb_read_packets") or 0)
+        self.source_width = int(stream["width"])
+        self.source_height = int(stream["height"])
+        self._process = None
+
+    def frames(self, start_frame=0, end_frame=None):
+        command = ["ffmpeg", "-v", "error", "-threads", str(self.threads)]
+        if start_frame:
+            command += ["-ss", f"{start_frame / self.fps:.6f}"]
+        command += ["-i", self.video_path]
+        if (self.width, self.height) != (self.source_width, self.source_height):
+            command += ["-vf", f"scale={self.width}:{self.height}:flags=area"]
+        if end_frame is not None:
+            command += ["-frames:v", str(end_frame - start_frame)]
+        command += ["-f", "rawvideo", "-pix_fmt", "bgr24", "-"]
+
+        frame_bytes = self.width * self.height * 3
+        self._process = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=frame_bytes)
+        try:
+            while True:
+                data = self._process.stdout.read(frame_bytes)
+                if len(data) < frame_bytes:
+                    break
+                yield np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.width, 3).copy()
+        finally:
+            self.close()
+
+    def close(self):
+        if self._process is not None:
+            self._process.stdout.close()
+            if self._process.poll() is None:
+                self._process.terminate()
+            self._process.wait()
+            self._process = None
+
+
+DECODE_BACKENDS = {
+    OpenCVDecoder.backend_name: OpenCVDecoder,
+    PyAVDecoder.backend_name: PyAVDecoder,
+    FFmpegPipeDecoder.backend_name: FFmpegPipeDecoder,
+}
+
+
+def available_decode_backend():
+    """Best installed backend: PyAV, then the ffmpeg command line tools, then OpenCV"""
+    try:
+        import av  # noqa: F401
+        return PyAVDecoder.backend_name
+    except ImportError:
+        pass
+    if shutil.which("ffmpeg") and shutil.which("ffprobe"):
+        return FFmpegPipeDecoder.backend_name
+    return OpenCVDecoder.backend_name
+
+
+def open_video(video_path, backend="auto", threads=0, scale=None):
+    """
+    Create a decoder for a video.
+
+    Args:
+        video_path: Path of the video to decode
+        backend: "opencv", "pyav", "ffmpeg" or "auto" for the best installed one
+        threads: Decoder threads (0 lets the backend choose)
+        scale: Optional factor to downscale frames by while decoding
+
+    Returns:
+        VideoDecoder exposing fps, frame_count, width, height and frames()
+    """
+    if backend == "auto":
+        backend = available_decode_backend()
+    if backend not in DECODE_BACKENDS:
+        raise ValueError(f"Unknown decode backend {backend!r}, expected one of {sorted(DECODE_BACKENDS)} or 'auto'")
+    return DECODE_BACKENDS[backend](video_path, threads=threads, scale=scale)
@@ -1,53 +1,53 @@
-import cv2
 import os
+from .video_backends import open_video
+from .video_writers import create_video_writer
 
-def read_video(video_path):
-    cap = cv2.VideoCapture(video_path)
-    frames = []
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frames.append(frame)
-    cap.release()
-    return frames
+def read_video(video_path, backend="opencv", threads=0, scale=None):
+    """
+    Decode every frame of a video.
 
-def save_video(output_video_frames, output_video_path):
+    Args:
+        video_path: Path of the video to decode
+        backend: Decode backend name, see open_video
+        threads: Decoder threads (0 lets the backend choose)
+        scale: Optional factor to downscale frames by while decoding
 
+    Returns:
+        List of BGR frames
+    """
+    with open_video(video_path, backend=backend, threads=threads, scale=scale) as decoder:
+        return decoder.read_all()
+
+def save_video(output_video_frames, output_video_path, fps=24, writer="opencv", **writer_options):
+    """
+    Write frames to a video file.
+
+    Args:
+        output_video_frames: BGR frames to write
+        output_video_path: Path of the video to write
+        fps: Output frame rate, normally the source video's
+        writer: Writer backend name, see create_video_writer
+        **writer_options: FFmpegVideoWriter options (preset, crf, fragmented, keyframe_interval)
+
+    Returns:
+        Whether a non-empty video was written
+    """
     output_dir = os.path.dirname(output_video_path)
-    if not os.path.exists(output_dir):
+    if output_dir and not os.path.exists(output_dir):
         os.makedirs(output_dir)
-    
-    
-    height, width = output_video_frames[0].shape[:2]
-    
-  
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    
-    out = cv2.VideoWriter(output_video_path, fourcc, 24, (width, height))
-    
-    
-    if not out.isOpened():
-        print(f"ERROR: Could not open video writer for {output_video_path}")
-        
-        fourcc = cv2.VideoWriter_fourcc(*'MJPG')
-        out = cv2.VideoWriter(output_video_path, fourcc, 24, (width, height))
-        
-        if not out.isOpened():
-            print(f"CRITICAL ERROR: Failed to create video writer with multiple codecs")
-            return False
-    
-    
-    for frame in output_video_frames:
-        out.write(frame)
-    
-    
-    out.release()
-    
-    
-    if os.path.exists(output_video_path) and os.path.getsize(output_video_path) > 0:
+
+    out = create_video_writer(output_video_path, fps, backend=writer, **writer_options)
+    try:
+        for frame in output_video_frames:
+            out.write(frame)
+    except IOError as e:
+        print(f"CRITICAL ERROR: {e}")
+        out.close()
+        return False
+
+    if out.close():
         print(f"Successfully saved video to {output_video_path}")
         return True
     else:
         print(f"WARNING: Video file creation failed or file is empty")
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,170 @@
+import os
+import shutil
+import subprocess
+import cv2
+
+DEFAULT_PRESET = "veryfast"
+DEFAULT_CRF = 23
+
+
+class VideoWriter:
+    """
+    Common interface of the output writers. Frames are BGR uint8 arrays
+    written one at a time; the writer opens on the first frame, which fixes
+    the output size.
+
+    Args:
+        output_path: Path of the video to write
+        fps: Output frame rate, normally the source video's
+    """
+
+    backend_name = None
+
+    def __init__(self, output_path, fps=24):
+        self.output_path = output_path
+        self.fps = fps
+        self.frames_written = 0
+
+    def write(self, frame):
+        raise NotImplementedError
+
+    def close(self):
+        """Finish the file; returns whether a non-empty video was written"""
+        return self.frames_written > 0 and os.path.exists(self.output_path) and os.path.getsize(self.output_path) > 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class OpenCVVideoWriter(VideoWriter):
+    """cv2.VideoWriter with mp4v for .mp4 paths and XVID otherwise, falling back to MJPG"""
+
+    backend_name = "opencv"
+
+    def __init__(self, output_path, fps=24):
+        super().__init__(output_path, fps)
+        self.writer = None
+
+    def _open(self, width, height):
+        primary = 'mp4v' if self.output_path.lower().endswith(".mp4") else 'XVID'
+        for codec in (primary, 'MJPG'):
+            writer = cv2.VideoWriter(self.output_path, cv2.VideoWriter_fourcc(*codec), self.fps, (width, height))
+            if writer.isOpened():
+                return writer
+            print(f"WARNING: Could not open a {codec} video writer for {self.output_path}")
+        raise IOError(f"Failed to create a video writer for {self.output_path}")
+
+    def write(self, frame):
+        if self.writer is None:
+            height, width = frame.shape[:2]
+            self.writer = self._open(width, height)
+        self.writer.write(frame)
+        self.frames_written += 1
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+        return super().close()
+
+
+class FFmpegVideoWriter(VideoWriter):
+    """
+    Streams raw BGR frames into an ffmpeg subprocess encoding H.264.
+
+    With fragmented=True (and an .mp4 path) the output is fragmented MP4: the
+    moov header is written first and every keyframe starts a new fragment, so
+    the file is playable while it is still being written and everything up
+    to the last complete fragment survives an interrupted run.
+
+    Args:
+        output_path: Path of the video to write
+        fps: Output frame rate, normally the source video's
+        preset: x264 speed/size trade-off, e.g. "ultrafast", "veryfast", "medium"
+        crf: Constant rate factor, lower is better quality (18-28 is typical)
+        fragmented: Whether to write fragmented MP4
+        keyframe_interval: Frames between keyframes, i.e. the fragment length
+            (default: two seconds of video)
+    """
+
+    backend_name = "ffmpeg"
+
+    def __init__(self, output_path, fps=24, preset=DEFAULT_PRESET, crf=DEFAULT_CRF, fragmented=True,
+                 keyframe_interval=None):
+        super().__init__(output_path, fps)
+        self.preset = preset
+        self.crf = crf
+        self.fragmented = fragmented
+        self.keyframe_interval = keyframe_interval or max(1, int(round(fps * 2)))
+        self.process = None
+
+    def command(self, width, height):
+        command = ["ffmpeg", "-y", "-v", "error",
+                   "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", f"{self.fps:g}", "-i", "-",
+                   "-c:v", "libx264", "-preset", self.preset, "-crf", str(self.crf),
+                   # yuv420p needs even dimensions and is what players expect
+                   "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-pix_fmt", "yuv420p",
+                   "-g", str(self.keyframe_interval)]
+        if self.fragmented and self.output_path.lower().endswith(".mp4"):
+            command += ["-movflags", "+frag_keyframe+empty_moov+default_base_moof", "-flush_packets", "1"]
+        return command + [self.output_path]
+
+    def write(self, frame):
+        if self.process is None:
+            height, width = frame.shape[:2]
+            self.process = subprocess.Popen(self.command(width, height), stdin=subprocess.PIPE)
+        try:
+            self.process.stdin.write(frame.tobytes())
+        except BrokenPipeError:
+            raise IOError(f"ffmpeg exited with code {self.process.wait()} while writing {self.output_path}")
+        self.frames_written += 1
+
+    def close(self):
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+            except BrokenPipeError:
+                pass
+            return_code = self.process.wait()
+            self.process = None
+            if return_code != 0:
+                print(f"ERROR: ffmpeg exited with code {return_code} while writing {self.output_path}")
+                return False
+        return super().close()
+
+
+VIDEO_WRITERS = {
+    OpenCVVideoWriter.backend_name: OpenCVVideoWriter,
+    FFmpegVideoWriter.backend_name: FFmpegVideoWriter,
+}
+
+
+def available_video_writer():
+    """ffmpeg when its command line tool is installed, otherwise OpenCV"""
+    return FFmpegVideoWriter.backend_name if shutil.which("ffmpeg") else OpenCVVideoWriter.backend_name
+
+
+def create_video_writer(output_path, fps=24, backend="auto", **options):
+    """
+    Create a writer for an output video.
+
+    Args:
+        output_path: Path of the video to write
+        fps: Output frame rate
+        backend: "opencv", "ffmpeg" or "auto" for ffmpeg when it is installed
+        **options: FFmpegVideoWriter options (preset, crf, fragmented, keyframe_interval),
+            ignored by the OpenCV writer
+
+    Returns:
+        VideoWriter with write(frame) and close()
+    """
+    if backend == "auto":
+        backend = available_video_writer()
+    if backend not in VIDEO_WRITERS:
+        raise ValueError(f"Unknown video writer {backend!r}, expected one of {sorted(VIDEO_WRITERS)} or 'auto'")
+    if backend == FFmpegVideoWriter.backend_name:
+        return FFmpegVideoWriter(output_path, fps, **options)
+    return OpenCVVideoWriter(output_path, fps)